@@ -1,30 +1,77 @@
 from flask import Flask
 import os
 
-from controllers.cli_controller import db_commands
+from controllers.cli_controller import db_commands, perf_commands
 from controllers.author_controller import authors_bp
 from controllers.genre_controller import genres_bp
 from controllers.member_controller import members_bp
 from controllers.book_controller import books_bp
 from controllers.loan_controller import loans_bp
-from init import db, ma
+from controllers.hold_controller import holds_bp
+from controllers.stats_controller import stats_bp
+from controllers.internal_controller import internal_bp
+from controllers.metrics_controller import metrics_bp
+from init import cache, db, ma, replicas
+from utils.autocomplete import member_prefix_index
+from utils.instrumentation import request_timing
+from utils.metrics import metrics
+from utils.pool import engine_options, init_pools
+from utils.query_budget import query_budgets
+from utils.replicas import replica_binds
+from utils.slow_queries import slow_query_log
 
 
 def create_app():
     app = Flask(__name__)
 
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI")
+    # Pool sizing, timeouts and PgBouncer mode come from DATABASE_POOL_* variables, see utils/pool.py
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    # Comma-separated read replicas of the main database, used by GET requests (see utils/replicas.py)
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(os.environ.get("DATABASE_REPLICA_URIS"))
+    app.config["REPLICA_MAX_LAG"] = float(os.environ.get("REPLICA_MAX_LAG", 5))
+    app.config["REPLICA_STICKY_SECONDS"] = int(os.environ.get("REPLICA_STICKY_SECONDS", 10))
+    app.config["PAGE_SIZE_DEFAULT"] = int(os.environ.get("PAGE_SIZE_DEFAULT", 50))
+    app.config["PAGE_SIZE_MAX"] = int(os.environ.get("PAGE_SIZE_MAX", 500))
+    app.config["ENTITY_CACHE_SIZE"] = int(os.environ.get("ENTITY_CACHE_SIZE", 10000))
+    app.config["ENTITY_CACHE_TTL"] = int(os.environ.get("ENTITY_CACHE_TTL", 60))
+    # Share of requests timed for the Server-Timing header and request log, 0 to turn timing off
+    app.config["REQUEST_TIMING_SAMPLE_RATE"] = float(os.environ.get("REQUEST_TIMING_SAMPLE_RATE", 0.01))
+    # Statements slower than this are written to SLOW_QUERY_LOG with their plan, 0 to turn the log off
+    app.config["SLOW_QUERY_THRESHOLD_MS"] = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", 200))
+    app.config["SLOW_QUERY_LOG"] = os.environ.get("SLOW_QUERY_LOG", "slow_queries.log")
+    # off, warn (log routes over their query budget or repeating a statement) or strict (raise, for test suites)
+    app.config["QUERY_BUDGET_MODE"] = os.environ.get("QUERY_BUDGET_MODE", "warn" if app.debug else "off")
+    app.config["QUERY_REPEAT_LIMIT"] = int(os.environ.get("QUERY_REPEAT_LIMIT", 5))
+    app.config["MEMBER_AUTOCOMPLETE_IN_MEMORY"] = os.environ.get("MEMBER_AUTOCOMPLETE_IN_MEMORY", "").lower() in ("1", "true", "yes")
+    # Seconds before each worker's in-memory autocomplete index is rebuilt to pick up the other workers' writes
+    app.config["MEMBER_AUTOCOMPLETE_TTL"] = float(os.environ.get("MEMBER_AUTOCOMPLETE_TTL", 60))
 
     app.json.sort_keys = False
 
+    # Registered first, so the timing covers the other before_request hooks too
+    request_timing.init_app(app)
     db.init_app(app)
+    with app.app_context():
+        init_pools(db.engines.values())
+        replicas.init_app(app, db.engines)
+        metrics.init_app(app, db.engines)
     ma.init_app(app)
+    cache.init_app(app)
+    member_prefix_index.init_app(app)
+    slow_query_log.init_app(app)
+    query_budgets.init_app(app)
 
     app.register_blueprint(db_commands)
+    app.register_blueprint(perf_commands)
     app.register_blueprint(authors_bp)
     app.register_blueprint(genres_bp)
     app.register_blueprint(members_bp)
     app.register_blueprint(books_bp)
     app.register_blueprint(loans_bp)
+    app.register_blueprint(holds_bp)
+    app.register_blueprint(stats_bp)
+    app.register_blueprint(internal_bp)
+    app.register_blueprint(metrics_bp)
 
     return app
\ No newline at end of file
@@ -0,0 +1,75 @@
+import time
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, g, request
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from controllers.async_controller import async_books_bp, async_loans_bp
+from init import db
+from utils.async_db import async_db
+from utils.metrics import metrics
+
+
+def create_async_app(flask_app = None):
+    """
+    Builds the ASGI app, served with e.g. `hypercorn "async_app:create_async_app()"`.
+
+    A Quart app with async views (controllers/async_controller.py) answers the hot endpoints on an async engine.
+    Every other request is passed on to the regular Flask app, which Hypercorn runs on a thread pool. Both share the
+    configuration, models, schemas and the entity cache.
+
+    Args:
+        flask_app (Flask): The WSGI app to wrap, create_app() by default.
+
+    Returns:
+        FallbackDispatcher: The ASGI application.
+    """
+    flask_app = flask_app or create_app()
+
+    app = Quart(__name__)
+    app.config.from_mapping(flask_app.config)
+    app.json.sort_keys = False
+
+    with flask_app.app_context():
+        async_db.init_app(app, db.engine.url)
+
+    app.register_blueprint(async_books_bp)
+    app.register_blueprint(async_loans_bp)
+
+    # The same request metrics as the WSGI app's, under the async blueprints' names
+    @app.before_request
+    async def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    async def record_request(response):
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe(request.method, request.blueprint or "", route, response.status_code, time.perf_counter() - g.metrics_started)
+        return response
+
+    return FallbackDispatcher(app, AsyncioWSGIMiddleware(flask_app))
+
+
+class FallbackDispatcher:
+    """
+    Sends HTTP requests matching one of the async app's routes to it and all others to the WSGI app.
+    Lifespan events go to the async app, so its startup and shutdown hooks run.
+    """
+    def __init__(self, asgi_app, wsgi_app):
+        self.asgi_app = asgi_app
+        self.wsgi_app = wsgi_app
+        self._urls = asgi_app.url_map.bind("localhost")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not self.handles(scope):
+            await self.wsgi_app(scope, receive, send)
+        else:
+            await self.asgi_app(scope, receive, send)
+
+    def handles(self, scope):
+        try:
+            self._urls.match(scope["path"], method = scope["method"])
+        except HTTPException:
+            # NotFound, MethodNotAllowed and trailing slash redirects are all left to the WSGI app
+            return False
+        return True
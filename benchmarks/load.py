@@ -0,0 +1,149 @@
+import asyncio
+import json
+import math
+import time
+from urllib.parse import urlsplit
+
+
+class HTTPConnection:
+    """
+    A minimal keep-alive HTTP/1.1 client over asyncio streams, so the load generator needs nothing beyond the
+    standard library and spends as little time per request as possible. Reconnects whenever the server closes the
+    connection (gunicorn's sync workers close after every response).
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body = None):
+        if isinstance(body, bytes):
+            payload, content_type = body, "text/csv"
+        else:
+            payload, content_type = json.dumps(body).encode() if body is not None else b"", "application/json"
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Length: {len(payload)}\r\n"
+        if body is not None:
+            head += f"Content-Type: {content_type}\r\n"
+        message = (head + "\r\n").encode() + payload
+
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            self.writer.write(message)
+            await self.writer.drain()
+            status, keep_alive = await self._read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The server closed an idle keep-alive connection, retry once on a new one
+            await self.close()
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            self.writer.write(message)
+            await self.writer.drain()
+            status, keep_alive = await self._read_response()
+        if not keep_alive:
+            await self.close()
+        return status
+
+    async def _read_response(self):
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        length, keep_alive, chunked = 0, True, False
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection":
+                keep_alive = value != "close"
+            elif name == "transfer-encoding":
+                chunked = "chunked" in value
+        if chunked:
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif length:
+            await self.reader.readexactly(length)
+        return status, keep_alive
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+def percentile(sorted_values, fraction):
+    """The nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarise(latencies, statuses, errors, elapsed):
+    """Turns raw per-request latencies (seconds) into throughput and millisecond percentiles."""
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+async def run_load(base_url, make_request, concurrency, duration):
+    """
+    Sends requests from `concurrency` connections for `duration` seconds, each waiting for its previous response.
+
+    Args:
+        base_url (str): e.g. http://127.0.0.1:8080
+        make_request (callable): Returns the next (method, path, body) to send, or None to stop that connection. A
+            bytes body is sent as text/csv, anything else as JSON.
+        concurrency (int): The number of concurrent connections.
+        duration (float): Seconds to run for.
+
+    Returns:
+        dict: See summarise.
+    """
+    url = urlsplit(base_url)
+    latencies = []
+    statuses = {}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        connection = HTTPConnection(url.hostname, url.port or 80)
+        try:
+            while time.perf_counter() < deadline:
+                next_request = make_request()
+                if next_request is None:
+                    break
+                method, path, body = next_request
+                started = time.perf_counter()
+                try:
+                    status = await connection.request(method, path, body)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    await connection.close()
+                    continue
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            await connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarise(latencies, statuses, errors, time.perf_counter() - started)
@@ -0,0 +1,290 @@
+import itertools
+from datetime import date, timedelta
+
+from init import db
+from models.author import Author
+from models.book import Book
+from models.genre import Genre
+from models.loan import Loan
+from models.member import Member
+from utils.synthetic_data import FIRST_NAMES, TITLE_NOUNS, isbn_13, letters
+
+# The blueprints the suite must cover, every one of their endpoints needs a scenario
+BLUEPRINTS = ("authors", "books", "genres", "members", "loans")
+
+# Offsets keeping the ISBNs and membership numbers of rows the benchmark creates clear of generated ones
+ISBN_OFFSET = 900_000_000
+MEMBERSHIP_OFFSET = 90_000_000
+
+SAMPLE_SIZE = 1000  # Existing rows sampled for the routes that need real ISBNs, membership numbers or loans
+IMPORT_ROWS = 20  # Books in each POST /books/import file
+BATCH_ROWS = 10  # Loans in each POST /loans/batch
+
+
+class Scenario:
+    """
+    One endpoint under load.
+
+    Args:
+        name (str): The method and route, e.g. "GET /books/<int:book_id>".
+        endpoint (str): The Flask endpoint it covers.
+        make_request (callable): Returns the next (method, path, body), or None once a route that uses rows up (the
+            deletes and returns) has none left. A bytes body is sent as is, anything else as JSON.
+    """
+    __slots__ = ("name", "endpoint", "make_request")
+
+    def __init__(self, name, endpoint, make_request):
+        self.name = name
+        self.endpoint = endpoint
+        self.make_request = make_request
+
+
+def max_id(model):
+    return db.session.scalar(db.select(db.func.max(model.id))) or 0
+
+
+def sample(rng, model, columns, high, where = None):
+    """Returns up to SAMPLE_SIZE rows of columns, from random ids up to high, without reading the whole table."""
+    ids = rng.sample(range(1, high + 1), min(SAMPLE_SIZE, high))
+    stmt = db.select(*columns).where(model.id.in_(ids))
+    if where is not None:
+        stmt = stmt.where(where)
+    rows = db.session.execute(stmt).all()
+    rng.shuffle(rows)
+    return rows
+
+
+def disposable(model, rows):
+    """Inserts rows that a DELETE scenario removes one per request, returning the created instances."""
+    instances = [model(**row) for row in rows]
+    db.session.add_all(instances)
+    db.session.commit()
+    return instances
+
+
+def consume(items, request):
+    """A make_request that sends request(item) for each of items once, then stops."""
+    def make_request():
+        return request(items.pop()) if items else None
+    return make_request
+
+
+def build_scenarios(rng, disposable_rows):
+    """
+    Returns a scenario for every endpoint of BLUEPRINTS, ordered reads, then writes, then deletes, so the reads see
+    the generated dataset as it was seeded. Must run in an app context on the freshly seeded database.
+
+    Reads pick random ids among the generated rows. Creates add uniquely named rows and updates rewrite rows with
+    harmless values. Deletes use disposable_rows rows inserted here for each delete route, and returns and loan
+    deletes use sampled existing loans, so each of these stops early once its rows are used up.
+    """
+    authors, books, genres, members, loans = (max_id(model) for model in (Author, Book, Genre, Member, Loan))
+    if not all((authors, books, genres, members, loans)):
+        raise RuntimeError("The database has no data, seed it with `flask db seed --scale N` first")
+
+    isbns = [row.isbn for row in sample(rng, Book, (Book.isbn,), books)]
+    genre_names = sample(rng, Genre, (Genre.id, Genre.genre_name), genres)
+    membership_numbers = [row.membership_number for row in sample(rng, Member, (Member.membership_number,), members)]
+    loan_columns = (Loan.id, Loan.book_id, Loan.member_id, Loan.borrow_date, Loan.return_date)
+    loan_rows = sample(rng, Loan, loan_columns, loans)
+    # PUT /loans/member/<id> rewrites the member's first loan, so it is sent that loan's own values
+    first_loans = db.session.execute(
+        db.select(*loan_columns).where(Loan.id.in_(
+            db.select(db.func.min(Loan.id)).where(Loan.member_id.in_({row.member_id for row in loan_rows})).group_by(Loan.member_id)
+        ))
+    ).all()
+    open_loans = [row.id for row in sample(rng, Loan, (Loan.id,), loans, Loan.status != "returned")]
+    deleted_loans = [row.id for row in loan_rows[:disposable_rows]]
+    loan_members = rng.sample(range(1, members + 1), min(disposable_rows, members))
+
+    counter = itertools.count()
+    today = date.today()
+    borrow_date, return_date = today.isoformat(), (today + timedelta(days = 14)).isoformat()
+
+    def new_author(n):
+        return {"name": f"Bench Author {letters(n)}", "birth_year": 1970}
+
+    def new_book(n):
+        return {
+            "title": f"Bench {letters(n)}",
+            "isbn": isbn_13(ISBN_OFFSET + n),
+            "available_copies": 3,
+            "author_id": rng.randint(1, authors),
+            "genre_id": rng.randint(1, genres),
+        }
+
+    def new_genre(n):
+        return {"genre_name": f"Bench {letters(n)}"}
+
+    def new_member(n):
+        return {
+            "name": f"Bench {letters(n)}",
+            "membership_number": f"{MEMBERSHIP_OFFSET + n:08d}",
+            "email": f"bench{n}@example.com",
+            "join_date": "2024-01-01",
+        }
+
+    def new_loan():
+        return {
+            "book_id": rng.randint(1, books),
+            "member_id": rng.randint(1, members),
+            "borrow_date": borrow_date,
+            "return_date": return_date,
+        }
+
+    def import_file():
+        lines = ["title,isbn,available_copies,author_id,genre_id"]
+        for _ in range(IMPORT_ROWS):
+            book = new_book(next(counter))
+            lines.append(f"{book['title']},{book['isbn']},1,{book['author_id']},{book['genre_id']}")
+        return ("\n".join(lines) + "\n").encode()
+
+    def loan_body(row):
+        return {
+            "book_id": row.book_id,
+            "member_id": row.member_id,
+            "borrow_date": row.borrow_date.isoformat(),
+            "return_date": row.return_date.isoformat(),
+        }
+
+    def row_of(rows):
+        return rows[rng.randrange(len(rows))]
+
+    # Rows for the delete routes, created before any of them is timed
+    created_authors = disposable(Author, [new_author(next(counter)) for _ in range(disposable_rows)])
+    created_genres = disposable(Genre, [new_genre(next(counter)) for _ in range(disposable_rows)])
+    created_books = disposable(Book, [new_book(next(counter)) for _ in range(2 * disposable_rows)])
+    created_members = disposable(Member, [
+        {**new_member(next(counter)), "join_date": date(2024, 1, 1)} for _ in range(2 * disposable_rows)
+    ])
+    deleted_authors = [author.id for author in created_authors]
+    deleted_genres = [genre.id for genre in created_genres]
+    deleted_books = [book.id for book in created_books[:disposable_rows]]
+    deleted_isbns = [book.isbn for book in created_books[disposable_rows:]]
+    deleted_members = [member.id for member in created_members[:disposable_rows]]
+    deleted_numbers = [member.membership_number for member in created_members[disposable_rows:]]
+
+    def fixed(path):
+        return lambda: ("GET", path, None)
+
+    scenarios = [
+        # Reads
+        ("GET", "/authors/", "authors.get_authors", lambda: ("GET", f"/authors/?after={rng.randint(0, authors - 1)}", None)),
+        ("GET", "/authors/export", "authors.export_authors", fixed("/authors/export")),
+        ("GET", "/authors/<int:author_id>", "authors.get_author", lambda: ("GET", f"/authors/{rng.randint(1, authors)}", None)),
+        ("GET", "/books/", "books.get_books", lambda: ("GET", f"/books/?after={rng.randint(0, books - 1)}", None)),
+        ("GET", "/books/export", "books.export_books", fixed("/books/export")),
+        ("GET", "/books/search", "books.search", lambda: ("GET", f"/books/search?q={rng.choice(TITLE_NOUNS)}", None)),
+        ("GET", "/books/<int:book_id>", "books.get_book", lambda: ("GET", f"/books/{rng.randint(1, books)}", None)),
+        ("GET", "/genres/", "genres.get_genres", fixed("/genres/")),
+        ("GET", "/genres/export", "genres.export_genres", fixed("/genres/export")),
+        ("GET", "/genres/<int:genre_id>", "genres.get_genre", lambda: ("GET", f"/genres/{rng.randint(1, genres)}", None)),
+        (
+            "GET", "/genres/<int:genre_id>/books", "genres.get_genre_books",
+            lambda: ("GET", f"/genres/{rng.randint(1, genres)}/books", None)
+        ),
+        ("GET", "/members/", "members.get_members", lambda: ("GET", f"/members/?after={rng.randint(0, members - 1)}", None)),
+        ("GET", "/members/export", "members.export_members", fixed("/members/export")),
+        (
+            "GET", "/members/autocomplete", "members.autocomplete",
+            lambda: ("GET", f"/members/autocomplete?prefix={rng.choice(FIRST_NAMES)[:3]}", None)
+        ),
+        ("GET", "/members/<int:member_id>", "members.get_member", lambda: ("GET", f"/members/{rng.randint(1, members)}", None)),
+        (
+            "GET", "/members/membership_number/<string:membership_number>", "members.get_member_membership",
+            lambda: ("GET", f"/members/membership_number/{rng.choice(membership_numbers)}", None)
+        ),
+        ("GET", "/loans/", "loans.get_loans", lambda: ("GET", f"/loans/?after={rng.randint(0, loans - 1)}", None)),
+        ("GET", "/loans/export", "loans.export_loans", fixed("/loans/export")),
+        ("GET", "/loans/<int:loan_id>", "loans.get_loan", lambda: ("GET", f"/loans/{rng.randint(1, loans)}", None)),
+        (
+            "GET", "/loans/member/<int:member_id>", "loans.get_loan_from_member",
+            lambda: ("GET", f"/loans/member/{rng.randint(1, members)}", None)
+        ),
+        # Creates and updates
+        ("POST", "/authors/", "authors.create_author", lambda: ("POST", "/authors/", new_author(next(counter)))),
+        (
+            "PATCH", "/authors/<int:author_id>", "authors.update_author",
+            lambda: ("PATCH", f"/authors/{rng.randint(1, authors)}", {"birth_year": rng.randint(1900, 2000)})
+        ),
+        ("POST", "/books/", "books.create_book", lambda: ("POST", "/books/", new_book(next(counter)))),
+        ("POST", "/books/import", "books.import_books_upload", lambda: ("POST", "/books/import?format=csv", import_file())),
+        (
+            "PATCH", "/books/<int:book_id>", "books.update_book",
+            lambda: ("PATCH", f"/books/{rng.randint(1, books)}", {"title": f"Bench {letters(next(counter))}"})
+        ),
+        (
+            "PATCH", "/books/isbn/<string:isbn>", "books.update_book_by_isbn",
+            lambda: ("PATCH", f"/books/isbn/{rng.choice(isbns)}", {"title": f"Bench {letters(next(counter))}"})
+        ),
+        ("POST", "/genres/", "genres.create_genre", lambda: ("POST", "/genres/", new_genre(next(counter)))),
+        (
+            # Renames a genre to its own name, as every genre name is taken
+            "PATCH", "/genres/<int:genre_id>", "genres.update_genre",
+            lambda: (lambda row: ("PATCH", f"/genres/{row.id}", {"genre_name": row.genre_name}))(row_of(genre_names))
+        ),
+        ("POST", "/members/", "members.create_member", lambda: ("POST", "/members/", new_member(next(counter)))),
+        (
+            "PATCH", "/members/<int:member_id>", "members.update_member",
+            lambda: ("PATCH", f"/members/{rng.randint(1, members)}", {"name": f"Bench {letters(next(counter))}"})
+        ),
+        (
+            "PATCH", "/members/membership_number/<string:membership_number>", "members.update_member_by_number",
+            lambda: (
+                "PATCH", f"/members/membership_number/{rng.choice(membership_numbers)}",
+                {"name": f"Bench {letters(next(counter))}"}
+            )
+        ),
+        # Most of these succeed until members reach their borrowing limit, after which they are answered with 400 by
+        # the same claim queries, which still exercise the write path
+        ("POST", "/loans/", "loans.create_loan", lambda: ("POST", "/loans/", new_loan())),
+        ("POST", "/loans/batch", "loans.create_loans_batch", lambda: ("POST", "/loans/batch", [new_loan() for _ in range(BATCH_ROWS)])),
+        (
+            # Sends a loan's own values back, which still validates and rewrites every field
+            "PUT", "/loans/<int:loan_id>", "loans.update_loan",
+            lambda: (lambda row: ("PUT", f"/loans/{row.id}", loan_body(row)))(row_of(loan_rows))
+        ),
+        (
+            "PUT", "/loans/member/<int:member_id>", "loans.update_loan_by_member",
+            lambda: (lambda row: ("PUT", f"/loans/member/{row.member_id}", loan_body(row)))(row_of(first_loans))
+        ),
+        (
+            "POST", "/loans/return/<int:loan_id>", "loans.return_book_route",
+            consume(open_loans, lambda loan_id: ("POST", f"/loans/return/{loan_id}", None))
+        ),
+        # Deletes
+        ("DELETE", "/loans/<int:loan_id>", "loans.delete_loan", consume(deleted_loans, lambda loan_id: ("DELETE", f"/loans/{loan_id}", None))),
+        (
+            "DELETE", "/loans/member/<int:member_id>", "loans.delete_loans_from_member",
+            consume(loan_members, lambda member_id: ("DELETE", f"/loans/member/{member_id}", None))
+        ),
+        (
+            "DELETE", "/members/<int:member_id>", "members.delete_member",
+            consume(deleted_members, lambda member_id: ("DELETE", f"/members/{member_id}", None))
+        ),
+        (
+            "DELETE", "/members/membership_number/<string:membership_number>", "members.delete_member_by_number",
+            consume(deleted_numbers, lambda number: ("DELETE", f"/members/membership_number/{number}", None))
+        ),
+        ("DELETE", "/books/<int:book_id>", "books.delete_book", consume(deleted_books, lambda book_id: ("DELETE", f"/books/{book_id}", None))),
+        (
+            "DELETE", "/books/isbn/<string:isbn>", "books.delete_by_isbn",
+            consume(deleted_isbns, lambda isbn: ("DELETE", f"/books/isbn/{isbn}", None))
+        ),
+        (
+            "DELETE", "/genres/<int:genre_id>", "genres.delete_genre",
+            consume(deleted_genres, lambda genre_id: ("DELETE", f"/genres/{genre_id}", None))
+        ),
+        (
+            "DELETE", "/authors/<int:author_id>", "authors.delete_author",
+            consume(deleted_authors, lambda author_id: ("DELETE", f"/authors/{author_id}", None))
+        ),
+    ]
+    return [Scenario(f"{method} {rule}", endpoint, make_request) for method, rule, endpoint, make_request in scenarios]
+
+
+def uncovered_endpoints(app, scenarios):
+    """Returns the endpoints of BLUEPRINTS that no scenario covers, so a new route cannot be left out of the suite."""
+    covered = {scenario.endpoint for scenario in scenarios}
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.split(".")[0] in BLUEPRINTS}
+    return sorted(endpoints - covered)
@@ -0,0 +1,46 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    "wsgi": ["-m", "gunicorn", "app:create_app()"],
+    "asgi": ["-m", "hypercorn", "async_app:create_async_app()"],
+}
+
+
+def flask(env, *args):
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", *args], cwd = ROOT, env = env, check = True, capture_output = True)
+
+
+def reset_database(env, scale, seed = 42):
+    """Drops and recreates the database at env["DATABASE_URI"] and seeds it with synthetic data at scale."""
+    flask(env, "db", "drop")
+    flask(env, "db", "create")
+    flask(env, "db", "seed", "--scale", str(scale), "--seed", str(seed))
+
+
+def start_server(kind, env, port, workers):
+    """Starts a wsgi (gunicorn) or asgi (hypercorn) server on port and waits until it answers."""
+    # Otherwise a server left over from an earlier run would quietly answer instead
+    with socket.socket() as probe:
+        if probe.connect_ex(("127.0.0.1", port)) == 0:
+            raise RuntimeError(f"Port {port} is already in use")
+
+    command = [sys.executable, *SERVERS[kind][:2], "--workers", str(workers), "--bind", f"127.0.0.1:{port}", SERVERS[kind][2]]
+    server = subprocess.Popen(command, cwd = ROOT, env = env, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urlopen(f"http://127.0.0.1:{port}/books/1", timeout = 1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError(f"The {kind} server exited with status {server.returncode}")
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"The {kind} server did not start within 30 seconds")
@@ -0,0 +1,102 @@
+from quart import Blueprint, current_app, make_response, request
+from sqlalchemy.exc import IntegrityError, OperationalError
+from marshmallow import ValidationError
+
+from controllers.book_controller import invalidate_book
+from controllers.hold_controller import claim_ready_hold
+from controllers.loan_controller import claim_loan_slot, reserve_copy
+from init import cache, db
+from models.book import Book, book_schema
+from models.loan import Loan, LoanSchema, loan_schema
+from models.member import Member
+from utils.async_db import async_db
+from utils.error_handlers import handle_concurrency_error, handle_integrity_error, handle_validation_error
+from utils.etag import make_etag, version_select
+from utils.metrics import count_loans
+from utils.query_shaping import shaped_select
+from utils.stats import record_loans
+
+# Async versions of the hottest endpoints, served by the ASGI app (async_app.py). They answer exactly like their
+# WSGI counterparts in book_controller and loan_controller; every other route is passed on to the WSGI app.
+async_books_bp = Blueprint("async_books", __name__, url_prefix = "/books")
+async_loans_bp = Blueprint("async_loans", __name__, url_prefix = "/loans")
+
+# Read One - /books/id - GET
+@async_books_bp.route("/<int:book_id>")
+async def get_book(book_id):
+    async with async_db.session() as session:
+        versions = (await session.execute(version_select(Book, book_schema).where(Book.id == book_id))).first()
+        if not versions:
+            return {"message": f"Book with id {book_id} does not exist"}, 404
+
+        etag = make_etag(versions)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class("", status = 304)
+        else:
+            body = cache.get("book", book_id, etag)
+            if body is None:
+                book = await session.scalar(shaped_select(Book, book_schema).filter_by(id = book_id))
+                if not book:
+                    return {"message": f"Book with id {book_id} does not exist"}, 404
+                body = book_schema.dump(book)
+                cache.set("book", book_id, etag, body)
+            response = await make_response(body)
+    response.set_etag(etag)
+    return response
+
+# Create Loan - /loans - POST
+@async_loans_bp.route("/", methods = ["POST"])
+async def create_loan():
+    try:
+        body_data = loan_schema.load(await request.get_json())
+        book_id = body_data.get("book_id")
+        member_id = body_data.get("member_id")
+
+        async with async_db.session() as session:
+            existing_loan = await session.scalar(db.select(Loan.id).filter_by(book_id = book_id, member_id = member_id))
+            if existing_loan:
+                return {"message": "This member has already borrowed this book."}, 400
+
+            # The same atomic claims as the WSGI view, run on this session's connection through run_sync
+            if not await session.run_sync(lambda sync_session: claim_loan_slot(member_id, sync_session)):
+                await session.rollback()
+                if not await session.get(Member, member_id):
+                    return {"message": f"Member with ID {member_id} does not exist"}, 400
+                raise ValidationError(
+                    {"member_id": f"Member cannot have more than {LoanSchema.MAX_BORROW_LIMIT} active loans."}
+                )
+
+            reserved = None
+            if not await session.run_sync(lambda sync_session: claim_ready_hold(book_id, member_id, sync_session)):
+                reserved = await session.run_sync(lambda sync_session: reserve_copy(book_id, sync_session))
+                if reserved is None:
+                    await session.rollback()
+                    if not await session.get(Book, book_id):
+                        return {"message": f"Book with ID {book_id} does not exist"}, 400
+                    return {"message": "There are no available copies of this book to loan."}, 400
+
+            new_loan = Loan(
+                borrow_date = body_data.get("borrow_date"),
+                return_date = body_data.get("return_date"),
+                book_id = book_id,
+                member_id = member_id
+            )
+            session.add(new_loan)
+            await session.run_sync(lambda sync_session: record_loans(checkouts = 1, session = sync_session))
+            await session.commit()
+            count_loans(checkouts = 1)
+            # Reloaded with its member, which the schema dumps and an async session can't lazy load
+            new_loan = await session.scalar(shaped_select(Loan, loan_schema).filter_by(id = new_loan.id))
+
+        if reserved is not None:
+            invalidate_book(book_id, reserved.genre_id)
+        return loan_schema.dump(new_loan), 201
+
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    except IntegrityError as err:
+        return handle_integrity_error(err)
+
+    except OperationalError as err:
+        return handle_concurrency_error(err)
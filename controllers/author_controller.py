@@ -1,35 +1,75 @@
 from flask import Blueprint, request
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from psycopg2 import errorcodes
 from marshmallow import ValidationError
 from collections import OrderedDict
 
-from init import db
+from init import cache, db
 from models.author import Author, author_schema, authors_schema
+from models.book import Book
 from utils.error_handlers import handle_integrity_error, handle_validation_error
+from utils.etag import conditional_response, load_rows, make_etag, version_select
+from utils.pagination import paginate
+from utils.query_budget import query_budget
+from utils.query_shaping import shaped_select
+from utils.search import search_index
+from utils.stats import forget_author
+from utils.streaming import stream_export
 from utils.strip import validate_and_strip_field
 
 authors_bp = Blueprint("authors", __name__, url_prefix = "/authors")
 
+def invalidate_author(author_id):
+    """
+    Drops an author from the entity cache. Cached books and genres embed author names, so those are dropped too,
+    and the book search index is rebuilt.
+    """
+    cache.invalidate("author", author_id)
+    cache.invalidate_namespace("book", "genre")
+    search_index.invalidate()
+
 # Read All - /authors - GET
 @authors_bp.route("/")
+@query_budget(2)
 def get_authors():
-    stmt = db.select(Author).order_by(Author.id)
-    authors_list = db.session.scalars(stmt)
-    return authors_schema.dump(authors_list)
+    stmt = version_select(Author, authors_schema).order_by(Author.id)
+    try:
+        versions, next_cursor = paginate(stmt, Author.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    def produce():
+        authors_list = load_rows(Author, authors_schema, versions)
+        return {"authors": authors_schema.dump(authors_list), "next_cursor": next_cursor}
+    return conditional_response(make_etag(versions, next_cursor), produce)
+
+# Export All - /authors/export - GET
+@authors_bp.route("/export")
+@query_budget(1)
+def export_authors():
+    stmt = shaped_select(Author, authors_schema).order_by(Author.id)
+    return stream_export(stmt, authors_schema)
 
 # Read One - /authors/id - GET
 @authors_bp.route("/<int:author_id>")
+@query_budget(2)
 def get_author(author_id):
-    stmt = db.select(Author).filter_by(id = author_id)
-    author = db.session.scalar(stmt)
-    if author:
-        return author_schema.dump(author)
-    else:
+    versions = db.session.execute(version_select(Author, author_schema).where(Author.id == author_id)).first()
+    if not versions:
         return {"message": f"Author with id {author_id} does not exist"}, 404
+
+    def load():
+        stmt = shaped_select(Author, author_schema).filter_by(id = author_id)
+        author = db.session.scalar(stmt)
+        return author_schema.dump(author) if author else None
+
+    etag = make_etag(versions)
+    return conditional_response(etag, lambda: cache.get_or_load("author", author_id, etag, load))
     
 # Create - /authors - POST
 @authors_bp.route("/", methods = ["POST"])
+@query_budget(2)
 def create_author():
     try:
         body_data = author_schema.load(request.get_json())
@@ -54,12 +94,17 @@ def create_author():
         
 # Delete - /authors/id - DELETE
 @authors_bp.route("/<int:author_id>", methods = ["DELETE"])
+@query_budget(9)
 def delete_author(author_id):
-    stmt = db.select(Author).filter_by(id = author_id)
+    # The cascade deletes every book's loans and holds, loaded here in one query each rather than one per book
+    books = selectinload(Author.books)
+    stmt = db.select(Author).filter_by(id = author_id).options(books.selectinload(Book.loans), books.selectinload(Book.holds))
     author = db.session.scalar(stmt)
     if author:
+        forget_author(author_id)
         db.session.delete(author)
         db.session.commit()
+        invalidate_author(author_id)
         return {"message": f"Author '{author.name}' deleted successfully"}
     else:
         return {"message": f"Author with id {author_id} does not exist"}, 404
@@ -67,6 +112,7 @@ def delete_author(author_id):
 
 # Update - /authors/id - PUT, PATCH
 @authors_bp.route("/<int:author_id>", methods = ["PUT", "PATCH"])
+@query_budget(3)
 def update_author(author_id):
     stmt = db.select(Author).filter_by(id = author_id)
     author = db.session.scalar(stmt)
@@ -89,6 +135,7 @@ def update_author(author_id):
                 author.birth_year = validated_data["birth_year"]
 
             db.session.commit()
+            invalidate_author(author_id)
             return author_schema.dump(author)
         
         except ValidationError as err:
@@ -1,34 +1,98 @@
+import codecs
 from flask import Blueprint, request
 from sqlalchemy.exc import IntegrityError
 from psycopg2 import errorcodes
 from marshmallow import ValidationError
 
-from init import db
+from init import cache, db
 from models.book import Book, book_schema, books_schema
+from utils.book_import import IMPORT_FORMATS, import_books
 from utils.error_handlers import handle_integrity_error, handle_validation_error, validate_isbn
+from utils.etag import conditional_response, load_rows, make_etag, version_select
+from utils.pagination import encode_cursor, get_page_args, paginate
+from utils.query_budget import query_budget
+from utils.query_shaping import shaped_select
+from utils.search import search_books, search_index
+from utils.stats import record_books
+from utils.streaming import stream_export
 from utils.strip import validate_and_strip_field
 
 books_bp = Blueprint("books", __name__, url_prefix = "/books")
 
+MAX_REPORTED_REJECTS = 100  # Maximum number of rejected rows echoed back by POST /books/import
+
+def invalidate_book(book_id, *genre_ids):
+    """
+    Drops a book from the entity cache, along with the genres whose nested book lists include it.
+    """
+    cache.invalidate("book", book_id)
+    cache.invalidate("genre", *genre_ids)
+    search_index.invalidate(book_id)
+
 # Read All - /books - GET
 @books_bp.route("/")
+@query_budget(2)
 def get_books():
-    stmt = db.select(Book).order_by(Book.id)
-    books_list = db.session.scalars(stmt)
-    return books_schema.dump(books_list)
+    stmt = version_select(Book, books_schema).order_by(Book.id)
+    try:
+        versions, next_cursor = paginate(stmt, Book.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    def produce():
+        books_list = load_rows(Book, books_schema, versions)
+        return {"books": books_schema.dump(books_list), "next_cursor": next_cursor}
+    return conditional_response(make_etag(versions, next_cursor), produce)
+
+# Export All - /books/export - GET
+@books_bp.route("/export")
+@query_budget(1)
+def export_books():
+    stmt = shaped_select(Book, books_schema).order_by(Book.id)
+    return stream_export(stmt, books_schema)
+
+# Search - /books/search?q= - GET
+@books_bp.route("/search")
+@query_budget(2)
+def search():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return {"message": "A search query must be provided as q"}, 400
+    try:
+        # Results are ranked rather than ordered by id, so the cursor holds an offset into the ranking
+        offset, limit = get_page_args()
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    offset = offset or 0
+    book_ids = search_books(query, offset, limit + 1)
+    next_cursor = encode_cursor(offset + limit) if len(book_ids) > limit else None
+    book_ids = book_ids[:limit]
+
+    books = db.session.scalars(shaped_select(Book, books_schema).where(Book.id.in_(book_ids))).all() if book_ids else []
+    position = {book_id: index for index, book_id in enumerate(book_ids)}
+    books.sort(key = lambda book: position[book.id])
+    return {"books": books_schema.dump(books), "next_cursor": next_cursor}
 
 # Read One - /books/id - GET
 @books_bp.route("/<int:book_id>")
+@query_budget(2)
 def get_book(book_id):
-    stmt = db.select(Book).filter_by(id = book_id)
-    book = db.session.scalar(stmt)
-    if book:
-        return book_schema.dump(book)
-    else:
+    versions = db.session.execute(version_select(Book, book_schema).where(Book.id == book_id)).first()
+    if not versions:
         return {"message": f"Book with id {book_id} does not exist"}, 404
 
+    def load():
+        stmt = shaped_select(Book, book_schema).filter_by(id = book_id)
+        book = db.session.scalar(stmt)
+        return book_schema.dump(book) if book else None
+
+    etag = make_etag(versions)
+    return conditional_response(etag, lambda: cache.get_or_load("book", book_id, etag, load))
+
 # Create Book - /books - POST
 @books_bp.route("/", methods = ["POST"])
+@query_budget(6)
 def create_book():
     try:
         body_data = book_schema.load(request.get_json())
@@ -41,7 +105,10 @@ def create_book():
             genre_id = body_data.get("genre_id")
         )
         db.session.add(new_book)
+        db.session.flush()
+        record_books(new_book.author_id, new_book.genre_id, 1, new_book.available_copies)
         db.session.commit()
+        invalidate_book(new_book.id, new_book.genre_id)
         return book_schema.dump(new_book), 201
     
     except ValidationError as err:
@@ -50,26 +117,59 @@ def create_book():
     except IntegrityError as err:
        return handle_integrity_error(err)
     
+# Bulk Import Books - /books/import - POST
+@books_bp.route("/import", methods = ["POST"])
+# Grows with the file, as each chunk of rows and each author and genre in it adds statements; sized for test files
+@query_budget(20)
+def import_books_upload():
+    """
+    Imports a CSV or JSONL file sent as the raw request body, reading it as it streams in.
+    """
+    file_format = request.args.get("format", "csv")
+    if file_format not in IMPORT_FORMATS:
+        return {"message": f"Format must be one of: {', '.join(IMPORT_FORMATS)}"}, 400
+
+    rejected = []
+    def reject(line_number, row, errors):
+        # Only echo the first rejects back; the summary still counts all of them
+        if len(rejected) < MAX_REPORTED_REJECTS:
+            rejected.append({"line": line_number, "row": row, "errors": errors})
+
+    # A codec reader rather than io.TextIOWrapper, which needs a readable() that gunicorn's request body lacks. Like
+    # newline = "", it leaves line endings untranslated for the csv module.
+    stream = codecs.getreader("utf-8")(request.stream)
+    summary = import_books(stream, file_format, reject)
+    # Imported books show up in their genre's book list and in search results
+    cache.invalidate_namespace("genre")
+    search_index.invalidate()
+    return {**summary, "rejects": rejected}, 201 if summary["imported"] else 400
+    
 # Delete Book - /books/id - DELETE
 @books_bp.route("/<int:book_id>", methods = ["DELETE"])
+@query_budget(7)
 def delete_book(book_id):
     stmt = db.select(Book).filter_by(id = book_id)
     book = db.session.scalar(stmt)
     if book:
+        record_books(book.author_id, book.genre_id, -1, -book.available_copies)
         db.session.delete(book)
         db.session.commit()
+        invalidate_book(book.id, book.genre_id)
         return {"message": f"Book '{book.title}' was successfully deleted"}
     else:
         return {"message": f"Book with id {book_id} does not exist"}, 404
 
 # Delete Book - ISBN /books/isbn - DELETE
 @books_bp.route("/isbn/<string:isbn>", methods = ["DELETE"])
+@query_budget(6)
 def delete_by_isbn(isbn):
     stmt = db.select(Book).filter_by(isbn = isbn)
     book = db.session.scalar(stmt)
     if book:
+        record_books(book.author_id, book.genre_id, -1, -book.available_copies)
         db.session.delete(book)
         db.session.commit()
+        invalidate_book(book.id, book.genre_id)
         return {"message": f"Book '{book.title}' was successfully deleted"}
     else:
         return {"message": f"Book with isbn {isbn} does not exist"}, 404
@@ -77,6 +177,7 @@ def delete_by_isbn(isbn):
 
 # Update Book - /books/id - PUT, PATCH
 @books_bp.route("/<int:book_id>", methods=["PUT", "PATCH"])
+@query_budget(8)
 def update_book(book_id):
     stmt = db.select(Book).filter_by(id=book_id)
     book = db.session.scalar(stmt)
@@ -87,6 +188,8 @@ def update_book(book_id):
     
     if book:
         try:
+            previous_genre_id = book.genre_id
+            previous_totals = (book.author_id, book.genre_id, book.available_copies)
             validated_data = book_schema.load(body_data)
 
             # Title Validation
@@ -129,7 +232,12 @@ def update_book(book_id):
                 except ValueError:
                     return {"message": "Genre ID must be an integer"}, 400
                 
+            # Move the book (and its copies) between the author and genre totals if any of them changed
+            if (book.author_id, book.genre_id, book.available_copies) != previous_totals:
+                record_books(previous_totals[0], previous_totals[1], -1, -previous_totals[2])
+                record_books(book.author_id, book.genre_id, 1, book.available_copies)
             db.session.commit()
+            invalidate_book(book.id, previous_genre_id, book.genre_id)
             return {"message": "Book updated successfully", "book": book_schema.dump(book)}, 200
         
         except ValidationError as err:
@@ -143,6 +251,7 @@ def update_book(book_id):
 
 # Update Book - ISBN /books/isbn - PUT, PATCH
 @books_bp.route("/isbn/<string:isbn>", methods=["PUT", "PATCH"])
+@query_budget(8)
 def update_book_by_isbn(isbn):
     stmt = db.select(Book).filter_by(isbn = isbn)
     book = db.session.scalar(stmt)
@@ -153,6 +262,8 @@ def update_book_by_isbn(isbn):
     
     if book:
         try:
+            previous_genre_id = book.genre_id
+            previous_totals = (book.author_id, book.genre_id, book.available_copies)
             validated_data = book_schema.load(body_data)
 
             # Title Validation
@@ -195,7 +306,12 @@ def update_book_by_isbn(isbn):
                 except ValueError:
                     return {"message": "Genre ID must be an integer"}, 400
                 
+            # Move the book (and its copies) between the author and genre totals if any of them changed
+            if (book.author_id, book.genre_id, book.available_copies) != previous_totals:
+                record_books(previous_totals[0], previous_totals[1], -1, -previous_totals[2])
+                record_books(book.author_id, book.genre_id, 1, book.available_copies)
             db.session.commit()
+            invalidate_book(book.id, previous_genre_id, book.genre_id)
             return {"message": "Book updated successfully", "book": book_schema.dump(book)}, 200
         
         except ValidationError as err:
@@ -1,4 +1,7 @@
-from flask import Blueprint
+import click
+import json
+import os
+from flask import Blueprint, current_app
 from datetime import date
 
 from init import db
@@ -7,16 +10,23 @@ from models.author import Author
 from models.book import Book
 from models.genre import Genre
 from models.loan import Loan
+from utils.book_import import DEFAULT_CHUNK_SIZE, IMPORT_FORMATS, import_books
+from utils.index_report import DEFAULT_THRESHOLD, index_report
+from utils.slow_queries import summarise
+from utils.stats import rebuild_stats
+from utils.synthetic_data import generate
 
 
 
 db_commands = Blueprint("db", __name__)
+perf_commands = Blueprint("perf", __name__)
 
 @db_commands.cli.command("create")
 def create_tables():
     try:
         print("Creating tables...")
-        db.create_all()
+        # Only the primary: replicas get the schema through replication
+        db.create_all(bind_key = None)
         print("Tables created successfully.")
         
 
@@ -27,11 +37,18 @@ def create_tables():
 
 @db_commands.cli.command("drop")
 def drop_tables():
-    db.drop_all()
+    db.drop_all(bind_key = None)
     print("Tables Dropped")
 
 @db_commands.cli.command("seed")
-def seed_tables():
+@click.option("--scale", type = int, default = 0, help = "Generate a synthetic dataset of this scale instead of the sample data.")
+@click.option("--seed", "random_seed", type = int, default = 42, show_default = True, help = "Random seed for --scale.")
+def seed_tables(scale, random_seed):
+    if scale:
+        print(f"Generating synthetic data at scale {scale}...")
+        counts = generate(scale, random_seed)
+        print("Tables Seeded: " + ", ".join(f"{count} {table}" for table, count in counts.items()))
+        return
 
     books = [
         Book(
@@ -565,4 +582,103 @@ def seed_tables():
     db.session.add_all(members)
 
     db.session.commit()
-    print("Tables Seeded")
\ No newline at end of file
+    rebuild_stats()
+    print("Tables Seeded")
+
+
+@db_commands.cli.command("recount")
+def recount_active_loans():
+    """Rebuilds every member's active_loan_count from the loans table."""
+    actual = (
+        db.select(db.func.count(Loan.id))
+        .where(Loan.member_id == Member.id, Loan.status != "returned")
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        db.update(Member)
+        .where(Member.active_loan_count != actual)
+        .values(active_loan_count = actual)
+    )
+    db.session.commit()
+    print(f"Corrected active loan counts for {result.rowcount} members.")
+
+
+@db_commands.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Recomputes the book totals behind /stats from the books table."""
+    rebuild_stats()
+    print("Stats rebuilt.")
+
+
+@db_commands.cli.command("import-books")
+@click.argument("file", type = click.Path(exists = True, dir_okay = False))
+@click.option("--format", "file_format", type = click.Choice(IMPORT_FORMATS), help = "Defaults to the file extension.")
+@click.option("--rejects", type = click.Path(dir_okay = False), help = "Where to write rejected rows (JSONL).")
+@click.option("--chunk-size", default = DEFAULT_CHUNK_SIZE, show_default = True, help = "Rows per transaction.")
+def import_books_command(file, file_format, rejects, chunk_size):
+    """Bulk imports books from a CSV or JSONL file."""
+    file_format = file_format or ("jsonl" if file.endswith((".jsonl", ".ndjson")) else "csv")
+    rejects = rejects or f"{os.path.splitext(file)[0]}.rejects.jsonl"
+
+    with open(file, newline = "", encoding = "utf-8") as source, open(rejects, "w", encoding = "utf-8") as reject_file:
+        def reject(line_number, row, errors):
+            reject_file.write(json.dumps({"line": line_number, "row": row, "errors": errors}) + "\n")
+
+        summary = import_books(source, file_format, reject, chunk_size)
+
+    print(f"Read {summary['read']} rows: {summary['imported']} imported, {summary['rejected']} rejected.")
+    if summary["rejected"]:
+        print(f"Rejected rows written to {rejects}")
+
+
+@db_commands.cli.command("index-report")
+@click.option("--threshold", default = DEFAULT_THRESHOLD, show_default = True, help = "Flag sequential scans over tables with more rows than this.")
+@click.option("--analyze/--no-analyze", default = True, show_default = True, help = "Use EXPLAIN ANALYZE on PostgreSQL.")
+@click.option("--verbose", is_flag = True, help = "Print every plan, not just the flagged ones.")
+def index_report_command(threshold, analyze, verbose):
+    """Explains the hot endpoints' queries and flags sequential scans over large tables."""
+    report = index_report(threshold, analyze)
+    flagged = [entry for entry in report if entry["seq_scans"]]
+
+    for entry in report:
+        if not (verbose or entry["seq_scans"]):
+            continue
+        scans = ", ".join(f"{table} ({rows} rows)" for table, rows in entry["seq_scans"])
+        print(f"{entry['name']}: " + (f"sequential scan of {scans}" if scans else "ok"))
+        for line in entry["plan"]:
+            print(f"    {line}")
+
+    print(f"{len(report)} queries explained, {len(flagged)} with sequential scans over {threshold} rows.")
+    if flagged:
+        raise SystemExit(1)
+
+
+@perf_commands.cli.command("slow-queries")
+@click.option("--log", "path", type = click.Path(dir_okay = False), help = "Defaults to SLOW_QUERY_LOG.")
+@click.option("--sort", type = click.Choice(["total", "max", "count"]), default = "total", show_default = True, help = "Rank queries by total time, slowest run or number of slow runs.")
+@click.option("--limit", default = 10, show_default = True, help = "Number of queries to show.")
+@click.option("--plans/--no-plans", default = True, show_default = True, help = "Print each query's most recent plan.")
+def slow_queries_command(path, sort, limit, plans):
+    """Summarises the slow query log by query fingerprint, worst offenders first."""
+    path = path or current_app.config["SLOW_QUERY_LOG"]
+    summary = summarise(path, sort)
+    if not summary:
+        print(f"No slow queries recorded in {path}.")
+        return
+
+    for rank, group in enumerate(summary[:limit], start = 1):
+        print(
+            f"{rank}. {group['fingerprint']}  {group['count']} slow runs  total {group['total_ms']:.1f} ms  "
+            f"mean {group['mean_ms']:.1f} ms  max {group['max_ms']:.1f} ms"
+            + (f"  {group['failed']} failed" if group["failed"] else "")
+        )
+        print(f"    {group['sql']}")
+        routes = sorted(group["routes"].items(), key = lambda item: item[1], reverse = True)
+        print("    from " + ", ".join(f"{route} ({count})" for route, count in routes))
+        if group["error"]:
+            print(f"    last error: {group['error']}")
+        if plans and group["plan"]:
+            for line in group["plan"]:
+                print(f"        {line}")
+
+    print(f"{len(summary)} distinct slow queries, {sum(group['count'] for group in summary)} slow runs in {path}.")
@@ -1,35 +1,83 @@
 from flask import Blueprint, request
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from psycopg2 import errorcodes
 from marshmallow import ValidationError
 
-from init import db
+from init import cache, db
+from models.book import Book, books_schema
 from models.genre import Genre, genre_schema, genres_schema
 from utils.error_handlers import handle_integrity_error, handle_validation_error
+from utils.etag import conditional_response, load_rows, make_etag, version_select
+from utils.pagination import paginate
+from utils.query_budget import query_budget
+from utils.query_shaping import shaped_select
+from utils.search import search_index
+from utils.stats import forget_genre
+from utils.streaming import stream_export
 from utils.strip import validate_and_strip_field
 
 genres_bp = Blueprint("genres", __name__, url_prefix = "/genres")
 
 # Read All - /genres - GET
 @genres_bp.route("/")
+@query_budget(2)
 def get_genres():
-    stmt = db.select(Genre).order_by(Genre.id)
-    genres_list = db.session.scalars(stmt)
-    return genres_schema.dump(genres_list)
+    stmt = version_select(Genre, genres_schema).order_by(Genre.id)
+    try:
+        versions, next_cursor = paginate(stmt, Genre.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
 
+    def produce():
+        genres_list = load_rows(Genre, genres_schema, versions)
+        return {"genres": genres_schema.dump(genres_list), "next_cursor": next_cursor}
+    return conditional_response(make_etag(versions, next_cursor), produce)
+
+# Export All - /genres/export - GET
+@genres_bp.route("/export")
+@query_budget(1)
+def export_genres():
+    stmt = shaped_select(Genre, genres_schema).order_by(Genre.id)
+    return stream_export(stmt, genres_schema)
 
 # Read One - /genres/id - GET
 @genres_bp.route("/<int:genre_id>")
+@query_budget(3)
 def get_genre(genre_id):
-    stmt = db.select(Genre).filter_by(id = genre_id)
-    genre = db.session.scalar(stmt)
-    if genre:
-        return genre_schema.dump(genre)
-    else:
+    versions = db.session.execute(version_select(Genre, genre_schema).where(Genre.id == genre_id)).first()
+    if not versions:
+        return {"message": f"Genre with id {genre_id} does not exist"}, 404
+
+    def load():
+        stmt = shaped_select(Genre, genre_schema).filter_by(id = genre_id)
+        genre = db.session.scalar(stmt)
+        return genre_schema.dump(genre) if genre else None
+
+    etag = make_etag(versions)
+    return conditional_response(etag, lambda: cache.get_or_load("genre", genre_id, etag, load))
+
+# Read One's Books - /genres/id/books - GET
+@genres_bp.route("/<int:genre_id>/books")
+@query_budget(3)
+def get_genre_books(genre_id):
+    if db.session.get(Genre, genre_id) is None:
         return {"message": f"Genre with id {genre_id} does not exist"}, 404
 
+    stmt = version_select(Book, books_schema).where(Book.genre_id == genre_id).order_by(Book.id)
+    try:
+        versions, next_cursor = paginate(stmt, Book.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    def produce():
+        books_list = load_rows(Book, books_schema, versions)
+        return {"books": books_schema.dump(books_list), "next_cursor": next_cursor}
+    return conditional_response(make_etag(versions, next_cursor), produce)
+
 # Create - /genres - POST
 @genres_bp.route("/", methods = ["POST"])
+@query_budget(3)
 def create_genre():
     try:
         body_data = genre_schema.load(request.get_json())
@@ -53,18 +101,27 @@ def create_genre():
 
 # Delete - /genre/id - DELETE
 @genres_bp.route("/<int:genre_id>", methods = ["DELETE"])
+@query_budget(9)
 def delete_genre(genre_id):
-    stmt = db.select(Genre).filter_by(id = genre_id)
+    # The cascade deletes every book's loans and holds, loaded here in one query each rather than one per book
+    books = selectinload(Genre.books)
+    stmt = db.select(Genre).filter_by(id = genre_id).options(books.selectinload(Book.loans), books.selectinload(Book.holds))
     genre = db.session.scalar(stmt)
     if genre:
+        forget_genre(genre_id)
         db.session.delete(genre)
         db.session.commit()
+        # Deleting a genre deletes its books as well
+        cache.invalidate("genre", genre_id)
+        cache.invalidate_namespace("book")
+        search_index.invalidate()
         return {"message": f"Genre '{genre.genre_name}' deleted successfully"}
     else:
         return {"message": f"Genre '{genre_id}' does not exist"},404
     
 # Update - /genres/id - PUT, PATCH
 @genres_bp.route("/<int:genre_id>", methods = ["PUT", "PATCH"])
+@query_budget(4)
 def update_genre(genre_id):
     stmt = db.select(Genre).filter_by(id = genre_id)
     genre = db.session.scalar(stmt)
@@ -84,6 +141,9 @@ def update_genre(genre_id):
                         return {"message": "Genre Name cannot be empty"}, 400
 
                 db.session.commit()
+                cache.invalidate("genre", genre_id)
+                # Genre names are searchable
+                search_index.invalidate()
                 return genre_schema.dump(genre)
 
             except ValidationError as err:
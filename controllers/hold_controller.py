@@ -0,0 +1,193 @@
+from flask import Blueprint, request
+from sqlalchemy.exc import IntegrityError
+from marshmallow import ValidationError
+
+from controllers.book_controller import invalidate_book
+from init import db
+from models.book import Book
+from models.hold import Hold, hold_schema, holds_schema
+from models.loan import Loan
+from models.member import Member
+from utils.error_handlers import handle_integrity_error, handle_validation_error
+from utils.etag import conditional_response, load_rows, make_etag, version_select
+from utils.pagination import encode_cursor, get_page_args, paginate
+from utils.query_budget import query_budget
+from utils.stats import record_copies
+
+holds_bp = Blueprint("holds", __name__, url_prefix = "/holds")
+
+# Read One - /holds/id - GET
+@holds_bp.route("/<int:hold_id>")
+@query_budget(2)
+def get_hold(hold_id):
+    versions = db.session.execute(version_select(Hold, hold_schema).where(Hold.id == hold_id)).first()
+    if not versions:
+        return {"message": f"Hold with id {hold_id} does not exist"}, 404
+    return conditional_response(make_etag(versions), lambda: hold_schema.dump(db.session.get(Hold, hold_id)))
+
+# Read Queue - /holds/book/book_id - GET
+@holds_bp.route("/book/<int:book_id>")
+@query_budget(1)
+def get_book_queue(book_id):
+    """
+    Lists the open (waiting or ready) holds on a book in queue order, paginated by position.
+    """
+    try:
+        after, limit = get_page_args()
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    stmt = (
+        db.select(Hold)
+        .where(Hold.book_id == book_id, Hold.status.in_(("waiting", "ready")))
+        .order_by(Hold.position)
+        .limit(limit + 1)
+    )
+    if after is not None:
+        stmt = stmt.where(Hold.position > after)
+    holds = db.session.scalars(stmt).all()
+
+    next_cursor = None
+    if len(holds) > limit:
+        holds = holds[:limit]
+        next_cursor = encode_cursor(holds[-1].position)
+    return {"holds": holds_schema.dump(holds), "next_cursor": next_cursor}
+
+# Read Member Holds - /holds/member/member_id - GET
+@holds_bp.route("/member/<int:member_id>")
+@query_budget(2)
+def get_member_holds(member_id):
+    stmt = version_select(Hold, holds_schema).where(Hold.member_id == member_id).order_by(Hold.id)
+    try:
+        versions, next_cursor = paginate(stmt, Hold.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    def produce():
+        holds = load_rows(Hold, holds_schema, versions)
+        return {"holds": holds_schema.dump(holds), "next_cursor": next_cursor}
+    return conditional_response(make_etag(versions, next_cursor), produce)
+
+# Place Hold - /holds - POST
+@holds_bp.route("/", methods = ["POST"])
+@query_budget(7)
+def place_hold():
+    try:
+        body_data = hold_schema.load(request.get_json())
+        book_id = body_data["book_id"]
+        member_id = body_data["member_id"]
+
+        book = db.session.get(Book, book_id)
+        if not book:
+            return {"message": f"Book with ID {book_id} does not exist"}, 400
+        if not db.session.get(Member, member_id):
+            return {"message": f"Member with ID {member_id} does not exist"}, 400
+        if book.available_copies > 0:
+            return {"message": "This book has available copies, borrow it instead of placing a hold."}, 400
+
+        # Any loan, returned or not, since a member can only borrow a book once (uni_book_member) and a hold they
+        # could never collect would keep its copy set aside for good
+        borrowed = db.session.scalar(
+            db.select(Loan.id).where(Loan.book_id == book_id, Loan.member_id == member_id)
+        )
+        if borrowed:
+            return {"message": "This member has already borrowed this book."}, 400
+
+        queued = db.session.scalar(
+            db.select(Hold.id).where(Hold.book_id == book_id, Hold.member_id == member_id, Hold.status.in_(("waiting", "ready")))
+        )
+        if queued:
+            return {"message": f"This member already has hold {queued} on this book."}, 400
+
+        new_hold = Hold(book_id = book_id, member_id = member_id, position = next_position(book_id))
+        db.session.add(new_hold)
+        db.session.commit()
+        return hold_schema.dump(new_hold), 201
+
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    except IntegrityError as err:
+        db.session.rollback()
+        return handle_integrity_error(err)
+
+# Cancel Hold - /holds/id - DELETE
+@holds_bp.route("/<int:hold_id>", methods = ["DELETE"])
+@query_budget(2)
+def cancel_hold(hold_id):
+    hold = db.session.get(Hold, hold_id)
+    if not hold:
+        return {"message": f"Hold with id {hold_id} does not exist"}, 404
+    if hold.status not in ("waiting", "ready"):
+        return {"message": f"Hold with id {hold_id} is already {hold.status}"}, 400
+
+    was_ready = hold.status == "ready"
+    hold.status = "cancelled"
+    genre_id = None
+    if was_ready:
+        # The copy set aside for this hold goes to the next member in the queue, or back on the shelf
+        _, genre_id = allocate_copy(hold.book_id)
+    db.session.commit()
+    if genre_id is not None:
+        invalidate_book(hold.book_id, genre_id)
+    return {"message": f"Hold with id {hold_id} was successfully cancelled"}
+
+
+def next_position(book_id):
+    """
+    Returns the position at the tail of a book's queue, read off the (book_id, position) unique index.
+    """
+    last = db.session.scalar(db.select(db.func.max(Hold.position)).where(Hold.book_id == book_id))
+    return (last or 0) + 1
+
+def allocate_copy(book_id):
+    """
+    Hands a copy coming back (a return or a cancelled ready hold) to the head of the book's queue.
+
+    The head is the lowest waiting position, found through the partial ix_holds_book_id_waiting index, so this
+    costs the same for a queue of one or of thousands. Concurrent allocations skip each other's locked heads.
+    With nobody waiting the copy goes back to available_copies. The caller commits.
+
+    Args:
+        book_id (int): The ID of the book whose copy came back.
+
+    Returns:
+        tuple: (hold, genre_id). hold is the hold now ready, or None. genre_id is the book's genre when the copy
+        went back on the shelf (so the caller can invalidate it), otherwise None.
+    """
+    head = db.session.scalar(
+        db.select(Hold)
+        .where(Hold.book_id == book_id, Hold.status == "waiting")
+        .order_by(Hold.position)
+        .limit(1)
+        .with_for_update(skip_locked = True)
+    )
+    if head is not None:
+        head.status = "ready"
+        return head, None
+
+    shelved = db.session.execute(
+        db.update(Book)
+        .where(Book.id == book_id)
+        .values(available_copies = Book.available_copies + 1)
+        .returning(Book.author_id, Book.genre_id)
+    ).first()
+    record_copies(shelved.author_id, 1)
+    return None, shelved.genre_id
+
+def claim_ready_hold(book_id, member_id, session = None):
+    """
+    Marks the member's ready hold on a book as fulfilled, if there is one, so their checkout takes the copy set
+    aside for it instead of one from available_copies. Runs in db.session unless another session is given, the
+    caller commits.
+
+    Returns:
+        bool: True if the member had a ready hold.
+    """
+    stmt = (
+        db.update(Hold)
+        .where(Hold.book_id == book_id, Hold.member_id == member_id, Hold.status == "ready")
+        .values(status = "fulfilled")
+        .returning(Hold.id)
+    )
+    return (session or db.session).execute(stmt).first() is not None
@@ -0,0 +1,21 @@
+from flask import Blueprint
+
+from init import cache, db, replicas
+from utils.pool import pool_stats
+
+internal_bp = Blueprint("internal", __name__, url_prefix = "/internal")
+
+# Entity Cache Stats - /internal/cache - GET
+@internal_bp.route("/cache")
+def get_cache_stats():
+    return cache.stats()
+
+# Connection Pool Stats - /internal/pool - GET
+@internal_bp.route("/pool")
+def get_pool_stats():
+    return pool_stats(db.engines)
+
+# Read Replica Health - /internal/replicas - GET
+@internal_bp.route("/replicas")
+def get_replica_stats():
+    return replicas.stats()
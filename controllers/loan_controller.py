@@ -1,67 +1,94 @@
+import click
 from flask import Blueprint, request
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from psycopg2 import errorcodes
 from marshmallow import ValidationError
 
+from controllers.book_controller import invalidate_book
+from controllers.hold_controller import allocate_copy, claim_ready_hold
 from init import db
-from models.loan import Loan, loan_schema, loans_schema
+from models.loan import LOAN_STATUSES, Loan, LoanSchema, loan_schema, loans_schema
 from models.book import Book
+from models.hold import Hold
 from models.member import Member
-from utils.error_handlers import handle_integrity_error, handle_validation_error
+from utils.error_handlers import handle_concurrency_error, handle_integrity_error, handle_validation_error
+from utils.etag import conditional_response, listing_select, load_rows, make_etag, split_listing, version_select
+from utils.metrics import count_loans
+from utils.overdue import SCAN_BATCH_SIZE, scan_overdue, scan_overdue_every
+from utils.pagination import paginate
+from utils.query_budget import query_budget
+from utils.query_shaping import shaped_select
+from utils.stats import record_copies, record_loans
+from utils.streaming import stream_export
 from utils.validate_date_range import validate_date_format
 
 loans_bp = Blueprint("loans", __name__, url_prefix = "/loans")
 
+MAX_BATCH_SIZE = 50  # Maximum number of loans in one POST /loans/batch request
+
 # Read All - /loans - GET
 @loans_bp.route("/")
+@query_budget(2)
 def get_loans():
-    # Query for all loans
-    all_loans_stmt = db.select(Loan).order_by(Loan.id)
-    all_loans_list = db.session.scalars(all_loans_stmt).all()
-
-    # Query for active loans (not returned)
-    active_loans_stmt = db.select(Loan).filter(Loan.status != "returned").order_by(Loan.id)
-    active_loans_list = db.session.scalars(active_loans_stmt).all()
-
-    # Prepare the response with both all loans and active loans
-    response = {
-        "all_loans": loans_schema.dump(all_loans_list),  # All loans serialized
-        "active_loans": loans_schema.dump(active_loans_list)  # Active loans serialized
-    }
+    try:
+        status_filter, combined = get_listing_args()
+        # Query for the versions of a page of loans (and the loans themselves on a first fetch), filtered by status in the database
+        stmt = listing_select(Loan, loans_schema).where(*status_filter).order_by(Loan.id)
+        rows, next_cursor = paginate(stmt, Loan.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
+    versions, loans = split_listing(rows)
 
-    return response, 200
+    def produce():
+        page = loans if loans is not None else load_rows(Loan, loans_schema, versions)
+        return {**dump_loans(page, combined), "next_cursor": next_cursor}, 200
+    return conditional_response(make_etag(versions, next_cursor, request.args.get("status"), combined), produce)
+
+# Export All - /loans/export - GET
+@loans_bp.route("/export")
+@query_budget(1)
+def export_loans():
+    try:
+        status_filter, _ = get_listing_args()
+    except ValidationError as err:
+        return handle_validation_error(err)
+    stmt = shaped_select(Loan, loans_schema).where(*status_filter).order_by(Loan.id)
+    return stream_export(stmt, loans_schema)
 
 @loans_bp.route("/member/<int:member_id>", methods=["GET"])
+@query_budget(2)
 def get_loan_from_member(member_id):
-    # Query for all loans for the member
-    all_loans_stmt = db.select(Loan).filter(Loan.member_id == member_id).order_by(Loan.id)
-    all_loans_list = db.session.scalars(all_loans_stmt).all()
-
-    # Query for active loans for the member (not returned)
-    active_loans_stmt = db.select(Loan).filter(Loan.member_id == member_id, Loan.status != "returned").order_by(Loan.id)
-    active_loans_list = db.session.scalars(active_loans_stmt).all()
-
-    if all_loans_list or active_loans_list:
-        response = {
-            "all_loans": loans_schema.dump(all_loans_list),  # All loans for the member
-            "active_loans": loans_schema.dump(active_loans_list)  # Active loans for the member
-        }
-        return response, 200
-    else:
+    try:
+        status_filter, combined = get_listing_args()
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    stmt = listing_select(Loan, loans_schema).where(Loan.member_id == member_id, *status_filter).order_by(Loan.id)
+    versions, loans = split_listing(db.session.execute(stmt).all())
+    if not versions and not status_filter:
         return {"message": f"Member with id {member_id} does not have any loans"}, 404
 
+    def produce():
+        # One query for the member's loans, partitioned in Python when the combined view is asked for
+        return dump_loans(loans if loans is not None else load_rows(Loan, loans_schema, versions), combined), 200
+    return conditional_response(make_etag(versions, request.args.get("status"), combined), produce)
+
 # Read One - /loans/id - GET
 @loans_bp.route("/<int:loan_id>")
+@query_budget(2)
 def get_loan(loan_id):
-    stmt = db.select(Loan).filter_by(id = loan_id)
-    loan = db.session.scalar(stmt)
-    if loan:
-        return loan_schema.dump(loan)
-    else:
+    versions = db.session.execute(version_select(Loan, loan_schema).where(Loan.id == loan_id)).first()
+    if not versions:
         return {"message": f"Loan with id {loan_id} does not exist"}, 404
+
+    def produce():
+        stmt = shaped_select(Loan, loan_schema).filter_by(id = loan_id)
+        return loan_schema.dump(db.session.scalar(stmt))
+    return conditional_response(make_etag(versions), produce)
     
 # Create Loan - /loans - POST
 @loans_bp.route("/", methods = ["POST"])
+@query_budget(9)
 def create_loan():
     try:
         body_data = loan_schema.load(request.get_json())
@@ -70,6 +97,24 @@ def create_loan():
         if existing_loan:
             return {"message": "This member has already borrowed this book."}, 400
 
+        # Claim a loan slot and a copy and insert the loan in the same transaction, so a failure gives both back
+        if not claim_loan_slot(body_data.get("member_id")):
+            db.session.rollback()
+            if not db.session.get(Member, body_data.get("member_id")):
+                return {"message": f"Member with ID {body_data.get('member_id')} does not exist"}, 400
+            raise ValidationError(
+                {"member_id": f"Member cannot have more than {LoanSchema.MAX_BORROW_LIMIT} active loans."}
+            )
+
+        # A member whose hold is ready takes the copy set aside for them, everyone else takes one off the shelf
+        reserved = None
+        if not claim_ready_hold(body_data.get("book_id"), body_data.get("member_id")):
+            reserved = reserve_copy(body_data.get("book_id"))
+            if reserved is None:
+                db.session.rollback()
+                if not db.session.get(Book, body_data.get("book_id")):
+                    return {"message": f"Book with ID {body_data.get('book_id')} does not exist"}, 400
+                return {"message": "There are no available copies of this book to loan."}, 400
 
         new_loan = Loan(
             borrow_date = body_data.get("borrow_date"),
@@ -78,21 +123,197 @@ def create_loan():
             member_id = body_data.get("member_id")
         )
         db.session.add(new_loan)
+        record_loans(checkouts = 1)
         db.session.commit()
+        count_loans(checkouts = 1)
+        if reserved is not None:
+            invalidate_book(body_data.get("book_id"), reserved.genre_id)
         return loan_schema.dump(new_loan), 201
     
     except ValidationError as err:
         return handle_validation_error(err)
     
     except IntegrityError as err:
+       db.session.rollback()
        return handle_integrity_error(err)
 
+    except OperationalError as err:
+        db.session.rollback()
+        return handle_concurrency_error(err)
+
+# Create Loans In Bulk - /loans/batch - POST
+@loans_bp.route("/batch", methods = ["POST"])
+# One INSERT per loan on SQLite (PostgreSQL batches them) and one stats update per author
+@query_budget(13 + 2 * MAX_BATCH_SIZE)
+def create_loans_batch():
+    """
+    Checks out several books at once, e.g. everything a member brings to a self-service kiosk.
+
+    Takes a list of {book_id, member_id, borrow_date, return_date} items. Members, books and existing loans are
+    fetched with one set-based query each, every accepted item is counted, decremented and inserted in a single
+    transaction, and the response reports a status for each item in request order.
+    """
+    items = request.get_json()
+    if not isinstance(items, list) or not items:
+        return {"message": "Request body must be a non-empty list of loans"}, 400
+    if len(items) > MAX_BATCH_SIZE:
+        return {"message": f"A batch cannot contain more than {MAX_BATCH_SIZE} loans"}, 400
+
+    results = [None] * len(items)
+    loaded = {}
+    for index, item in enumerate(items):
+        try:
+            body_data = loan_schema.load(item)
+        except ValidationError as err:
+            message, status_code = handle_validation_error(err)
+            results[index] = {"index": index, "status": status_code, **message}
+            continue
+        if not isinstance(body_data.get("book_id"), int) or not isinstance(body_data.get("member_id"), int):
+            results[index] = {"index": index, "status": 400, "message": "Book ID and Member ID must be integers"}
+            continue
+        loaded[index] = body_data
+
+    member_ids = {body_data["member_id"] for body_data in loaded.values()}
+    book_ids = {body_data["book_id"] for body_data in loaded.values()}
+
+    # Members and their active loan counts in one query. The list keeps the members in the session (which only holds
+    # them weakly), so the dump below reuses them instead of loading each loan's member again.
+    members = db.session.scalars(db.select(Member).where(Member.id.in_(member_ids))).all()
+    active_counts = {member.id: member.active_loan_count for member in members}
+    claimed = {}
+    # Books and their available copies in one query
+    available = dict(db.session.execute(
+        db.select(Book.id, Book.available_copies).where(Book.id.in_(book_ids))
+    ).all())
+    # Existing loans for any of these members and books in one query
+    borrowed = set(db.session.execute(
+        db.select(Loan.book_id, Loan.member_id)
+        .where(Loan.member_id.in_(member_ids), Loan.book_id.in_(book_ids))
+    ).all())
+    # Ready holds for any of these members and books in one query. Their copies are already set aside, so those
+    # checkouts fulfil the hold instead of taking a copy off the shelf, as in create_loan
+    ready = {
+        (book_id, member_id): hold_id
+        for book_id, member_id, hold_id in db.session.execute(
+            db.select(Hold.book_id, Hold.member_id, Hold.id)
+            .where(Hold.member_id.in_(member_ids), Hold.book_id.in_(book_ids), Hold.status == "ready")
+        )
+    }
+
+    new_loans = {}
+    taken = {}
+    fulfilled = []
+    for index, body_data in loaded.items():
+        book_id = body_data["book_id"]
+        member_id = body_data["member_id"]
+
+        if member_id not in active_counts:
+            message = f"Member with ID {member_id} does not exist"
+        elif book_id not in available:
+            message = f"Book with ID {book_id} does not exist"
+        elif (book_id, member_id) in borrowed:
+            message = "This member has already borrowed this book."
+        elif active_counts[member_id] >= LoanSchema.MAX_BORROW_LIMIT:
+            message = f"Member cannot have more than {LoanSchema.MAX_BORROW_LIMIT} active loans."
+        elif (book_id, member_id) not in ready and available[book_id] - taken.get(book_id, 0) <= 0:
+            message = "There are no available copies of this book to loan."
+        else:
+            message = None
+
+        if message:
+            results[index] = {"index": index, "status": 400, "message": message}
+            continue
+
+        borrowed.add((book_id, member_id))
+        active_counts[member_id] += 1
+        claimed[member_id] = claimed.get(member_id, 0) + 1
+        if (book_id, member_id) in ready:
+            fulfilled.append(ready[(book_id, member_id)])
+        else:
+            taken[book_id] = taken.get(book_id, 0) + 1
+        new_loans[index] = Loan(
+            borrow_date = body_data.get("borrow_date"),
+            return_date = body_data.get("return_date"),
+            book_id = book_id,
+            member_id = member_id
+        )
+
+    if new_loans:
+        try:
+            # Members before books, the order every checkout and return locks them in, so they can't deadlock each
+            # other. Claim the members' loan slots in one conditional UPDATE, checking the borrowing limit.
+            increment = db.case(claimed, value = Member.id)
+            counted = db.session.scalars(
+                db.update(Member)
+                .where(Member.id.in_(claimed), Member.active_loan_count + increment <= LoanSchema.MAX_BORROW_LIMIT)
+                .values(active_loan_count = Member.active_loan_count + increment)
+                .returning(Member.id)
+            ).all()
+            if len(counted) != len(claimed):
+                db.session.rollback()
+                return {"message": "Active loans changed while processing the batch. Please try again."}, 409
+
+            # Then the holds, fulfilled in one UPDATE; one missing from RETURNING was cancelled in the meantime
+            if fulfilled:
+                served = db.session.scalars(
+                    db.update(Hold)
+                    .where(Hold.id.in_(fulfilled), Hold.status == "ready")
+                    .values(status = "fulfilled")
+                    .returning(Hold.id)
+                ).all()
+                if len(served) != len(fulfilled):
+                    db.session.rollback()
+                    return {"message": "Holds changed while processing the batch. Please try again."}, 409
+
+            # Then decrement every other book in one conditional UPDATE; a book missing from RETURNING lost a race for
+            # its copies
+            updated = []
+            if taken:
+                decrement = db.case(taken, value = Book.id)
+                updated = db.session.execute(
+                    db.update(Book)
+                    .where(Book.id.in_(taken), Book.available_copies >= decrement)
+                    .values(available_copies = Book.available_copies - decrement)
+                    .returning(Book.id, Book.genre_id, Book.author_id)
+                ).all()
+            if len(updated) != len(taken):
+                db.session.rollback()
+                return {"message": "Available copies changed while processing the batch. Please try again."}, 409
+            taken_by_author = {}
+            for book_id, _, author_id in updated:
+                taken_by_author[author_id] = taken_by_author.get(author_id, 0) + taken[book_id]
+            for author_id, copies in sorted(taken_by_author.items()):
+                record_copies(author_id, -copies)
+
+            db.session.add_all(new_loans.values())
+            record_loans(checkouts = len(new_loans))
+            db.session.flush()
+            # Dump before committing so the new rows don't have to be reloaded one by one
+            for index, loan in new_loans.items():
+                results[index] = {"index": index, "status": 201, "loan": loan_schema.dump(loan)}
+            db.session.commit()
+            count_loans(checkouts = len(new_loans))
+            for book_id, genre_id, _ in updated:
+                invalidate_book(book_id, genre_id)
+        except IntegrityError as err:
+            db.session.rollback()
+            return handle_integrity_error(err)
+
+        except OperationalError as err:
+            db.session.rollback()
+            return handle_concurrency_error(err)
+
+    return {"results": results}, 200
+
 # Delete Loan - /loans/id - DELETE
 @loans_bp.route("/<int:loan_id>", methods = ["DELETE"])
+@query_budget(2)
 def delete_loan(loan_id):
     stmt = db.select(Loan).filter_by(id = loan_id)
     loan = db.session.scalar(stmt)
     if loan:
+        if loan.status != "returned":
+            release_loan_slot(loan.member_id)
         db.session.delete(loan)
         db.session.commit()
         return {"message":f"Loan with id {loan_id} was successfully deleted"}
@@ -103,6 +324,7 @@ def delete_loan(loan_id):
 # This is just a theoritical - In case a member wants to delete their loans because they don't want them yet (Or something Like That)
 # Delete Loan - Member ID - /loans/member_id - Delete
 @loans_bp.route("/member/<int:member_id>", methods = ["DELETE"])
+@query_budget(3)
 def delete_loans_from_member(member_id):
     # Query to get all loans for the given member_id
     loans_to_delete = Loan.query.filter_by(member_id=member_id).all()
@@ -111,6 +333,8 @@ def delete_loans_from_member(member_id):
         # Iterate over each loan and delete it
         for loan in loans_to_delete:
             db.session.delete(loan)
+        # None of the member's loans are left, so neither are any active ones
+        db.session.execute(db.update(Member).where(Member.id == member_id).values(active_loan_count = 0))
         
         # Commit the transaction to remove all loans
         db.session.commit()
@@ -121,6 +345,7 @@ def delete_loans_from_member(member_id):
 
 # Update Loan - /loans/id - PUT, PATCH
 @loans_bp.route("/<int:loan_id>", methods=["PUT", "PATCH"])
+@query_budget(9)
 def update_loan(loan_id):
     stmt = db.select(Loan).filter_by(id=loan_id)
     loan = db.session.scalar(stmt)
@@ -131,6 +356,7 @@ def update_loan(loan_id):
 
     if loan:
         try:
+            previous_member_id = loan.member_id
             validated_data = loan_schema.load(body_data)
 
             # Borrow Date and Return Date Validation using validate_date_format
@@ -182,6 +408,13 @@ def update_loan(loan_id):
                 except ValueError:
                     return {"message": "Member ID must be an integer"}, 400
 
+            # Move an unreturned loan's slot over to its new member
+            if loan.status != "returned" and loan.member_id != previous_member_id:
+                release_loan_slot(previous_member_id)
+                if not claim_loan_slot(loan.member_id):
+                    db.session.rollback()
+                    return {"message": f"Member cannot have more than {LoanSchema.MAX_BORROW_LIMIT} active loans."}, 400
+
             db.session.commit()
             return {"message": "Loan updated successfully", "loan": loan_schema.dump(loan)}, 200
 
@@ -191,11 +424,16 @@ def update_loan(loan_id):
         except IntegrityError as err:
             return handle_integrity_error(err)
 
+        except OperationalError as err:
+            db.session.rollback()
+            return handle_concurrency_error(err)
+
     else:
         return {"message": f"Loan with id {loan_id} does not exist"}, 404
     
 # Update Loan By Member - /loans/member/member_id - PUT, PATCH
 @loans_bp.route("/member/<int:member_id>", methods=["PUT", "PATCH"])
+@query_budget(9)
 def update_loan_by_member(member_id):
     stmt = db.select(Loan).filter_by(member_id = member_id)
     loan = db.session.scalar(stmt)
@@ -206,6 +444,7 @@ def update_loan_by_member(member_id):
 
     if loan:
         try:
+            previous_member_id = loan.member_id
             validated_data = loan_schema.load(body_data)
 
             # Borrow Date and Return Date Validation using validate_date_format
@@ -257,6 +496,13 @@ def update_loan_by_member(member_id):
                 except ValueError:
                     return {"message": "Member ID must be an integer"}, 400
 
+            # Move an unreturned loan's slot over to its new member
+            if loan.status != "returned" and loan.member_id != previous_member_id:
+                release_loan_slot(previous_member_id)
+                if not claim_loan_slot(loan.member_id):
+                    db.session.rollback()
+                    return {"message": f"Member cannot have more than {LoanSchema.MAX_BORROW_LIMIT} active loans."}, 400
+
             db.session.commit()
             return {"message": "Loan updated successfully", "loan": loan_schema.dump(loan)}, 200
 
@@ -266,9 +512,114 @@ def update_loan_by_member(member_id):
         except IntegrityError as err:
             return handle_integrity_error(err)
 
+        except OperationalError as err:
+            db.session.rollback()
+            return handle_concurrency_error(err)
+
     else:
         return {"message": f"Member with id {member_id} does not exist"}, 404
     
+def get_listing_args():
+    """
+    Reads the loan listing arguments from the query string.
+
+    `status` filters on the stored status (active, returned or overdue). `view=combined` asks for the
+    all_loans/active_loans shape instead of a single loans list.
+
+    Returns:
+        tuple: (conditions, combined) where conditions is a tuple of WHERE clauses, empty when no status is given.
+
+    Raises:
+        ValidationError: If status or view is not one of the accepted values.
+    """
+    status = request.args.get("status")
+    if status is not None and status not in LOAN_STATUSES:
+        raise ValidationError({"status": f"Status must be one of: {', '.join(LOAN_STATUSES)}."})
+
+    view = request.args.get("view", "list")
+    if view not in ("list", "combined"):
+        raise ValidationError({"view": "View must be one of: list, combined."})
+
+    conditions = (Loan.status == status,) if status is not None else ()
+    return conditions, view == "combined"
+
+
+def dump_loans(loans, combined):
+    """
+    Serialises loans once, as {"loans": [...]} or, for the combined view, as all_loans plus the active_loans
+    (every loan not yet returned) picked out of the same dump.
+    """
+    dumped = loans_schema.dump(loans)
+    if not combined:
+        return {"loans": dumped}
+    return {
+        "all_loans": dumped,
+        "active_loans": [loan for loan in dumped if loan["status"] != "returned"]
+    }
+
+
+def claim_loan_slot(member_id, session = None):
+    """
+    Atomically counts a new loan against a member's borrowing limit.
+
+    Runs a single conditional `UPDATE ... SET active_loan_count = active_loan_count + 1 WHERE active_loan_count < limit`
+    on the denormalised counter instead of counting the member's loans. The caller commits or rolls back.
+
+    Every path that changes loans locks the member rows before the book rows (and the stats rows last), so two of them
+    can never wait on each other's locks; claim the slot before reserve_copy and release it before allocate_copy.
+
+    Args:
+        member_id (int): The ID of the borrowing member.
+        session (Session): The session to run in, db.session by default.
+
+    Returns:
+        bool: False if the member does not exist or is already at LoanSchema.MAX_BORROW_LIMIT.
+    """
+    stmt = (
+        db.update(Member)
+        .where(Member.id == member_id, Member.active_loan_count < LoanSchema.MAX_BORROW_LIMIT)
+        .values(active_loan_count = Member.active_loan_count + 1)
+        .returning(Member.id)
+    )
+    return (session or db.session).execute(stmt).first() is not None
+
+def release_loan_slot(member_id):
+    """
+    Gives back a slot claimed by claim_loan_slot when a loan is returned or deleted. The caller commits.
+    """
+    db.session.execute(
+        db.update(Member)
+        .where(Member.id == member_id, Member.active_loan_count > 0)
+        .values(active_loan_count = Member.active_loan_count - 1)
+    )
+
+def reserve_copy(book_id, session = None):
+    """
+    Atomically takes one copy of a book for a new loan.
+
+    Runs a single conditional `UPDATE ... SET available_copies = available_copies - 1 WHERE available_copies > 0`
+    instead of reading the count in Python, so concurrent checkouts of the same title can never oversell it.
+    The caller is responsible for committing (or rolling back) together with the loan insert.
+
+    Args:
+        book_id (int): The ID of the book being borrowed.
+        session (Session): The session to run in, db.session by default.
+
+    Returns:
+        Row: The book's remaining available_copies, genre_id and author_id, or None if the book does not exist
+        or has no copies available.
+    """
+    stmt = (
+        db.update(Book)
+        .where(Book.id == book_id, Book.available_copies > 0)
+        .values(available_copies = Book.available_copies - 1)
+        .returning(Book.available_copies, Book.genre_id, Book.author_id)
+    )
+    reserved = (session or db.session).execute(stmt).first()
+    if reserved is not None:
+        record_copies(reserved.author_id, -1, session)
+    return reserved
+
 def return_book(loan_id):
     loan = Loan.query.get(loan_id)
     if loan:
@@ -278,20 +629,49 @@ def return_book(loan_id):
         
         # Mark the loan as returned
         loan.status = "returned"  # Mark as returned
-        book = loan.book
-        book.available_copies += 1  # Increment available copies of the book
+        # Give back the member's loan slot and then hand the copy to the head of the book's hold queue, or put it back
+        # on the shelf, in the same transaction. Members before books, like checkouts, so the two can't deadlock.
+        release_loan_slot(loan.member_id)
+        hold, genre_id = allocate_copy(loan.book_id)
+        record_loans(returns = 1)
         db.session.commit()
-        return {"message": "Book returned successfully."}
+        count_loans(returns = 1)
+        if genre_id is not None:
+            invalidate_book(loan.book_id, genre_id)
+        return {"message": "Book returned successfully.", "hold_id": hold.id if hold else None}
     else:
         return {"error": "Loan not found."}
 
 @loans_bp.route("/return/<int:loan_id>", methods=['POST']) 
+@query_budget(8)
 def return_book_route(loan_id):
     """
     Endpoint to return a book.
     """
-    result = return_book(loan_id)
+    try:
+        result = return_book(loan_id)
+    except OperationalError as err:
+        db.session.rollback()
+        return handle_concurrency_error(err)
     if "error" in result:
         return {"message": "Loan not found"}, 404
     else:
-        return {"message": "Book successfully returned"}, 200
\ No newline at end of file
+        return {"message": "Book successfully returned", "hold_id": result["hold_id"]}, 200
+
+
+# Scan Overdue Loans - flask loans scan-overdue
+@loans_bp.cli.command("scan-overdue")
+@click.option("--batch-size", default = SCAN_BATCH_SIZE, show_default = True, help = "Loans updated per transaction.")
+@click.option("--as-of", type = click.DateTime(formats = ["%Y-%m-%d"]), help = "Treat this date as today.")
+@click.option("--every", type = click.IntRange(min = 1), help = "Keep running, scanning again every this many seconds.")
+def scan_overdue_command(batch_size, as_of, every):
+    """Marks active loans past their return date as overdue."""
+    def report(summary):
+        print(f"Marked {summary['marked_overdue']} loans overdue as of {summary['as_of']} in {summary['batches']} batches.", flush = True)
+
+    if every and as_of:
+        raise click.UsageError("--as-of can't be combined with --every")
+    if every:
+        scan_overdue_every(every, batch_size, report)
+    else:
+        report(scan_overdue(as_of.date() if as_of else None, batch_size))
@@ -1,45 +1,124 @@
-from flask import Blueprint, request
+from flask import Blueprint, current_app, request
 from sqlalchemy.exc import IntegrityError
 from psycopg2 import errorcodes
 from marshmallow import ValidationError
 
-from init import db
+from controllers.book_controller import invalidate_book
+from controllers.hold_controller import allocate_copy
+from init import cache, db
 from models.member import Member, member_schema, members_schema
+from utils.autocomplete import DEFAULT_LIMIT, MAX_LIMIT, autocomplete_members, member_prefix_index
 from utils.error_handlers import handle_integrity_error, handle_validation_error
+from utils.etag import conditional_response, load_rows, make_etag, version_select
+from utils.pagination import paginate
+from utils.query_budget import query_budget
+from utils.query_shaping import shaped_select
+from utils.streaming import stream_export
 from utils.strip import validate_and_strip_field
 
 members_bp = Blueprint("members", __name__, url_prefix = "/members")
 
+def invalidate_member(member_id, *membership_numbers):
+    """
+    Drops a member from the entity cache under both its id and its membership number(s), and refreshes it in the
+    in-memory autocomplete index.
+    """
+    cache.invalidate("member", member_id)
+    cache.invalidate("membership_number", *membership_numbers)
+    member_prefix_index.invalidate(member_id)
+
+def remove_member(member):
+    """
+    Deletes a member, and through the cascade their loans and holds, and commits.
+
+    The copies set aside for the member's ready holds are handed on to each book's next waiting hold, or put back on
+    the shelf, as cancel_hold does, so they aren't left reserved for nobody. The member is deleted first, so rows are
+    locked members before books like every checkout.
+    """
+    ready_books = [hold.book_id for hold in member.holds if hold.status == "ready"]
+    db.session.delete(member)
+    db.session.flush()
+    shelved = [(book_id, allocate_copy(book_id)[1]) for book_id in ready_books]
+    db.session.commit()
+    invalidate_member(member.id, member.membership_number)
+    for book_id, genre_id in shelved:
+        if genre_id is not None:
+            invalidate_book(book_id, genre_id)
+
 # Read All - /members - GET
 @members_bp.route("/")
+@query_budget(2)
 def get_members():
-    stmt = db.select(Member).order_by(Member.id)
-    members_list = db.session.scalars(stmt)
-    return members_schema.dump(members_list)
+    stmt = version_select(Member, members_schema).order_by(Member.id)
+    try:
+        versions, next_cursor = paginate(stmt, Member.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
+
+    def produce():
+        members_list = load_rows(Member, members_schema, versions)
+        return {"members": members_schema.dump(members_list), "next_cursor": next_cursor}
+    return conditional_response(make_etag(versions, next_cursor), produce)
+
+# Export All - /members/export - GET
+@members_bp.route("/export")
+@query_budget(1)
+def export_members():
+    stmt = shaped_select(Member, members_schema).order_by(Member.id)
+    return stream_export(stmt, members_schema)
+
+# Autocomplete - /members/autocomplete?prefix= - GET
+@members_bp.route("/autocomplete")
+@query_budget(1)
+def autocomplete():
+    prefix = request.args.get("prefix", "").strip()
+    if not prefix:
+        return {"message": "A prefix must be provided"}, 400
+    limit = request.args.get("limit", DEFAULT_LIMIT, type = int)
+    if limit is None or limit < 1:
+        return {"message": "Limit must be a positive integer"}, 400
+
+    in_memory = current_app.config.get("MEMBER_AUTOCOMPLETE_IN_MEMORY", False)
+    return {"members": autocomplete_members(prefix, min(limit, MAX_LIMIT), in_memory)}
 
 # Read One - /members/id - GET
 @members_bp.route("/<int:member_id>")
+@query_budget(2)
 def get_member(member_id):
-    stmt = db.select(Member).filter_by(id = member_id)
-    member = db.session.scalar(stmt)
-    if member:
-        return member_schema.dump(member)
-    else:
+    versions = db.session.execute(version_select(Member, member_schema).where(Member.id == member_id)).first()
+    if not versions:
         return {"message": f"Member with id {member_id} does not exist"}, 404
+
+    def load():
+        stmt = shaped_select(Member, member_schema).filter_by(id = member_id)
+        member = db.session.scalar(stmt)
+        return member_schema.dump(member) if member else None
+
+    etag = make_etag(versions)
+    return conditional_response(etag, lambda: cache.get_or_load("member", member_id, etag, load))
     
 # Read Member from Membership Number - /members/membership_number - GET
 @members_bp.route("/membership_number/<string:membership_number>")
+@query_budget(2)
 def get_member_membership(membership_number):
-    stmt = db.select(Member).filter_by(membership_number = membership_number)
-    member = db.session.scalar(stmt)
-    if member:
-        return member_schema.dump(member)
-    else:
+    versions = db.session.execute(
+        version_select(Member, member_schema).where(Member.membership_number == membership_number)
+    ).first()
+    if not versions:
         return {"message": f"Member with membership number {membership_number} does not exist"}, 404
+
+    def load():
+        stmt = shaped_select(Member, member_schema).filter_by(membership_number = membership_number)
+        member = db.session.scalar(stmt)
+        return member_schema.dump(member) if member else None
+
+    etag = make_etag(versions)
+    return conditional_response(etag, lambda: cache.get_or_load("membership_number", membership_number, etag, load))
     
 
 # Create Member - /members - POST
 @members_bp.route("/", methods = ["POST"])
+@query_budget(2)
 def create_member():
     try:
         body_data = member_schema.load(request.get_json())
@@ -52,6 +131,7 @@ def create_member():
         )
         db.session.add(new_member)
         db.session.commit()
+        member_prefix_index.invalidate(new_member.id)
         return member_schema.dump(new_member), 201
     
     except ValidationError as err:
@@ -62,30 +142,32 @@ def create_member():
     
 # Delete Member off id - /members/id - DELETE
 @members_bp.route("/<int:member_id>", methods = ["DELETE"])
+# Six to delete the member with their loans and holds, and up to three to pass on the copy of a ready hold
+@query_budget(9)
 def delete_member(member_id):
     stmt = db.select(Member).filter_by(id = member_id)
     member = db.session.scalar(stmt)
     if member:
-        db.session.delete(member)
-        db.session.commit()
+        remove_member(member)
         return {"message": f"Member '{member.name}' was successfully deleted"}
     else:
         return {"message": f"Member with id {member_id} does not exist"},404
 
 # Delete Member off Membership Number - /members/membership_number - DELETE
 @members_bp.route("/membership_number/<string:membership_number>", methods = ["DELETE"])
+@query_budget(9)
 def delete_member_by_number(membership_number):
     stmt = db.select(Member).filter_by(membership_number = membership_number)
     member = db.session.scalar(stmt)
     if member:
-        db.session.delete(member)
-        db.session.commit()
+        remove_member(member)
         return {"message": f"Member '{member.name}' was successfully deleted"}
     else:
         return {"message": f"Member with id {membership_number} does not exist"},404
 
 # Update Member - /members/id - PUT, PATCH
 @members_bp.route("/<int:member_id>", methods = ["PUT", "PATCH"])
+@query_budget(3)
 def update_member(member_id):
     stmt = db.select(Member).filter_by(id = member_id)
     member = db.session.scalar(stmt)
@@ -96,6 +178,7 @@ def update_member(member_id):
 
     if member:
         try:
+            previous_membership_number = member.membership_number
             validated_data = member_schema.load(body_data)
 
               # Update only provided fields
@@ -118,6 +201,7 @@ def update_member(member_id):
                 member.join_date = validated_data["join_date"]
 
             db.session.commit()
+            invalidate_member(member.id, previous_membership_number, member.membership_number)
             return member_schema.dump(member)
 
         except ValidationError as err:
@@ -130,6 +214,7 @@ def update_member(member_id):
     
 # Update Member - /members/membership_number - PUT, PATCH
 @members_bp.route("/membership_number/<string:membership_number>", methods = ["PUT", "PATCH"])
+@query_budget(3)
 def update_member_by_number(membership_number):
     stmt = db.select(Member).filter_by(membership_number = membership_number)
     member = db.session.scalar(stmt)
@@ -140,6 +225,7 @@ def update_member_by_number(membership_number):
 
     if member:
         try:
+            previous_membership_number = member.membership_number
             validated_data = member_schema.load(body_data)
 
               # Update only provided fields
@@ -162,6 +248,7 @@ def update_member_by_number(membership_number):
                 member.join_date = validated_data["join_date"]
 
             db.session.commit()
+            invalidate_member(member.id, previous_membership_number, member.membership_number)
             return member_schema.dump(member)
 
         except ValidationError as err:
@@ -0,0 +1,11 @@
+from flask import Blueprint
+
+from utils.metrics import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+# Prometheus Metrics - /metrics - GET
+@metrics_bp.route("/metrics")
+def get_metrics():
+    body, content_type = metrics.render()
+    return body, 200, {"Content-Type": content_type}
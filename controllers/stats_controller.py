@@ -0,0 +1,92 @@
+from datetime import date
+from flask import Blueprint, request
+from marshmallow import ValidationError
+
+from init import db
+from models.author import Author
+from models.genre import Genre
+from models.member import Member
+from models.stats import AuthorStats, DailyLoanStats, GenreStats
+from utils.error_handlers import handle_validation_error
+from utils.pagination import paginate
+
+stats_bp = Blueprint("stats", __name__, url_prefix = "/stats")
+
+# Every read below comes from the summary tables (or Member.active_loan_count, or the small genres table), so none
+# of them touch the books or loans tables.
+
+def loans_on(day):
+    checkouts, returns = db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(DailyLoanStats.checkouts), 0), db.func.coalesce(db.func.sum(DailyLoanStats.returns), 0))
+        .where(DailyLoanStats.day == day)
+    ).one()
+    return {"date": day.isoformat(), "checkouts": checkouts, "returns": returns}
+
+# Overview - /stats - GET
+@stats_bp.route("/")
+def get_stats():
+    # Genres are counted from their own table, as genre_stats only has rows for genres that have had books
+    books, genres = db.session.execute(
+        db.select(
+            db.func.coalesce(db.func.sum(GenreStats.book_count), 0),
+            db.select(db.func.count(Genre.id)).scalar_subquery()
+        )
+    ).one()
+    return {"books": books, "genres": genres, "loans_today": loans_on(date.today())}
+
+# Books Per Genre - /stats/genres - GET
+@stats_bp.route("/genres")
+def get_genre_stats():
+    rows = db.session.execute(
+        db.select(Genre.id, Genre.genre_name, db.func.coalesce(GenreStats.book_count, 0))
+        .outerjoin(GenreStats, GenreStats.genre_id == Genre.id)
+        .order_by(Genre.id)
+    ).all()
+    return {"genres": [{"genre_id": genre_id, "genre_name": name, "book_count": books} for genre_id, name, books in rows]}
+
+# Copies Available Per Author - /stats/authors - GET
+@stats_bp.route("/authors")
+def get_author_stats():
+    stmt = (
+        db.select(
+            Author.id, Author.name,
+            db.func.coalesce(AuthorStats.book_count, 0).label("book_count"),
+            db.func.coalesce(AuthorStats.available_copies, 0).label("available_copies")
+        )
+        .outerjoin(AuthorStats, AuthorStats.author_id == Author.id)
+        .order_by(Author.id)
+    )
+    try:
+        rows, next_cursor = paginate(stmt, Author.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
+    return {
+        "authors": [
+            {"author_id": row.id, "name": row.name, "book_count": row.book_count, "available_copies": row.available_copies}
+            for row in rows
+        ],
+        "next_cursor": next_cursor
+    }
+
+# Active Loans Per Member - /stats/members - GET
+@stats_bp.route("/members")
+def get_member_stats():
+    stmt = db.select(Member.id, Member.name, Member.active_loan_count).order_by(Member.id)
+    try:
+        rows, next_cursor = paginate(stmt, Member.id)
+    except ValidationError as err:
+        return handle_validation_error(err)
+    return {
+        "members": [{"member_id": row.id, "name": row.name, "active_loans": row.active_loan_count} for row in rows],
+        "next_cursor": next_cursor
+    }
+
+# Loans Per Day - /stats/loans - GET
+@stats_bp.route("/loans")
+def get_loan_stats():
+    day = request.args.get("date")
+    try:
+        day = date.fromisoformat(day) if day else date.today()
+    except ValueError:
+        return {"message": "Date must be in YYYY-MM-DD format"}, 400
+    return loans_on(day)
@@ -0,0 +1,18 @@
+# Loaded by gunicorn from the working directory. Keeps the per-worker Prometheus files in PROMETHEUS_MULTIPROC_DIR
+# (see utils/metrics.py) in step with the workers that are actually running.
+import os
+import shutil
+
+
+def on_starting(server):
+    # Files left by an earlier run would be added to this run's totals
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors = True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
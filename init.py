@@ -1,5 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 
-db = SQLAlchemy()
-ma = Marshmallow()
\ No newline at end of file
+from utils.cache import EntityCache
+from utils.replicas import ReplicaRouter, RoutingSession
+
+db = SQLAlchemy(session_options = {"class_": RoutingSession})
+ma = Marshmallow()
+cache = EntityCache()
+replicas = ReplicaRouter()
\ No newline at end of file
@@ -1,6 +1,8 @@
 from marshmallow import fields, validate
+from sqlalchemy import DDL, event
 
-from init import db, ma
+from init import db
+from utils.instrumentation import InstrumentedSchema
 
 class Author(db.Model):
     """
@@ -10,6 +12,7 @@ class Author(db.Model):
         id (int): The unique identifier for the author.
         name (str): The name of the author.
         birth_year (int): The birth year of the author.
+        version (int): Incremented on every update, used for ETags.
         books (list): A list of books associated with the author.
 
     Relationships:
@@ -20,11 +23,19 @@ class Author(db.Model):
     id = db.Column(db.Integer, primary_key = True)
     name = db.Column(db.String(100), nullable = False, unique = True)
     birth_year = db.Column(db.Integer)
+    # Row version, bumped by every UPDATE (including bulk ones) and used to build ETags
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1", onupdate = db.literal_column("version") + 1)
 
     # Relationship with the Book model, indicating which books belong to this author.
     books = db.relationship("Book", back_populates = "author", cascade = "all, delete-orphan")
 
-class AuthorSchema(ma.Schema):
+# Full-text and trigram indexes behind GET /books/search, PostgreSQL only (see utils.search)
+event.listen(Author.__table__, "after_create", DDL(
+    "CREATE INDEX ix_author_name_tsv ON author USING gin (to_tsvector('simple', name));"
+    "CREATE INDEX ix_author_name_trgm ON author USING gin (name gin_trgm_ops)"
+).execute_if(dialect = "postgresql"))
+
+class AuthorSchema(InstrumentedSchema):
     """
     Marshmallow schema for serialising and deserialising Author objects.
 
@@ -1,7 +1,9 @@
 from marshmallow import fields, validate
+from sqlalchemy import DDL, event
 
-from init import db, ma
+from init import db
 from utils.error_handlers import validate_isbn
+from utils.instrumentation import InstrumentedSchema
 
 class Book(db.Model):
     """
@@ -14,9 +16,11 @@ class Book(db.Model):
         available_copies (int): The number of copies currently available in the library.
         author_id (int): The ID of the author, referencing the authors table.
         genre_id (int): The ID of the genre, referencing the genres table.
+        version (int): Incremented on every update, used for ETags.
         author (Author): The associated author object.
         genre (Genre): The associated genre object.
         loans (list): A list of loan records associated with the book.
+        holds (list): The holds placed on the book.
     """
     __tablename__ = "books"
 
@@ -26,6 +30,8 @@ class Book(db.Model):
     available_copies = db.Column(db.Integer, nullable = False, default = 1)
     author_id = db.Column(db.Integer, db.ForeignKey("author.id"), nullable = False)
     genre_id = db.Column(db.Integer, db.ForeignKey("genre.id"), nullable = False)
+    # Row version, bumped by every UPDATE (including bulk ones) and used to build ETags
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1", onupdate = db.literal_column("version") + 1)
 
     # Relationship With The Author Model
     author = db.relationship("Author", back_populates = "books")
@@ -33,9 +39,24 @@ class Book(db.Model):
     genre = db.relationship("Genre", back_populates = "books")
     # Relationship with the Loan model, indicating which loans are associated with this book.
     loans = db.relationship("Loan", back_populates = "book", cascade = "all, delete-orphan")
+    # Relationship with the Hold model, the queue of members waiting for a copy.
+    holds = db.relationship("Hold", back_populates = "book", cascade = "all, delete-orphan")
 
+    __table_args__ = (
+        # An author's or genre's books in id order, used by the nested dumps and their ETag aggregates
+        db.Index("ix_books_author_id_id", "author_id", "id"),
+        db.Index("ix_books_genre_id_id", "genre_id", "id"),
+    )
+
+# Full-text and trigram indexes behind GET /books/search, PostgreSQL only (see utils.search)
+event.listen(db.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect = "postgresql"))
+event.listen(Book.__table__, "after_create", DDL(
+    "CREATE INDEX ix_books_title_tsv ON books USING gin (to_tsvector('simple', title));"
+    "CREATE INDEX ix_books_title_trgm ON books USING gin (title gin_trgm_ops)"
+).execute_if(dialect = "postgresql"))
 
-class BookSchema(ma.Schema):
+
+class BookSchema(InstrumentedSchema):
     """
     Marshmallow schema for serialising and deserialising Book objects.
 
@@ -58,6 +79,9 @@ class BookSchema(ma.Schema):
 
     author_name = fields.Method("get_author_name")
 
+    # Relationships read while dumping, eager loaded by utils.query_shaping
+    RELATIONSHIPS = ("author",)
+
     def get_author_name(self, obj):
         """
         Retrieves the name of the author associated with the book.
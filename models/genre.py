@@ -1,8 +1,9 @@
 from marshmallow import fields, validate
 from sqlalchemy import Text
 
-from init import db, ma
+from init import db
 from models.book import books_schema
+from utils.instrumentation import InstrumentedSchema
 
 class Genre(db.Model):
     """
@@ -11,6 +12,7 @@ class Genre(db.Model):
     Attributes:
         id (int): The unique identifier for the genre.
         genre_name (str): The name of the genre.
+        version (int): Incremented on every update, used for ETags.
         books (list): A list of books associated with this genre.
 
     Relationships:
@@ -20,11 +22,13 @@ class Genre(db.Model):
     id = db.Column(db.Integer, primary_key = True)
     genre_name = db.Column(db.String(100), nullable = False, unique = True)
     genre_description = db.Column(Text)
+    # Row version, bumped by every UPDATE (including bulk ones) and used to build ETags
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1", onupdate = db.literal_column("version") + 1)
 
     # Relationship with the Book model, indicating which books belong to this genre.
     books = db.relationship("Book", back_populates = "genre", cascade = "all, delete-orphan")
 
-class GenreSchema(ma.Schema):
+class GenreSchema(InstrumentedSchema):
     """
     Marshmallow schema for serialising and deserialising Genre objects.
 
@@ -43,6 +47,9 @@ class GenreSchema(ma.Schema):
 
     books = fields.Nested(books_schema)
 
+    # Relationships read while dumping, eager loaded by utils.query_shaping
+    RELATIONSHIPS = ("books",)
+
     class Meta:
         """
         Specifies the fields to include when serialising the Genre object.
@@ -50,4 +57,5 @@ class GenreSchema(ma.Schema):
         fields = ("id", "genre_name", "genre_description", "books")
 
 genre_schema = GenreSchema()
-genres_schema = GenreSchema(many = True)
\ No newline at end of file
+# Lists leave out the books, which grow without bound; GET /genres/<id>/books pages through them instead
+genres_schema = GenreSchema(many = True, exclude = ("books",))
\ No newline at end of file
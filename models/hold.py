@@ -0,0 +1,85 @@
+from marshmallow import fields
+from datetime import date
+
+from init import db
+from utils.instrumentation import InstrumentedSchema
+
+# waiting: queued for a copy, ready: a returned copy is set aside for the member,
+# fulfilled: the member checked the copy out, cancelled: the member gave up their place
+HOLD_STATUSES = ("waiting", "ready", "fulfilled", "cancelled")
+
+class Hold(db.Model):
+    """
+    Represents a member's place in the queue for a book with no available copies.
+
+    Attributes:
+        id (int): The unique identifier for the hold.
+        book_id (int): The ID of the book being waited for.
+        member_id (int): The ID of the waiting member.
+        position (int): The hold's place in the book's queue. Lower positions are served first.
+        status (str): One of HOLD_STATUSES.
+        placed_date (date): The date the hold was placed.
+        version (int): Incremented on every update, used for ETags.
+        book (Book): The associated book object.
+        member (Member): The associated member object.
+    """
+    __tablename__ = "holds"
+
+    id = db.Column(db.Integer, primary_key = True)
+    book_id = db.Column(db.Integer, db.ForeignKey("books.id"), nullable = False)
+    member_id = db.Column(db.Integer, db.ForeignKey("members.id"), nullable = False)
+    position = db.Column(db.Integer, nullable = False)
+    status = db.Column(db.Enum(*HOLD_STATUSES, name = "hold_status"), nullable = False, default = "waiting", server_default = "waiting")
+    placed_date = db.Column(db.Date, nullable = False, default = date.today)
+    # Row version, bumped by every UPDATE (including bulk ones) and used to build ETags
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1", onupdate = db.literal_column("version") + 1)
+
+    # Relationship with the Book model
+    book = db.relationship("Book", back_populates = "holds")
+    # Relationship with the Member model
+    member = db.relationship("Member", back_populates = "holds")
+
+    __table_args__ = (
+        # Positions are handed out per book, the constraint catches two holds placed at the same moment
+        db.UniqueConstraint("book_id", "position", name = "uni_book_position"),
+        # The head of each book's queue, read when a copy comes back. Partial so served holds drop out of it
+        db.Index(
+            "ix_holds_book_id_waiting", "book_id", "position",
+            postgresql_where = db.text("status = 'waiting'"),
+            sqlite_where = db.text("status = 'waiting'")
+        ),
+        # A member can only be in a book's queue once
+        db.Index(
+            "uni_holds_book_member_open", "book_id", "member_id", unique = True,
+            postgresql_where = db.text("status IN ('waiting', 'ready')"),
+            sqlite_where = db.text("status IN ('waiting', 'ready')")
+        ),
+        # A member's holds in id order
+        db.Index("ix_holds_member_id_id", "member_id", "id"),
+    )
+
+class HoldSchema(InstrumentedSchema):
+    """
+    Marshmallow schema for serialising and deserialising Hold objects.
+
+    Attributes:
+        book_id (int): The ID of the book to wait for.
+        member_id (int): The ID of the waiting member.
+        position (int): The hold's place in the book's queue, set by the API.
+        status (str): The hold's status, set by the API.
+        placed_date (date): The date the hold was placed, set by the API.
+    """
+    book_id = fields.Integer(required = True, strict = True)
+    member_id = fields.Integer(required = True, strict = True)
+    position = fields.Integer(dump_only = True)
+    status = fields.String(dump_only = True)
+    placed_date = fields.Date(dump_only = True)
+
+    class Meta:
+        """
+        Specifies the fields to include when serialising the Hold object.
+        """
+        fields = ("id", "book_id", "member_id", "position", "status", "placed_date")
+
+hold_schema = HoldSchema()
+holds_schema = HoldSchema(many = True)
@@ -1,8 +1,12 @@
-from marshmallow import fields, ValidationError, validates_schema
+from marshmallow import fields, validate, ValidationError, validates_schema
 from datetime import date
 
-from init import db, ma
+from init import db
 from models.book import Book
+from utils.instrumentation import InstrumentedSchema
+
+# Every status a loan can be in, stored as a database enum instead of free-form text
+LOAN_STATUSES = ("active", "returned", "overdue")
 
 class Loan(db.Model):
     """
@@ -15,30 +19,46 @@ class Loan(db.Model):
     return_date = db.Column(db.Date, nullable=False)
     book_id = db.Column(db.Integer, db.ForeignKey("books.id"), nullable=False)
     member_id = db.Column(db.Integer, db.ForeignKey("members.id"), nullable=False)
-    status = db.Column(db.String(50), default="active")  # Add status field to track loan status
+    status = db.Column(db.Enum(*LOAN_STATUSES, name="loan_status"), nullable=False, default="active", server_default="active")  # Add status field to track loan status
+    # Row version, bumped by every UPDATE (including bulk ones) and used to build ETags
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1", onupdate=db.literal_column("version") + 1)
 
     # Relationship with the Book model
     book = db.relationship("Book", back_populates="loans")
     # Relationship with the Member model
     member = db.relationship("Member", back_populates="loans")
 
-    # Unique constraint for the combination of book_id and member_id
-    __table_args__ = (db.UniqueConstraint('book_id', 'member_id', name='uni_book_member'),)
-
-class LoanSchema(ma.Schema):
+    __table_args__ = (
+        # Unique constraint for the combination of book_id and member_id, also serves lookups by book_id
+        db.UniqueConstraint('book_id', 'member_id', name='uni_book_member'),
+        # A member's loans in id order
+        db.Index("ix_loans_member_id_id", "member_id", "id"),
+        # A member's unreturned loans, partial so the returned bulk of the table stays out of it
+        db.Index(
+            "ix_loans_member_id_unreturned", "member_id",
+            postgresql_where=db.text("status <> 'returned'"),
+            sqlite_where=db.text("status <> 'returned'")
+        ),
+        # Loans by status and due date, walked in (return_date, id) order by the overdue scan
+        db.Index("ix_loans_status_return_date", "status", "return_date", "id"),
+    )
+
+class LoanSchema(InstrumentedSchema):
     borrow_date = fields.Date(required=True)
     return_date = fields.Date(required=True)
+    status = fields.String(validate=validate.OneOf(LOAN_STATUSES, error="Status must be one of: {choices}."))
     member_name = fields.Method("get_member_name")
 
     MAX_LOAN_DURATION = 30  # Maximum loan duration in days
     MAX_BORROW_LIMIT = 5    # Maximum number of books a member can borrow at a time
 
+    # Relationships read while dumping, eager loaded by utils.query_shaping
+    RELATIONSHIPS = ("member",)
+
     @validates_schema
     def validate_dates_and_limits(self, data, **kwargs):
         borrow_date = data.get("borrow_date")
         return_date = data.get("return_date")
-        member_id = data.get("member_id")
-        book_id = data.get("book_id")
 
         # Validate borrow and return dates
         if borrow_date and return_date:
@@ -53,28 +73,8 @@ class LoanSchema(ma.Schema):
                     {"return_date": f"Loan duration cannot exceed {self.MAX_LOAN_DURATION} days."}
                 )
 
-        # Validate maximum borrowing limits per member
-        if member_id:
-            active_loans_count = Loan.query.filter(
-                Loan.member_id == member_id,
-                Loan.status == "active"  # Only count active loans
-            ).count()
-
-            if active_loans_count >= self.MAX_BORROW_LIMIT:
-                raise ValidationError(
-                    {"member_id": f"Member cannot have more than {self.MAX_BORROW_LIMIT} active loans."}
-                )
-
-        # Validate available copies of the book
-        if book_id:
-            book = Book.query.get(book_id)
-            if book and book.available_copies <= 0:
-                raise ValidationError(
-                    {"book_id": "There are no available copies of this book to loan."}
-                )
-            # Decrement available copies after the loan
-            book.available_copies -= 1
-            db.session.commit()  # Commit the change to the database
+        # The borrowing limit and available copies are checked and claimed atomically when the loan is created,
+        # see claim_loan_slot and reserve_copy
 
     def get_member_name(self, obj):
         return obj.member.name if obj.member else None
@@ -1,6 +1,8 @@
 from marshmallow import fields, validate
+from sqlalchemy import DDL, event
 
-from init import db, ma
+from init import db
+from utils.instrumentation import InstrumentedSchema
 from utils.validate_date_range import validate_date_range
 
 
@@ -15,9 +17,12 @@ class Member(db.Model):
         membership_number (str): A unique 8-digit membership number for the member.
         email (str): The email address of the member.
         join_date (date): The date the member joined the library.
+        active_loan_count (int): The number of loans the member has not returned yet.
+        version (int): Incremented on every update, used for ETags.
     
     Relationships:
         loans (list): A list of loan records associated with the member, representing the books borrowed by the member.
+        holds (list): The holds the member has placed.
     """
     __tablename__ = "members"
 
@@ -26,11 +31,31 @@ class Member(db.Model):
     membership_number = db.Column(db.String(8), nullable = False, unique = True)
     email = db.Column(db.String(100), nullable = False, unique = True)
     join_date = db.Column(db.Date)
+    # Number of loans not yet returned, maintained by the loan write paths so the borrow limit is an O(1) check
+    active_loan_count = db.Column(db.Integer, nullable = False, default = 0, server_default = "0")
+    # Row version, bumped by every UPDATE (including bulk ones) and used to build ETags
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1", onupdate = db.literal_column("version") + 1)
 
     # Relationship with the Loan model, indicating the books borrowed by the member.
     loans = db.relationship("Loan", back_populates = "member", cascade = "all, delete-orphan")
+    # Relationship with the Hold model, the member's places in book queues.
+    holds = db.relationship("Hold", back_populates = "member", cascade = "all, delete-orphan")
 
-class MemberSchema(ma.Schema):
+# Prefix indexes behind GET /members/autocomplete (see utils.autocomplete). On PostgreSQL the keys use the "C"
+# collation, which like text_pattern_ops compares byte-wise so a prefix is one contiguous range, and which also
+# serves the ORDER BY so the top matches are read straight off the index.
+event.listen(Member.__table__, "after_create", DDL(
+    'CREATE INDEX ix_members_name_prefix ON members ((lower(name) COLLATE "C"));'
+    'CREATE INDEX ix_members_email_prefix ON members ((lower(email) COLLATE "C"));'
+    'CREATE INDEX ix_members_membership_number_prefix ON members ((membership_number COLLATE "C"))'
+).execute_if(dialect = "postgresql"))
+for statement in (
+    "CREATE INDEX ix_members_name_prefix ON members (lower(name))",
+    "CREATE INDEX ix_members_email_prefix ON members (lower(email))"
+):
+    event.listen(Member.__table__, "after_create", DDL(statement).execute_if(dialect = "sqlite"))
+
+class MemberSchema(InstrumentedSchema):
     """
     Marshmallow schema for serialising and deserialising Member objects.
 
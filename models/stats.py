@@ -0,0 +1,52 @@
+from init import db
+
+# Summary tables behind the /stats endpoints, kept current by the write paths through utils.stats. They carry no
+# foreign keys: the author and genre delete paths remove their rows themselves.
+
+class GenreStats(db.Model):
+    """
+    Running totals for one genre.
+
+    Attributes:
+        genre_id (int): The ID of the genre.
+        book_count (int): The number of books in the genre.
+    """
+    __tablename__ = "genre_stats"
+
+    genre_id = db.Column(db.Integer, primary_key = True, autoincrement = False)
+    book_count = db.Column(db.Integer, nullable = False, default = 0, server_default = "0")
+
+
+class AuthorStats(db.Model):
+    """
+    Running totals for one author.
+
+    Attributes:
+        author_id (int): The ID of the author.
+        book_count (int): The number of books by the author.
+        available_copies (int): The copies of the author's books currently on the shelf.
+    """
+    __tablename__ = "author_stats"
+
+    author_id = db.Column(db.Integer, primary_key = True, autoincrement = False)
+    book_count = db.Column(db.Integer, nullable = False, default = 0, server_default = "0")
+    available_copies = db.Column(db.Integer, nullable = False, default = 0, server_default = "0")
+
+
+class DailyLoanStats(db.Model):
+    """
+    Checkouts and returns for one day, split over a few shard rows so concurrent checkouts don't all queue on the
+    same row lock. A day's figures are the sum of its shards.
+
+    Attributes:
+        day (date): The day the loans were checked out or returned.
+        shard (int): Which of the day's rows this is.
+        checkouts (int): Loans created.
+        returns (int): Loans returned.
+    """
+    __tablename__ = "daily_loan_stats"
+
+    day = db.Column(db.Date, primary_key = True)
+    shard = db.Column(db.Integer, primary_key = True, autoincrement = False)
+    checkouts = db.Column(db.Integer, nullable = False, default = 0, server_default = "0")
+    returns = db.Column(db.Integer, nullable = False, default = 0, server_default = "0")
@@ -0,0 +1,100 @@
+import os
+from datetime import date
+
+import pytest
+
+# Read by create_app, so set before the app is built. Set TEST_DATABASE_URI to run against PostgreSQL; its tables are
+# dropped and recreated for every test.
+os.environ["QUERY_BUDGET_MODE"] = "strict"
+os.environ["REQUEST_TIMING_SAMPLE_RATE"] = "0"
+os.environ["SLOW_QUERY_THRESHOLD_MS"] = "0"
+
+from app import create_app
+from init import cache, db
+from models.author import Author
+from models.book import Book
+from models.genre import Genre
+from models.loan import Loan
+from models.member import Member
+from utils.autocomplete import member_prefix_index
+from utils.search import search_index
+from utils.synthetic_data import isbn_13, letters
+
+CACHE_NAMESPACES = ("author", "book", "genre", "member", "membership_number")
+
+
+@pytest.fixture(scope = "session")
+def app(tmp_path_factory):
+    os.environ["DATABASE_URI"] = os.environ.get("TEST_DATABASE_URI") or f"sqlite:///{tmp_path_factory.mktemp('db') / 'lms.db'}"
+    return create_app()
+
+
+@pytest.fixture(autouse = True)
+def database(app):
+    with app.app_context():
+        db.drop_all(bind_key = None)
+        db.create_all(bind_key = None)
+        empty_caches()
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def empty_caches():
+    """Empties the entity cache and in-memory indexes, which outlive the tables dropped between tests."""
+    cache.invalidate_namespace(*CACHE_NAMESPACES)
+    search_index.invalidate()
+    member_prefix_index.invalidate()
+
+
+@pytest.fixture
+def clear_caches():
+    return empty_caches
+
+
+@pytest.fixture
+def add_rows():
+    """
+    Adds count authors, genres, books and members, and a loan of each new book by a new member, returning the books.
+    Names, ISBNs and membership numbers carry on from rows added earlier in the test.
+    """
+    def add(count, available_copies = 2):
+        start = db.session.scalar(db.select(db.func.count(Book.id)))
+        authors = [Author(name = f"Author {letters(start + n)}", birth_year = 1950) for n in range(count)]
+        genres = [Genre(genre_name = f"Genre {letters(start + n)}") for n in range(count)]
+        members = [
+            Member(
+                name = f"Member {letters(start + n)}",
+                membership_number = f"{10000000 + start + n}",
+                email = f"member{start + n}@example.com",
+                join_date = date(2024, 1, 1),
+                active_loan_count = 1,
+            )
+            for n in range(count)
+        ]
+        db.session.add_all(authors + genres + members)
+        db.session.flush()
+        books = [
+            Book(
+                title = f"Book {letters(start + n)}",
+                isbn = isbn_13(start + n),
+                available_copies = available_copies,
+                author_id = author.id,
+                genre_id = genre.id,
+            )
+            for n, (author, genre) in enumerate(zip(authors, genres))
+        ]
+        db.session.add_all(books)
+        db.session.flush()
+        db.session.add_all(
+            Loan(book_id = book.id, member_id = member.id, borrow_date = date(2024, 1, 1), return_date = date(2024, 1, 10))
+            for book, member in zip(books, members)
+        )
+        db.session.commit()
+        empty_caches()
+        return books
+    return add
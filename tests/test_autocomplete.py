@@ -0,0 +1,20 @@
+from init import db
+from models.member import Member
+from utils.autocomplete import autocomplete_members, member_prefix_index
+
+
+def rename_elsewhere(member_id, name):
+    """Renames a member as another worker would: committed, but without invalidating this worker's index."""
+    db.session.execute(db.update(Member).where(Member.id == member_id).values(name = name))
+    db.session.commit()
+
+
+def test_in_memory_index_is_rebuilt_once_it_expires(add_rows, monkeypatch):
+    add_rows(1)
+    assert [member["name"] for member in autocomplete_members("member", 10, in_memory = True)] == ["Member A"]
+
+    rename_elsewhere(1, "Renamed Member")
+    assert autocomplete_members("renamed", 10, in_memory = True) == []
+
+    monkeypatch.setattr(member_prefix_index, "ttl", 0)
+    assert [member["name"] for member in autocomplete_members("renamed", 10, in_memory = True)] == ["Renamed Member"]
@@ -0,0 +1,61 @@
+import io
+
+import utils.book_import
+from init import db
+from models.book import Book
+from models.stats import AuthorStats
+from utils.book_import import import_books
+from utils.synthetic_data import isbn_13, letters
+
+ISBNS = [isbn_13(100 + n) for n in range(3)]
+
+
+def import_csv(lines):
+    rejected = []
+    stream = io.StringIO("title,isbn,available_copies,author_id,genre_id\n" + "".join(f"{line}\n" for line in lines))
+    summary = import_books(stream, "csv", lambda line_number, row, errors: rejected.append((line_number, errors)))
+    return summary, rejected
+
+
+def test_rows_without_an_author_are_rejected(add_rows):
+    add_rows(1)
+
+    summary, rejected = import_csv([f"New Book,{ISBNS[0]},1,,1"])
+
+    assert summary["rejected"] == 1
+    assert rejected == [(2, ["An author name or author_id is required"])]
+
+
+def test_isbn_taken_during_the_import_only_rejects_its_row(add_rows, monkeypatch):
+    add_rows(1)
+    bulk_insert = utils.book_import.bulk_insert
+
+    def racing_bulk_insert(model, rows):
+        # Another writer adds the second ISBN after the duplicate check
+        with db.engine.begin() as connection:
+            connection.execute(db.insert(Book).values(title = "Raced Book", isbn = ISBNS[1], author_id = 1, genre_id = 1))
+        bulk_insert(model, rows)
+    monkeypatch.setattr(utils.book_import, "bulk_insert", racing_bulk_insert)
+
+    summary, rejected = import_csv([f"New Book {letters(n)},{isbn},2,1,1" for n, isbn in enumerate(ISBNS)])
+
+    assert summary == {"read": 3, "imported": 2, "rejected": 1}
+    assert rejected == [(3, ["This ISBN already exists in the system."])]
+    assert set(db.session.scalars(db.select(Book.isbn).where(Book.isbn.in_(ISBNS)))) == set(ISBNS)
+    # Only the rows written are counted
+    assert db.session.get(AuthorStats, 1).book_count == 2
+
+
+def test_jsonl_rows_with_numbers_for_text_fields_are_rejected_not_crashed(add_rows):
+    add_rows(1)
+    rejected = []
+    stream = io.StringIO(
+        f'{{"title": 12345, "isbn": "{ISBNS[0]}", "author_id": 1, "genre_id": 1}}\n'
+        '{"title": "Numeric Isbn", "isbn": 9780306406157, "author_id": 1, "genre_id": 1}\n'
+        f'{{"title": "Good Book", "isbn": "{ISBNS[1]}", "available_copies": 3, "author_id": 1, "genre_id": 1}}\n'
+    )
+
+    summary = import_books(stream, "jsonl", lambda line_number, row, errors: rejected.append(line_number))
+
+    assert summary == {"read": 3, "imported": 1, "rejected": 2}
+    assert rejected == [1, 2]
@@ -0,0 +1,91 @@
+import threading
+from datetime import date, timedelta
+
+import pytest
+from psycopg2 import errorcodes
+from sqlalchemy.exc import OperationalError
+
+from controllers.loan_controller import reserve_copy
+from init import db
+from models.book import Book
+from models.loan import Loan
+from models.member import Member
+from utils.error_handlers import handle_concurrency_error
+
+COPIES = 5
+THREADS = 20
+
+
+def run_together(target, count):
+    """Runs target(index) on count threads released at the same moment, returning their results in order."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target = run, args = (index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_reserve_copy_never_oversells(app, add_rows):
+    book_id = add_rows(1, available_copies = COPIES)[0].id
+
+    def reserve(index):
+        with app.app_context():
+            reserved = reserve_copy(book_id)
+            db.session.commit()
+            return reserved is not None and reserved.available_copies >= 0
+
+    results = run_together(reserve, THREADS)
+
+    assert results.count(True) == COPIES
+    assert db.session.get(Book, book_id).available_copies == 0
+
+
+def test_concurrent_checkouts_never_oversell(app, add_rows):
+    book_id = add_rows(1, available_copies = COPIES)[0].id
+    add_rows(THREADS)
+    # A member per thread, none of whom has borrowed the book yet
+    member_ids = db.session.scalars(db.select(Member.id).order_by(Member.id.desc()).limit(THREADS)).all()
+    today = date.today()
+
+    def checkout(index):
+        body = {
+            "book_id": book_id,
+            "member_id": member_ids[index],
+            "borrow_date": today.isoformat(),
+            "return_date": (today + timedelta(days = 14)).isoformat(),
+        }
+        return app.test_client().post("/loans/", json = body).status_code
+
+    statuses = run_together(checkout, THREADS)
+
+    assert statuses.count(201) == COPIES
+    assert statuses.count(400) == THREADS - COPIES
+    db.session.expire_all()
+    assert db.session.get(Book, book_id).available_copies == 0
+    assert db.session.scalar(db.select(db.func.count(Loan.id)).where(Loan.book_id == book_id)) == 1 + COPIES
+
+
+class DatabaseError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+
+@pytest.mark.parametrize("pgcode", [errorcodes.DEADLOCK_DETECTED, errorcodes.SERIALIZATION_FAILURE])
+def test_deadlocks_are_answered_with_409(pgcode):
+    err = OperationalError("UPDATE members ...", {}, DatabaseError(pgcode))
+    assert handle_concurrency_error(err)[1] == 409
+
+
+def test_other_operational_errors_are_raised():
+    err = OperationalError("UPDATE members ...", {}, DatabaseError(errorcodes.QUERY_CANCELED))
+    with pytest.raises(OperationalError):
+        handle_concurrency_error(err)
@@ -0,0 +1,70 @@
+import pytest
+from flask import g
+
+from init import cache, db
+from models.author import Author
+from models.book import Book
+from models.genre import Genre
+from models.member import Member
+from utils.etag import conditional_response
+from utils.query_budget import counting_queries
+
+# (detail URL, the model of the row it shows, a column and a new value for it)
+DETAIL_URLS = (
+    ("/books/1", Book, "title", "Retitled Book"),
+    ("/authors/1", Author, "name", "Renamed Author"),
+    ("/genres/1", Genre, "genre_name", "Renamed Genre"),
+    ("/members/1", Member, "name", "Renamed Member"),
+    ("/members/membership_number/10000000", Member, "name", "Renamed Member"),
+)
+
+
+@pytest.mark.parametrize("url, model, column, value", DETAIL_URLS)
+def test_write_from_another_process_is_not_served_from_cache(client, add_rows, url, model, column, value):
+    add_rows(1)
+    first = client.get(url)
+    assert client.get(url, headers = {"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    # As another worker would: committed, but without invalidating this worker's cache
+    db.session.execute(db.update(model).where(model.id == 1).values({column: value}))
+    db.session.commit()
+
+    second = client.get(url)
+    assert second.json[column] == value
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert client.get(url, headers = {"If-None-Match": first.headers["ETag"]}).status_code == 200
+    assert client.get(url, headers = {"If-None-Match": second.headers["ETag"]}).status_code == 304
+
+
+def test_replica_reads_do_not_fill_the_cache(app):
+    with app.test_request_context("/books/1"):
+        g.replica = "replica_1"
+        cache.set("book", 1, "replica-version", {"title": "Stale Title"})
+        assert cache.get("book", 1, "replica-version") is None
+
+        g.replica = None
+        cache.set("book", 1, "primary-version", {"title": "Current Title"})
+        g.replica = "replica_1"
+        assert cache.get("book", 1, "primary-version") == {"title": "Current Title"}
+
+
+def test_row_deleted_before_its_body_is_loaded_is_not_found(app):
+    with app.test_request_context("/books/1"):
+        response = conditional_response("etag-of-a-deleted-row", lambda: None)
+
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+
+
+@pytest.mark.parametrize("url", ("/loans/?status=active", "/loans/member/1?status=active"))
+def test_first_fetch_of_a_loan_listing_is_one_query(client, add_rows, url):
+    add_rows(3)
+
+    with counting_queries() as queries:
+        first = client.get(url)
+    assert first.status_code == 200
+    assert queries.total == 1
+
+    # The ETag built alongside the rows is the one revalidation builds from the versions alone
+    assert client.get(url, headers = {"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert client.get(url, headers = {"If-None-Match": '"stale"'}).json == first.json
@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+
+import pytest
+
+from init import db
+from models.book import Book
+from models.hold import Hold
+from models.loan import Loan
+
+
+@pytest.fixture
+def queue(client, add_rows):
+    """
+    A book with no copies on the shelf, borrowed by its first member, and held by the other two in turn. Returns the
+    book's id, the borrowing loan's id and the two holds' ids.
+    """
+    books = add_rows(3, available_copies = 0)
+    book_id = books[0].id
+    loan_id, *_ = db.session.scalars(db.select(Loan.id).order_by(Loan.id)).all()
+    _, *member_ids = db.session.scalars(db.select(Loan.member_id).order_by(Loan.id)).all()
+    hold_ids = []
+    for member_id in member_ids:
+        response = client.post("/holds/", json = {"book_id": book_id, "member_id": member_id})
+        assert response.status_code == 201
+        hold_ids.append(response.get_json()["id"])
+    return book_id, loan_id, hold_ids
+
+
+def hold_status(hold_id):
+    db.session.expire_all()
+    hold = db.session.get(Hold, hold_id)
+    return hold.status if hold else None
+
+
+def test_returned_borrowers_cannot_hold_the_book_again(client, queue):
+    book_id, loan_id, _ = queue
+    loan = db.session.get(Loan, loan_id)
+    assert client.post(f"/loans/return/{loan_id}").status_code == 200
+
+    response = client.post("/holds/", json = {"book_id": book_id, "member_id": loan.member_id})
+
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "This member has already borrowed this book."
+
+
+def test_deleting_a_member_passes_their_ready_copy_on(client, queue):
+    book_id, loan_id, (first_hold, second_hold) = queue
+    assert client.post(f"/loans/return/{loan_id}").get_json()["hold_id"] == first_hold
+
+    assert client.delete(f"/members/{db.session.get(Hold, first_hold).member_id}").status_code == 200
+    assert hold_status(first_hold) is None
+    assert hold_status(second_hold) == "ready"
+
+    assert client.delete(f"/members/{db.session.get(Hold, second_hold).member_id}").status_code == 200
+    assert db.session.get(Book, book_id).available_copies == 1
+
+
+def test_batch_checkouts_take_the_copy_set_aside_for_them(client, queue):
+    book_id, loan_id, (first_hold, second_hold) = queue
+    client.post(f"/loans/return/{loan_id}")
+    today = date.today()
+    body = [
+        {
+            "book_id": book_id,
+            "member_id": db.session.get(Hold, hold_id).member_id,
+            "borrow_date": today.isoformat(),
+            "return_date": (today + timedelta(days = 14)).isoformat(),
+        }
+        for hold_id in (first_hold, second_hold)
+    ]
+
+    results = client.post("/loans/batch", json = body).get_json()["results"]
+
+    assert [result["status"] for result in results] == [201, 400]
+    assert hold_status(first_hold) == "fulfilled"
+    assert hold_status(second_hold) == "waiting"
+    assert db.session.get(Book, book_id).available_copies == 0
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.mark.parametrize("query", ["limit=abc", "limit=0", "limit=-1", "limit=", "after=abc"])
+def test_invalid_page_arguments_are_rejected(client, add_rows, query):
+    add_rows(2)
+
+    assert client.get(f"/books/?{query}").status_code == 400
+
+
+def test_limit_sizes_the_page(client, add_rows):
+    add_rows(3)
+
+    page = client.get("/books/?limit=2").json
+    assert len(page["books"]) == 2
+    assert len(client.get(f"/books/?cursor={page['next_cursor']}").json["books"]) == 1
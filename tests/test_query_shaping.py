@@ -0,0 +1,54 @@
+import pytest
+
+from init import db
+from utils.query_budget import counting_queries
+
+# Every read endpoint that dumps related rows, with the id of the first row added where it takes one
+READ_URLS = (
+    "/books/",
+    "/books/1",
+    "/books/export",
+    "/genres/",
+    "/genres/1",
+    "/genres/1/books",
+    "/genres/export",
+    "/authors/",
+    "/members/",
+    "/loans/",
+    "/loans/?view=combined",
+    "/loans/1",
+    "/loans/member/1",
+    "/loans/export",
+)
+
+
+def statements(client, clear_caches, url):
+    clear_caches()
+    with counting_queries() as queries:
+        response = client.get(url)
+        response.get_data()
+    assert response.status_code == 200, response.get_data(as_text = True)
+    return queries.total
+
+
+@pytest.mark.parametrize("url", READ_URLS)
+def test_statement_count_does_not_grow_with_rows(client, add_rows, clear_caches, url):
+    add_rows(2)
+    few = statements(client, clear_caches, url)
+    add_rows(30)
+    assert statements(client, clear_caches, url) == few
+
+
+def test_genre_eager_loads_books_and_their_authors(client, add_rows, clear_caches):
+    books = add_rows(1)
+    # Ten more books in the first genre, each by its own author
+    for book in add_rows(10):
+        book.genre_id = books[0].genre_id
+    db.session.commit()
+    clear_caches()
+
+    with counting_queries() as queries:
+        response = client.get("/genres/1")
+    assert len(response.json["books"]) == 11
+    assert all(book["author_name"] for book in response.json["books"])
+    assert queries.total <= 3
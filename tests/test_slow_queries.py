@@ -0,0 +1,30 @@
+import json
+import logging
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+import utils.query_timing
+from init import db
+from utils.slow_queries import SlowQueryLog, summarise
+
+
+def test_failed_statements_are_logged_with_their_error(monkeypatch, caplog, tmp_path):
+    # Every statement is slow enough; the tests otherwise run with the log turned off
+    log = SlowQueryLog()
+    monkeypatch.setattr(utils.query_timing, "_failure_subscribers", [log.check_failure])
+
+    with caplog.at_level(logging.INFO, logger = "utils.slow_queries"):
+        with pytest.raises(DBAPIError):
+            db.session.execute(db.text("SELECT * FROM missing_table WHERE id = :id"), {"id": 1})
+
+    entry, = [json.loads(record.getMessage()) for record in caplog.records]
+    assert "missing_table" in entry["error"]
+    assert entry["plan"] is None
+    assert entry["fingerprint"] and entry["ms"] >= 0
+
+    path = tmp_path / "slow_queries.log"
+    path.write_text(json.dumps(entry) + "\n")
+    group, = summarise(str(path))
+    assert group["failed"] == 1
+    assert group["error"] == entry["error"]
@@ -0,0 +1,43 @@
+import pytest
+
+from init import db
+from models.book import Book
+from models.genre import Genre
+from models.stats import AuthorStats, GenreStats
+from utils.query_budget import counting_queries
+from utils.stats import rebuild_stats
+
+# Deleting an author or genre takes its books out of the other side's totals, whatever number of rows that touches
+DELETES = [
+    ("/authors/1", Book.author_id, GenreStats.book_count),
+    ("/genres/1", Book.genre_id, AuthorStats.book_count),
+]
+
+
+def delete_shared(client, add_rows, count, url, owner, totals):
+    """Adds count books, all by owner 1, deletes owner 1 and returns how many statements that took."""
+    add_rows(count)
+    db.session.execute(db.update(Book).values({owner: 1}))
+    rebuild_stats()
+    with counting_queries() as queries:
+        assert client.delete(url).status_code == 200
+    assert set(db.session.scalars(db.select(totals))) == {0}
+    return queries.total
+
+
+@pytest.mark.parametrize("url, owner, totals", DELETES)
+def test_deletes_update_the_totals_in_constant_statements(client, add_rows, clear_caches, url, owner, totals):
+    few = delete_shared(client, add_rows, 2, url, owner, totals)
+    db.drop_all(bind_key = None)
+    db.create_all(bind_key = None)
+    clear_caches()
+
+    assert delete_shared(client, add_rows, 30, url, owner, totals) == few
+
+
+def test_overview_counts_genres_without_books(client, add_rows):
+    add_rows(2)
+    db.session.add(Genre(genre_name = "Empty Genre"))
+    db.session.commit()
+
+    assert client.get("/stats/").json["genres"] == 3
@@ -0,0 +1,37 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from utils.pool import async_engine_args, init_pools
+
+
+class AsyncDatabase:
+    """
+    The async counterpart of db for the ASGI app: an AsyncEngine on the primary database and AsyncSessions on it.
+
+    The models, schemas and statement builders (version_select, shaped_select, ...) are shared with the WSGI app.
+    Sync helpers that take a session can run inside an async view through AsyncSession.run_sync.
+    """
+    def __init__(self):
+        self.engine = None
+        self._sessionmaker = None
+
+    def init_app(self, app, url):
+        """
+        Creates the engine for url, normally the WSGI app's resolved db.engine.url, so relative SQLite paths point
+        at the same file.
+        """
+        url, options = async_engine_args(url)
+        self.engine = create_async_engine(url, **options)
+        init_pools([self.engine.sync_engine])
+        # Views dump rows after committing them, so commits must not expire the loaded attributes
+        self._sessionmaker = async_sessionmaker(self.engine, expire_on_commit = False)
+
+        @app.after_serving
+        async def dispose_engine():
+            await self.engine.dispose()
+
+    def session(self):
+        """Returns a new AsyncSession, to be used as `async with async_db.session() as session`."""
+        return self._sessionmaker()
+
+
+async_db = AsyncDatabase()
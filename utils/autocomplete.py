@@ -0,0 +1,143 @@
+import bisect
+import threading
+import time
+
+from init import db
+from models.member import Member
+
+AUTOCOMPLETE_FIELDS = ("name", "email", "membership_number")
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def prefix_upper_bound(prefix):
+    """Returns the smallest string greater than every string starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def prefix_key(column):
+    """The indexed expression for a field: lower-cased, in the "C" collation on PostgreSQL."""
+    key = column if column.key == "membership_number" else db.func.lower(column)
+    if db.session.connection().dialect.name == "postgresql":
+        key = key.collate("C")
+    return key
+
+
+def database_autocomplete(prefix, limit):
+    """
+    Finds the members whose name, email or membership number starts with prefix, with one range scan per field.
+
+    Each field contributes at most limit rows read in key order from its prefix index, so the cost depends on
+    limit rather than on how many members match.
+    """
+    branches = []
+    for field in AUTOCOMPLETE_FIELDS:
+        key = prefix_key(getattr(Member, field))
+        branch = (
+            db.select(Member.id, Member.name, Member.membership_number, Member.email, key.label("match"))
+            .where(key >= prefix, key < prefix_upper_bound(prefix))
+            .order_by(key)
+            .limit(limit)
+        )
+        # Wrapped in a subquery, as SQLite does not allow ORDER BY/LIMIT on the parts of a UNION
+        branches.append(db.select(branch.subquery()))
+    return db.session.execute(db.union_all(*branches)).all()
+
+
+class PrefixIndex:
+    """
+    In-memory sorted keys for member autocomplete, used instead of the database when
+    MEMBER_AUTOCOMPLETE_IN_MEMORY is set.
+
+    Built on the first lookup and then kept current by invalidate(), which the member write paths call once they
+    commit: members passed by id are re-read on the next lookup, and a call without ids rebuilds everything.
+    Each worker process keeps its own copy, which only hears about its own writes, so it is also rebuilt once it is
+    MEMBER_AUTOCOMPLETE_TTL seconds old to pick up those of the other workers.
+    """
+    def __init__(self):
+        self.ttl = 60
+        self._keys = []  # Sorted (key, member_id) pairs for every field
+        self._members = {}  # member_id -> (id, name, membership_number, email, keys)
+        self._dirty = set()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.setdefault("MEMBER_AUTOCOMPLETE_TTL", 60)
+
+    def invalidate(self, *member_ids):
+        with self._lock:
+            if not member_ids:
+                self._loaded = False
+            elif self._loaded:
+                self._dirty.update(member_ids)
+
+    def _rows(self, member_ids = None):
+        stmt = db.select(Member.id, Member.name, Member.membership_number, Member.email)
+        if member_ids is not None:
+            stmt = stmt.where(Member.id.in_(member_ids))
+        return db.session.execute(stmt)
+
+    @staticmethod
+    def _member_keys(row):
+        return {row.name.lower(), row.email.lower(), row.membership_number}
+
+    def _refresh(self):
+        if not self._loaded or time.monotonic() - self._loaded_at >= self.ttl:
+            self._members = {row.id: (*row, self._member_keys(row)) for row in self._rows()}
+            self._keys = sorted((key, member_id) for member_id, member in self._members.items() for key in member[-1])
+            self._dirty.clear()
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+        elif self._dirty:
+            dirty = list(self._dirty)
+            self._dirty.clear()
+            for member_id in dirty:
+                member = self._members.pop(member_id, None)
+                for key in member[-1] if member else ():
+                    del self._keys[bisect.bisect_left(self._keys, (key, member_id))]
+            for row in self._rows(dirty):
+                member = self._members[row.id] = (*row, self._member_keys(row))
+                for key in member[-1]:
+                    bisect.insort(self._keys, (key, row.id))
+
+    def search(self, prefix, limit):
+        """Returns up to limit (id, name, membership_number, email, match) rows in key order."""
+        with self._lock:
+            self._refresh()
+            rows = {}
+            position = bisect.bisect_left(self._keys, (prefix,))
+            upper = prefix_upper_bound(prefix)
+            while position < len(self._keys) and self._keys[position][0] < upper and len(rows) < limit:
+                key, member_id = self._keys[position]
+                rows.setdefault(member_id, (*self._members[member_id][:4], key))
+                position += 1
+            return list(rows.values())
+
+
+member_prefix_index = PrefixIndex()
+
+
+def autocomplete_members(prefix, limit, in_memory = False):
+    """
+    Returns up to limit members whose name, email or membership number starts with prefix (case-insensitively),
+    ordered by the matching value.
+
+    Args:
+        prefix (str): The text typed so far.
+        limit (int): The maximum number of members to return.
+        in_memory (bool): Use member_prefix_index instead of the database's prefix indexes.
+
+    Returns:
+        list: Dicts with the member's id, name, membership_number and email.
+    """
+    prefix = prefix.lower()
+    rows = member_prefix_index.search(prefix, limit) if in_memory else database_autocomplete(prefix, limit)
+
+    members = {}
+    for member_id, name, membership_number, email, match in sorted(rows, key = lambda row: (row[-1], row[0])):
+        members.setdefault(member_id, {
+            "id": member_id, "name": name, "membership_number": membership_number, "email": email
+        })
+    return list(members.values())[:limit]
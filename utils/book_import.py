@@ -0,0 +1,244 @@
+import csv
+import json
+import psycopg2
+from marshmallow import EXCLUDE, ValidationError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from init import db
+from models.author import Author
+from models.book import Book, BookSchema
+from models.genre import Genre
+from utils.bulk_insert import bulk_insert
+from utils.stats import record_books
+from utils.error_handlers import isbn_format_error
+
+DEFAULT_CHUNK_SIZE = 5000
+IMPORT_FORMATS = ("csv", "jsonl")
+
+# Only the title rules are reused from BookSchema; ISBNs are checked in bulk instead of one SELECT per row
+title_schema = BookSchema(only = ("title",), unknown = EXCLUDE)
+
+
+def read_rows(stream, file_format):
+    """
+    Incrementally parses a CSV or JSONL text stream.
+
+    Yields:
+        tuple: (line_number, row, error) where row is a dict, or the raw line when error is set.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, line.rstrip("\n"), "Row is not valid JSON."
+            continue
+        if not isinstance(row, dict):
+            yield line_number, row, "Row must be a JSON object."
+            continue
+        yield line_number, row, None
+
+
+def text(value):
+    """A field as stripped text, whatever JSON type it came in as. Missing and null fields are empty."""
+    return "" if value is None else str(value).strip()
+
+
+def check_row(row):
+    """
+    Runs the checks that need no database access on one imported row.
+
+    Returns:
+        tuple: (values, errors) where values holds the cleaned fields and errors lists what is wrong with the row.
+    """
+    errors = []
+    values = {}
+
+    try:
+        values["title"] = title_schema.load({"title": text(row.get("title"))})["title"]
+    except ValidationError as err:
+        errors.extend(" ".join(messages) for messages in err.messages.values())
+
+    isbn = text(row.get("isbn"))
+    isbn_error = isbn_format_error(isbn)
+    if isbn_error:
+        errors.append(isbn_error)
+    values["isbn"] = isbn
+
+    try:
+        copies = row.get("available_copies")
+        values["available_copies"] = 1 if copies in (None, "") else int(copies)
+        if values["available_copies"] < 0:
+            errors.append("Available copies cannot be negative")
+    except (TypeError, ValueError):
+        errors.append("Available copies must be an integer")
+
+    for related, article in (("author", "An"), ("genre", "A")):
+        name = row.get(f"{related}_name") or row.get(related)
+        related_id = row.get(f"{related}_id")
+        if name:
+            values[related] = str(name).strip()
+        elif related_id not in (None, ""):
+            try:
+                values[related] = int(related_id)
+            except (TypeError, ValueError):
+                errors.append(f"{related.capitalize()} ID must be an integer")
+        else:
+            errors.append(f"{article} {related} name or {related}_id is required")
+
+    return values, errors
+
+
+def lookup_ids(model, name_column, keys):
+    """
+    Resolves a mix of names and ids to ids with a single query.
+
+    Returns:
+        dict: Maps every name or id that exists to its id.
+    """
+    names = {key for key in keys if isinstance(key, str)}
+    ids = {key for key in keys if isinstance(key, int)}
+    if not names and not ids:
+        return {}
+
+    stmt = db.select(model.id, name_column).where(db.or_(name_column.in_(names), model.id.in_(ids)))
+    resolved = {}
+    for row_id, name in db.session.execute(stmt):
+        resolved[row_id] = row_id
+        resolved[name] = row_id
+    return resolved
+
+
+def import_chunk(chunk, reject, summary):
+    """
+    Validates and writes one chunk of parsed rows in its own transaction.
+
+    Authors, genres and already existing ISBNs are each looked up with one query for the whole chunk.
+    """
+    checked = []
+    for line_number, row in chunk:
+        values, errors = check_row(row)
+        if errors:
+            reject(line_number, row, errors)
+        else:
+            checked.append((line_number, row, values))
+
+    authors = lookup_ids(Author, Author.name, {values["author"] for _, _, values in checked})
+    genres = lookup_ids(Genre, Genre.genre_name, {values["genre"] for _, _, values in checked})
+    existing_isbns = set(db.session.scalars(
+        db.select(Book.isbn).where(Book.isbn.in_({values["isbn"] for _, _, values in checked}))
+    ))
+
+    rows = []
+    written = []
+    for line_number, row, values in checked:
+        errors = []
+        if values["author"] not in authors:
+            errors.append(f"Author '{values['author']}' does not exist")
+        if values["genre"] not in genres:
+            errors.append(f"Genre '{values['genre']}' does not exist")
+        if values["isbn"] in existing_isbns:
+            errors.append("This ISBN already exists in the system.")
+        if errors:
+            reject(line_number, row, errors)
+            continue
+
+        existing_isbns.add(values["isbn"])
+        written.append((line_number, row))
+        rows.append({
+            "title": values["title"],
+            "isbn": values["isbn"],
+            "available_copies": values["available_copies"],
+            "author_id": authors[values["author"]],
+            "genre_id": genres[values["genre"]]
+        })
+
+    if not rows:
+        return
+    try:
+        try:
+            bulk_insert(Book, rows)
+        except (IntegrityError, psycopg2.Error):
+            # Another writer added one of these ISBNs since the duplicate check. Write the chunk again, skipping the
+            # ISBNs that now exist, and reject just those rows.
+            db.session.rollback()
+            inserted = insert_new_isbns(rows)
+            for (line_number, row), values in zip(written, rows):
+                if values["isbn"] not in inserted:
+                    reject(line_number, row, ["This ISBN already exists in the system."])
+            written = [written_row for written_row, values in zip(written, rows) if values["isbn"] in inserted]
+            rows = [values for values in rows if values["isbn"] in inserted]
+
+        # Summary totals for the whole chunk, one upsert per author and per genre
+        totals = {}
+        for row in rows:
+            books, copies = totals.get((row["author_id"], row["genre_id"]), (0, 0))
+            totals[(row["author_id"], row["genre_id"])] = (books + 1, copies + row["available_copies"])
+        for (author_id, genre_id), (books, copies) in totals.items():
+            record_books(author_id, genre_id, books, copies)
+        db.session.commit()
+        summary["imported"] += len(rows)
+    except (IntegrityError, psycopg2.Error) as err:
+        # Anything but a duplicate ISBN, e.g. an author deleted since the lookup
+        db.session.rollback()
+        for line_number, row in written:
+            reject(line_number, row, [f"Chunk could not be written: {err}"])
+
+
+def insert_new_isbns(rows):
+    """
+    Inserts the rows whose ISBN isn't taken yet with `INSERT ... ON CONFLICT (isbn) DO NOTHING`.
+
+    Returns:
+        set: The ISBNs that were inserted.
+    """
+    insert = postgresql.insert if db.session.connection().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(Book).on_conflict_do_nothing(index_elements = ["isbn"]).returning(Book.isbn)
+    return set(db.session.scalars(stmt, rows))
+
+
+def import_books(stream, file_format = "csv", reject = None, chunk_size = DEFAULT_CHUNK_SIZE):
+    """
+    Imports books from a CSV or JSONL text stream in chunks.
+
+    Each row needs a title, an ISBN, an author (name or author_id) and a genre (name or genre_id);
+    available_copies defaults to 1. Rows that fail any check are passed to reject and skipped.
+
+    Args:
+        stream (TextIO): The file or request body to read from.
+        file_format (str): Either "csv" or "jsonl".
+        reject (callable): Called as reject(line_number, row, errors) for every rejected row.
+        chunk_size (int): The number of rows validated and written per transaction.
+
+    Returns:
+        dict: Counts of rows read, imported and rejected.
+    """
+    summary = {"read": 0, "imported": 0, "rejected": 0}
+
+    def on_reject(line_number, row, errors):
+        summary["rejected"] += 1
+        if reject:
+            reject(line_number, row, errors)
+
+    chunk = []
+    for line_number, row, error in read_rows(stream, file_format):
+        summary["read"] += 1
+        if error:
+            on_reject(line_number, row, [error])
+            continue
+        chunk.append((line_number, row))
+        if len(chunk) >= chunk_size:
+            import_chunk(chunk, on_reject, summary)
+            chunk = []
+    if chunk:
+        import_chunk(chunk, on_reject, summary)
+
+    return summary
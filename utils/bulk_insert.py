@@ -0,0 +1,30 @@
+import csv
+import io
+
+from init import db
+
+
+def bulk_insert(model, rows):
+    """
+    Inserts a batch of rows, through COPY on PostgreSQL or a multi-row INSERT elsewhere.
+
+    Args:
+        model (Model): The model whose table the rows go into.
+        rows (list): Dicts keyed by column name, all with the same keys.
+    """
+    if not rows:
+        return
+
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql":
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(tuple(row[column] for column in columns) for row in rows)
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(
+            f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    else:
+        db.session.execute(db.insert(model), rows)
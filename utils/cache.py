@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+
+from utils.replicas import reading_replica
+
+
+class CacheBackend:
+    """
+    Interface for the storage behind EntityCache.
+
+    Keys are (namespace, key) tuples and values are already serialised dicts. A shared backend (e.g. one backed
+    by Redis) can be plugged in by subclassing this and passing an instance to EntityCache or ENTITY_CACHE_BACKEND.
+    """
+    def get(self, key):
+        """Returns the cached value, or None if it is missing or expired."""
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def delete_namespace(self, namespace):
+        """Removes every key in a namespace."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Returns a dict of counters, at least hits, misses and evictions."""
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """
+    A bounded, thread-safe in-process LRU cache with a time to live.
+
+    Attributes:
+        max_size (int): The number of entries kept before the least recently used one is evicted.
+        ttl (float): Seconds an entry stays valid after it is set.
+    """
+    def __init__(self, max_size = 10000, ttl = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last = False)
+                self._counters["evictions"] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._counters["invalidations"] += 1
+
+    def delete_namespace(self, namespace):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == namespace]:
+                del self._entries[key]
+                self._counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "size": len(self._entries), "max_size": self.max_size, "ttl": self.ttl}
+
+
+class EntityCache:
+    """
+    Read-through cache for serialised single-entity GET responses.
+
+    Handlers load through get_or_load and the write paths call invalidate once their change is committed. Each entry
+    also records the version it was loaded at, e.g. the ETag built from the row versions, and handlers pass the
+    version they have just read: an entry for any other version is a miss. So a write committed by another gunicorn
+    worker, which only invalidates that worker's cache, is never answered with the old body and the new ETag.
+
+    The price is that a hit still costs one query, the cheap primary key lookup of the versions, and saves the other:
+    loading the row with its eager loads and serialising it. Trusting the cached version instead would make a hit
+    free of database work, but each worker would then serve bodies the other workers had changed until the TTL ran
+    out, which the ETags' consumers (conditional GETs and If-None-Match revalidation) can't tolerate.
+
+    Requests reading from a replica (see utils.replicas) use the cache but never fill it. The version check already
+    keeps a lagging replica's body from being served with a newer ETag, but the entry would push out the current
+    one, and every client reading the primary would then miss until it was loaded again.
+    """
+    def __init__(self, backend = None):
+        self.backend = backend
+        self.enabled = True
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault("ENTITY_CACHE_ENABLED", True)
+        app.config.setdefault("ENTITY_CACHE_SIZE", 10000)
+        app.config.setdefault("ENTITY_CACHE_TTL", 60)
+        if self.backend is None:
+            self.backend = app.config.get("ENTITY_CACHE_BACKEND") or LRUCache(
+                app.config["ENTITY_CACHE_SIZE"], app.config["ENTITY_CACHE_TTL"]
+            )
+
+    def get_or_load(self, namespace, key, version, load):
+        """
+        Returns the value cached for (namespace, key) at version, calling load() and caching its result on a miss.
+
+        load should return the serialised entity, or None if it does not exist. Missing entities are not cached.
+        """
+        value = self.get(namespace, key, version)
+        if value is None:
+            value = load()
+            if value is not None:
+                self.set(namespace, key, version, value)
+        return value
+
+    def get(self, namespace, key, version):
+        """
+        Returns the value cached for (namespace, key) if it was cached at version, or None. For callers that can't
+        load through a callable.
+        """
+        if not self.enabled or self.backend is None:
+            return None
+        entry = self.backend.get((namespace, key))
+        if entry is None or entry["version"] != version:
+            return None
+        return entry["value"]
+
+    def set(self, namespace, key, version, value):
+        if self.enabled and self.backend is not None and not reading_replica():
+            self.backend.set((namespace, key), {"version": version, "value": value})
+
+    def invalidate(self, namespace, *keys):
+        if self.backend is not None:
+            for key in keys:
+                self.backend.delete((namespace, key))
+
+    def invalidate_namespace(self, *namespaces):
+        if self.backend is not None:
+            for namespace in namespaces:
+                self.backend.delete_namespace(namespace)
+
+    def stats(self):
+        return self.backend.stats() if self.backend is not None else {}
@@ -1,6 +1,6 @@
 import re
 from marshmallow import ValidationError, validate
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from psycopg2 import errorcodes
 
 from init import db
@@ -55,37 +55,62 @@ def handle_integrity_error(err: IntegrityError):
         return format_error_response("An integrity error occurred. Please try again", status_code=400)
 
 
+def handle_concurrency_error(err: OperationalError):
+    """
+    Answers a deadlock or serialisation failure, which only happens because another transaction ran at the same time,
+    with 409 so the client can simply retry. Any other OperationalError is raised again. The caller rolls back first.
+    """
+    if getattr(err.orig, "pgcode", None) not in (errorcodes.DEADLOCK_DETECTED, errorcodes.SERIALIZATION_FAILURE):
+        raise err
+    return format_error_response("The request clashed with another one changing the same rows. Please try again.", status_code=409)
+
+
+# Define strict regex patterns for ISBN-10 and ISBN-13
+ISBN_10_PATTERN = re.compile(r"^\d{1,5}-\d{1,7}-\d{1,6}-\d{1,3}[\dX]$")  # ISBN-10 pattern
+ISBN_13_PATTERN = re.compile(r"^\d{3}-\d{1,5}-\d{1,7}-\d{1,6}-\d{1}$")  # ISBN-13 pattern
+
+
+def isbn_format_error(value):
+    """
+    Checks the format of an ISBN without touching the database.
+
+    Returns:
+        str: A description of what is wrong with the ISBN, or None if the format is valid.
+    """
+    # Check if the value matches ISBN-10 or ISBN-13 format
+    if ISBN_10_PATTERN.match(value) or ISBN_13_PATTERN.match(value):
+        return None
+
+    error_message = "ISBN must be either in 10-digit or 13-digit format."
+
+    # If the length is too short or too long, append detailed message
+    if len(value) < 10:
+        error_message += " It appears to be too short to be a valid ISBN."
+    elif len(value) > 13:
+        error_message += " It seems too long to be a valid ISBN."
+    
+    # Check if the dashes are placed correctly (1 to 4 dashes)
+    if "-" in value:
+        dash_count = value.count("-")
+        if dash_count < 3:
+            error_message += " There should be at least 3 hyphens to separate sections."
+        elif dash_count > 4:
+            error_message += " Too many hyphens. There should be no more than 4 hyphens."
+
+    # More detailed validation based on length and format
+    if len(value) == 10 and not ISBN_10_PATTERN.match(value):
+        error_message += " For ISBN-10, ensure the correct number of digits and the optional hyphens."
+    elif len(value) == 13 and not ISBN_13_PATTERN.match(value):
+        error_message += " For ISBN-13, ensure the correct number of digits and the optional hyphens."
+
+    return error_message
+
+
 def validate_isbn(value):
     from models.book import Book
     try:
-        # Define strict regex patterns for ISBN-10 and ISBN-13
-        isbn_10_pattern = r"^\d{1,5}-\d{1,7}-\d{1,6}-\d{1,3}[\dX]$"  # ISBN-10 pattern
-        isbn_13_pattern = r"^\d{3}-\d{1,5}-\d{1,7}-\d{1,6}-\d{1}$"  # ISBN-13 pattern
-
-        # Check if the value matches ISBN-10 or ISBN-13 format
-        if not (re.match(isbn_10_pattern, value) or re.match(isbn_13_pattern, value)):
-            error_message = "ISBN must be either in 10-digit or 13-digit format."
-
-            # If the length is too short or too long, append detailed message
-            if len(value) < 10:
-                error_message += " It appears to be too short to be a valid ISBN."
-            elif len(value) > 13:
-                error_message += " It seems too long to be a valid ISBN."
-            
-            # Check if the dashes are placed correctly (1 to 4 dashes)
-            if "-" in value:
-                dash_count = value.count("-")
-                if dash_count < 3:
-                    error_message += " There should be at least 3 hyphens to separate sections."
-                elif dash_count > 4:
-                    error_message += " Too many hyphens. There should be no more than 4 hyphens."
-
-            # More detailed validation based on length and format
-            if len(value) == 10 and not re.match(isbn_10_pattern, value):
-                error_message += " For ISBN-10, ensure the correct number of digits and the optional hyphens."
-            elif len(value) == 13 and not re.match(isbn_13_pattern, value):
-                error_message += " For ISBN-13, ensure the correct number of digits and the optional hyphens."
-
+        error_message = isbn_format_error(value)
+        if error_message:
             raise ValidationError({"isbn": [error_message]})
         
         # Check if the ISBN already exists in the system (assuming the Book model is already defined)
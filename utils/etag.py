@@ -0,0 +1,118 @@
+import hashlib
+from flask import current_app, make_response, request
+from marshmallow import fields
+from sqlalchemy import inspect
+
+from init import db
+from utils.query_shaping import declared_relationships, relationship_options, shaped_select
+
+
+def version_columns(model, schema):
+    """
+    Builds the columns that change whenever the schema's dump of a row would change.
+
+    That is the row's own version plus, for every relationship the schema declares in RELATIONSHIPS, the related
+    row's version (many-to-one) or the count, id sum and version sum of the related rows (collections). Nested
+    schemas are followed one level, e.g. a genre's fingerprint also covers the authors of its books.
+
+    Args:
+        model (Model): The model the schema serialises.
+        schema (Schema): The schema used to dump the rows.
+
+    Returns:
+        list: Column expressions, correlated to model, to select alongside model.id.
+    """
+    columns = [model.version]
+    for name in declared_relationships(schema):
+        relationship = inspect(model).relationships[name]
+        target = relationship.mapper.class_
+
+        if not relationship.uselist:
+            columns.append(db.select(target.version).where(relationship.primaryjoin).scalar_subquery())
+            continue
+
+        for aggregate in (db.func.count(target.id), db.func.sum(target.id), db.func.sum(target.version)):
+            columns.append(db.select(aggregate).where(relationship.primaryjoin).scalar_subquery())
+
+        nested = schema.fields.get(name)
+        if isinstance(nested, fields.Nested):
+            for nested_name in declared_relationships(nested.schema):
+                nested_relationship = inspect(target).relationships[nested_name]
+                if nested_relationship.uselist:
+                    continue
+                nested_target = nested_relationship.mapper.class_
+                columns.append(
+                    db.select(db.func.sum(nested_target.version))
+                    .select_from(target)
+                    .join(nested_target, nested_relationship.primaryjoin)
+                    .where(relationship.primaryjoin)
+                    .scalar_subquery()
+                )
+    return columns
+
+
+def version_select(model, schema):
+    """
+    Returns a select of (id, *version_columns) rows, a cheap stand-in for the full rows when building ETags.
+    """
+    return db.select(model.id, *version_columns(model, schema))
+
+
+def listing_select(model, schema):
+    """
+    Returns version_select(), with the full rows (and the schema's eager loads) added as a last column when the
+    request has no If-None-Match to answer. The body is then always needed, so the first fetch of a listing is one
+    query rather than the versions followed by load_rows().
+    """
+    stmt = version_select(model, schema)
+    if request.if_none_match:
+        return stmt
+    return stmt.add_columns(model).options(*relationship_options(model, schema))
+
+
+def split_listing(rows):
+    """
+    Splits rows from listing_select() into the version rows for make_etag() and the full rows, or None when the
+    select left the full rows out and they are still to be loaded with load_rows().
+    """
+    if not rows or not isinstance(rows[0][-1], db.Model):
+        return rows, None
+    return [row[:-1] for row in rows], [row[-1] for row in rows]
+
+
+def make_etag(*parts):
+    """Hashes version rows (and anything else that shapes the response, e.g. a cursor) into an ETag."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def conditional_response(etag, produce):
+    """
+    Answers If-None-Match with 304 Not Modified, only calling produce() to build the body when it doesn't match.
+
+    Args:
+        etag (str): The current ETag of the resource.
+        produce (callable): Returns the response body (or a (body, status) tuple) for a full response, or None if
+            the resource was deleted after its versions were read.
+
+    Returns:
+        Response: The 304 or full response, with the ETag header set, or a 404 without one.
+    """
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status = 304)
+    else:
+        body = produce()
+        if body is None:
+            return make_response(({"message": "This resource no longer exists."}, 404))
+        response = make_response(body)
+    response.set_etag(etag)
+    return response
+
+
+def load_rows(model, schema, version_rows):
+    """
+    Loads the full rows (with the schema's eager loads) for a list of version rows, in the same order.
+    """
+    ids = [row.id for row in version_rows]
+    if not ids:
+        return []
+    return db.session.scalars(shaped_select(model, schema).where(model.id.in_(ids)).order_by(model.id)).all()
@@ -0,0 +1,169 @@
+import json
+from datetime import date
+
+from init import db
+from models.author import Author, author_schema
+from models.book import Book, book_schema, books_schema
+from models.genre import Genre, genre_schema, genres_schema
+from models.hold import Hold
+from models.loan import Loan, loans_schema
+from models.member import Member, member_schema
+from utils.etag import version_select
+from utils.overdue import SCAN_BATCH_SIZE
+from utils.pagination import DEFAULT_PAGE_SIZE
+from utils.query_shaping import shaped_select
+
+DEFAULT_THRESHOLD = 10000  # Sequential scans over tables with more rows than this are flagged
+
+
+def sample_value(column, default = 1):
+    """Picks an existing value for a query parameter so the plans reflect real data."""
+    return db.session.scalar(db.select(db.func.min(column))) or default
+
+
+def canonical_queries():
+    """
+    Returns the (name, statement, bounded) triples for the queries the hot endpoints run, with sample parameters.
+
+    bounded marks the first-page list queries: unfiltered and limited, so a scan of them stops after one page.
+    """
+    author_id = sample_value(Author.id)
+    book_id = sample_value(Book.id)
+    genre_id = sample_value(Genre.id)
+    member_id = sample_value(Loan.member_id)
+    membership_number = sample_value(Member.membership_number, "10000000")
+
+    return [
+        ("GET /books/", version_select(Book, books_schema).order_by(Book.id).limit(DEFAULT_PAGE_SIZE + 1), True),
+        ("GET /books/<id>", version_select(Book, book_schema).where(Book.id == book_id), False),
+        ("GET /authors/<id>", version_select(Author, author_schema).where(Author.id == author_id), False),
+        ("GET /genres/", version_select(Genre, genres_schema).order_by(Genre.id).limit(DEFAULT_PAGE_SIZE + 1), True),
+        ("GET /genres/<id>", version_select(Genre, genre_schema).where(Genre.id == genre_id), False),
+        ("GET /genres/<id> (books)", shaped_select(Book, books_schema).where(Book.genre_id == genre_id), False),
+        (
+            "GET /genres/<id>/books",
+            version_select(Book, books_schema).where(Book.genre_id == genre_id).order_by(Book.id).limit(DEFAULT_PAGE_SIZE + 1),
+            False
+        ),
+        ("DELETE /authors/<id> (books)", db.select(Book.id).where(Book.author_id == author_id), False),
+        (
+            "GET /members/membership_number/<number>",
+            version_select(Member, member_schema).where(Member.membership_number == membership_number),
+            False
+        ),
+        ("GET /loans/", version_select(Loan, loans_schema).order_by(Loan.id).limit(DEFAULT_PAGE_SIZE + 1), True),
+        (
+            "GET /loans/member/<id>",
+            version_select(Loan, loans_schema).where(Loan.member_id == member_id).order_by(Loan.id),
+            False
+        ),
+        (
+            "GET /loans/member/<id> (active)",
+            shaped_select(Loan, loans_schema).where(Loan.member_id == member_id, Loan.status != "returned"),
+            False
+        ),
+        (
+            "flask loans scan-overdue",
+            db.select(Loan.return_date, Loan.id)
+            .where(Loan.status == "active", Loan.return_date < date.today())
+            .order_by(Loan.return_date, Loan.id)
+            .limit(SCAN_BATCH_SIZE),
+            False
+        ),
+        (
+            "POST /loans/return/<id> (hold queue head)",
+            db.select(Hold.id).where(Hold.book_id == book_id, Hold.status == "waiting").order_by(Hold.position).limit(1),
+            False
+        ),
+        (
+            "POST /loans/ (existing loan)",
+            db.select(Loan.id).where(Loan.book_id == book_id, Loan.member_id == member_id),
+            False
+        ),
+    ]
+
+
+def table_rows(table):
+    """Returns the (estimated, on PostgreSQL) number of rows in a table."""
+    if db.session.connection().dialect.name == "postgresql":
+        estimate = db.session.scalar(
+            db.text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"), {"table": table}
+        )
+        if estimate is not None and estimate >= 0:
+            return estimate
+    return db.session.scalar(db.text(f"SELECT count(*) FROM {table}"))
+
+
+def postgresql_plan(sql, analyze):
+    """Returns the plan as text lines and the tables it reads with a sequential scan."""
+    options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+    return postgresql_plan_lines(db.session.connection().exec_driver_sql(f"EXPLAIN ({options}) {sql}").scalar())
+
+
+def postgresql_plan_lines(plan):
+    """Turns the output of EXPLAIN (FORMAT JSON) into indented text lines and the tables read with a sequential scan."""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    lines = []
+    scanned = []
+
+    def walk(node, depth):
+        relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+        index = f" using {node['Index Name']}" if "Index Name" in node else ""
+        rows = node.get("Actual Rows", node.get("Plan Rows"))
+        lines.append(f"{'  ' * depth}{node['Node Type']}{index}{relation} (rows={rows})")
+        if node["Node Type"] == "Seq Scan":
+            scanned.append(node["Relation Name"])
+        for child in node.get("Plans", ()):
+            walk(child, depth + 1)
+
+    walk(plan[0]["Plan"], 0)
+    return lines, scanned
+
+
+def sqlite_plan(sql, bounded):
+    """
+    Returns the plan as text lines and the tables it reads with a full scan.
+
+    A bare scan of a statement that is limited and unfiltered walks the table in rowid order and stops after one
+    page, so it is not reported when bounded is set.
+    """
+    lines = []
+    scanned = []
+    for row in db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"):
+        lines.append(row.detail)
+        words = row.detail.replace("SCAN TABLE ", "SCAN ").split()
+        if words[0] == "SCAN" and len(words) == 2 and not bounded:
+            scanned.append(words[1])
+    return lines, scanned
+
+
+def index_report(threshold = DEFAULT_THRESHOLD, analyze = True):
+    """
+    Explains every canonical query and flags sequential scans over tables bigger than threshold.
+
+    Args:
+        threshold (int): Row count above which a sequential scan is flagged.
+        analyze (bool): Run EXPLAIN ANALYZE on PostgreSQL, which executes the queries for actual row counts.
+
+    Returns:
+        list: One dict per query with its name, plan lines and flagged (table, rows) scans.
+    """
+    dialect = db.session.connection().dialect
+    report = []
+    for name, stmt, bounded in canonical_queries():
+        sql = stmt.compile(dialect = dialect, compile_kwargs = {"literal_binds": True})
+        if dialect.name == "postgresql":
+            lines, scanned = postgresql_plan(sql, analyze)
+        else:
+            lines, scanned = sqlite_plan(sql, bounded)
+
+        flagged = []
+        for table in dict.fromkeys(scanned):
+            rows = table_rows(table)
+            if rows > threshold:
+                flagged.append((table, rows))
+        report.append({"name": name, "plan": lines, "seq_scans": flagged})
+    db.session.rollback()
+    return report
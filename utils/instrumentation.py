@@ -0,0 +1,125 @@
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+from flask import g, request
+
+from init import ma
+from utils.query_timing import subscribe
+
+logger = logging.getLogger(__name__)
+
+# The Timings of the request being handled, or None when it isn't sampled. A context variable rather than flask.g,
+# as the engine events can't assume a Flask context.
+_current = ContextVar("request_timings", default = None)
+
+
+class Timings:
+    """What one sampled request spent its time on, in seconds."""
+    __slots__ = ("started", "sql_count", "sql_seconds", "load_seconds", "dump_seconds", "in_schema")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.load_seconds = 0.0
+        self.dump_seconds = 0.0
+        self.in_schema = False
+
+
+class InstrumentedSchema(ma.Schema):
+    """
+    Base class of the API's schemas, timing load (including validators such as validate_isbn) and dump for sampled
+    requests. Nested schemas run inside their parent's load or dump and are not counted twice.
+    """
+    def load(self, data, *, many = None, partial = None, unknown = None):
+        timings = _current.get()
+        if timings is None or timings.in_schema:
+            return super().load(data, many = many, partial = partial, unknown = unknown)
+        timings.in_schema = True
+        started = time.perf_counter()
+        try:
+            return super().load(data, many = many, partial = partial, unknown = unknown)
+        finally:
+            timings.load_seconds += time.perf_counter() - started
+            timings.in_schema = False
+
+    def dump(self, obj, *, many = None):
+        timings = _current.get()
+        if timings is None or timings.in_schema:
+            return super().dump(obj, many = many)
+        timings.in_schema = True
+        started = time.perf_counter()
+        try:
+            return super().dump(obj, many = many)
+        finally:
+            timings.dump_seconds += time.perf_counter() - started
+            timings.in_schema = False
+
+
+def add_statement(connection, statement, parameters, executemany, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.sql_count += 1
+        timings.sql_seconds += seconds
+
+
+class RequestTiming:
+    """
+    Times a sample of requests: SQL statements (count and time, on every engine), schema load and dump, and the
+    handler as a whole. Each sampled response carries a Server-Timing header, which browser dev tools show in the
+    network panel, and is logged as one JSON line. Requests outside the REQUEST_TIMING_SAMPLE_RATE sample only cost
+    a random() call and a context variable lookup per statement and schema call.
+    """
+    def __init__(self):
+        self.sample_rate = 0.0
+
+    def init_app(self, app):
+        self.sample_rate = app.config.setdefault("REQUEST_TIMING_SAMPLE_RATE", 0.01)
+        if self.sample_rate <= 0:
+            return
+        subscribe(add_statement)
+        if not logger.handlers:
+            logger.addHandler(logging.StreamHandler())
+            logger.setLevel(logging.INFO)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.stop)
+
+    def start(self):
+        if random.random() < self.sample_rate:
+            g.timings_token = _current.set(Timings())
+
+    def finish(self, response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.started
+        response.headers["Server-Timing"] = ", ".join((
+            f'sql;dur={timings.sql_seconds * 1000:.2f};desc="{timings.sql_count} queries"',
+            f"load;dur={timings.load_seconds * 1000:.2f}",
+            f"dump;dur={timings.dump_seconds * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}",
+        ))
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "sql_count": timings.sql_count,
+            "sql_ms": round(timings.sql_seconds * 1000, 2),
+            "load_ms": round(timings.load_seconds * 1000, 2),
+            "dump_ms": round(timings.dump_seconds * 1000, 2),
+        }))
+        return response
+
+    def stop(self, error):
+        # Ends the sample, so nothing else run on this thread or context is counted against the request
+        token = g.pop("timings_token", None)
+        if token is not None:
+            _current.reset(token)
+
+
+request_timing = RequestTiming()
@@ -0,0 +1,112 @@
+import os
+import time
+from flask import g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+from utils.query_timing import subscribe
+
+# Finer below a second than the library's defaults, so p99 alerts on the hot endpoints can tell 50ms from 100ms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+REQUESTS = Counter(
+    "lms_http_requests_total", "HTTP requests answered.",
+    ["method", "blueprint", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "lms_http_request_duration_seconds", "Time spent answering HTTP requests.",
+    ["method", "blueprint", "route"], buckets = LATENCY_BUCKETS,
+)
+QUERY_LATENCY = Histogram(
+    "lms_db_query_duration_seconds", "Time spent executing SQL statements.",
+    ["operation"], buckets = QUERY_BUCKETS,
+)
+# Each worker reports its own pools, added up over the live workers
+POOL_CONNECTIONS = Gauge(
+    "lms_db_pool_connections", "Connections in each database pool.",
+    ["bind", "state"], multiprocess_mode = "livesum",
+)
+LOAN_EVENTS = Counter("lms_loan_events_total", "Books checked out and returned.", ["event"])
+
+SQL_OPERATIONS = ("select", "insert", "update", "delete")
+
+
+def observe_statement(connection, statement, parameters, executemany, seconds):
+    operation = statement.lstrip()[:6].lower()
+    QUERY_LATENCY.labels(operation if operation in SQL_OPERATIONS else "other").observe(seconds)
+
+
+def count_loans(checkouts = 0, returns = 0):
+    """Counts committed checkouts and returns, called next to utils.stats.record_loans once the transaction is in."""
+    if checkouts:
+        LOAN_EVENTS.labels("checkout").inc(checkouts)
+    if returns:
+        LOAN_EVENTS.labels("return").inc(returns)
+
+
+class Metrics:
+    """
+    Prometheus metrics for the API: requests and their latency by blueprint and route, SQL statement latency,
+    connection pool gauges and loan checkouts and returns, served at /metrics.
+
+    Under gunicorn every worker keeps its own metrics. With PROMETHEUS_MULTIPROC_DIR set (before the app is imported)
+    they are written to files in that directory, and /metrics adds up all workers' files, whichever worker answers
+    the scrape. gunicorn.conf.py empties the directory at startup and removes the files of workers that exit.
+    """
+    def init_app(self, app, engines):
+        subscribe(observe_statement)
+        for bind, engine in engines.items():
+            self.watch_pool(bind or "default", engine)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+    def watch_pool(self, bind, engine):
+        """Updates the pool gauges of engine whenever one of its connections is checked out or returned."""
+        def update(returning):
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                return
+            # checkin fires before the pool takes the connection back, so it still counts as checked out
+            checked_out, idle = pool.checkedout() - returning, pool.checkedin() + returning
+            POOL_CONNECTIONS.labels(bind, "checked_out").set(checked_out)
+            POOL_CONNECTIONS.labels(bind, "idle").set(idle)
+            POOL_CONNECTIONS.labels(bind, "overflow").set(max(pool.overflow(), 0))
+            POOL_CONNECTIONS.labels(bind, "open").set(checked_out + idle)
+
+        # Pool events survive the pool being recreated after a fork (see utils.pool.reset_pools_after_fork)
+        event.listen(engine, "checkout", lambda *args: update(0))
+        event.listen(engine, "checkin", lambda *args: update(1))
+
+    def start(self):
+        g.metrics_started = time.perf_counter()
+
+    def finish(self, response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # The route pattern rather than the path, so /books/1 and /books/2 are one series. Unmatched paths share one.
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            self.observe(request.method, request.blueprint or "", route, response.status_code, time.perf_counter() - started)
+        return response
+
+    def observe(self, method, blueprint, route, status, seconds):
+        REQUESTS.labels(method, blueprint, route, str(status)).inc()
+        REQUEST_LATENCY.labels(method, blueprint, route).observe(seconds)
+
+    def render(self):
+        """
+        Returns the current metrics in the Prometheus text format.
+
+        Returns:
+            tuple: The body (bytes) and its content type.
+        """
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+metrics = Metrics()
@@ -0,0 +1,78 @@
+import logging
+import time
+from datetime import date
+
+from init import db
+from models.loan import Loan
+
+SCAN_BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+
+def scan_overdue(today = None, batch_size = SCAN_BATCH_SIZE):
+    """
+    Marks active loans whose return date has passed as overdue.
+
+    Candidates are read from the (status, return_date, id) index in keyset batches of batch_size and each batch
+    is flipped with one UPDATE and committed on its own, so no lock is held for longer than a batch and memory
+    stays flat however many loans are overdue. The UPDATE re-checks the status, so a loan returned between the
+    read and the write is left alone and running two scans at once is harmless.
+
+    Args:
+        today (date): Loans due before this date are overdue. Defaults to today.
+        batch_size (int): The number of loans read and updated per transaction.
+
+    Returns:
+        dict: The cut-off date, the number of batches and the number of loans marked overdue.
+    """
+    today = today or date.today()
+    summary = {"as_of": today.isoformat(), "batches": 0, "marked_overdue": 0}
+    last = None
+
+    while True:
+        stmt = (
+            db.select(Loan.return_date, Loan.id)
+            .where(Loan.status == "active", Loan.return_date < today)
+            .order_by(Loan.return_date, Loan.id)
+            .limit(batch_size)
+        )
+        if last is not None:
+            stmt = stmt.where(db.tuple_(Loan.return_date, Loan.id) > last)
+        batch = db.session.execute(stmt).all()
+        if not batch:
+            break
+
+        result = db.session.execute(
+            db.update(Loan)
+            .where(Loan.id.in_([row.id for row in batch]), Loan.status == "active")
+            .values(status = "overdue")
+            .execution_options(synchronize_session = False)
+        )
+        db.session.commit()
+
+        summary["batches"] += 1
+        summary["marked_overdue"] += result.rowcount
+        last = tuple(batch[-1])
+    return summary
+
+
+def scan_overdue_every(interval, batch_size = SCAN_BATCH_SIZE, report = None):
+    """
+    Runs scan_overdue every interval seconds until the process is stopped, calling report(summary) after each scan.
+
+    Meant for one long-running process (`flask loans scan-overdue --every SECONDS`) next to the API rather than in its
+    workers, so the scan runs once per interval however many workers serve requests. A failed scan is logged and
+    tried again at the next interval.
+    """
+    while True:
+        try:
+            summary = scan_overdue(batch_size = batch_size)
+            if report is not None:
+                report(summary)
+        except Exception:
+            db.session.rollback()
+            logger.exception("Overdue scan failed")
+        finally:
+            db.session.remove()
+        time.sleep(interval)
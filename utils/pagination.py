@@ -0,0 +1,87 @@
+import base64
+import binascii
+from flask import current_app, request
+from marshmallow import ValidationError
+
+from init import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(last_id):
+    """Encodes the id of the last row on a page into an opaque cursor string."""
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_cursor back into the id it points after.
+
+    Raises:
+        ValidationError: If the cursor is not one this API handed out.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValidationError({"cursor": "Invalid pagination cursor."})
+
+
+def get_page_args():
+    """
+    Reads the keyset pagination arguments from the query string.
+
+    Clients can either pass the opaque `cursor` from a previous response or an explicit `after` id.
+    The page size is taken from `limit`, falling back to PAGE_SIZE_DEFAULT and capped at PAGE_SIZE_MAX.
+
+    Returns:
+        tuple: (after, limit) where after is the id to start after (or None for the first page).
+    """
+    default_size = current_app.config.get("PAGE_SIZE_DEFAULT", DEFAULT_PAGE_SIZE)
+    max_size = current_app.config.get("PAGE_SIZE_MAX", MAX_PAGE_SIZE)
+
+    after = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        after = decode_cursor(cursor)
+    elif request.args.get("after") is not None:
+        after = request.args.get("after", type = int)
+        if after is None:
+            raise ValidationError({"after": "After must be an integer id."})
+
+    limit = default_size
+    if request.args.get("limit") is not None:
+        # Checked for on its own, as get(type = int) quietly falls back to the default for e.g. ?limit=abc
+        limit = request.args.get("limit", type = int)
+        if limit is None or limit < 1:
+            raise ValidationError({"limit": "Limit must be a positive integer."})
+
+    return after, min(limit, max_size)
+
+
+def paginate(stmt, id_column):
+    """
+    Applies keyset pagination to a select statement ordered by id_column.
+
+    Rows are fetched with `WHERE id > :after ORDER BY id LIMIT :limit + 1`, so the cost of a page stays
+    the same no matter how deep the client has paged. The extra row only tells us whether another page exists.
+
+    Args:
+        stmt (Select): The statement to paginate, already ordered by id_column. Its rows must have an id.
+        id_column (Column): The primary key column used as the keyset.
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    after, limit = get_page_args()
+    if after is not None:
+        stmt = stmt.where(id_column > after)
+
+    items = db.session.execute(stmt.limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].id)
+    return items, next_cursor
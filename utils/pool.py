@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+import uuid
+import weakref
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+# session: the API connects to PostgreSQL directly (or through PgBouncer in session pooling mode).
+# transaction: PgBouncer in transaction pooling mode, where a server connection is only ours for one transaction.
+POOL_MODES = ("session", "transaction")
+
+# Per-worker defaults for PostgreSQL, each overridable through the environment. With a handful of gunicorn workers,
+# pool_size + max_overflow per worker stays under PostgreSQL's default max_connections of 100.
+POOL_DEFAULTS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 10,  # Seconds a request waits for a free connection before failing
+    "pool_recycle": 1800,  # Seconds before a connection is replaced, ahead of server and load balancer idle timeouts
+    "statement_timeout": 30000,  # Milliseconds, 0 to disable
+}
+
+# The async drivers used by the ASGI app (see async_app.py) for each database
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+# The engines set up by init_pools, so forked workers can find and reset them
+_engines = weakref.WeakSet()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    A QueuePool that also counts checkouts and how long they waited for a connection.
+
+    The counters live on the pool, so the fresh pool Engine.dispose() swaps in starts again from zero.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._counter_lock = threading.Lock()
+        self.counters = {"checkouts": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeout:
+            self._count(time.perf_counter() - started, "timeouts")
+            raise
+        self._count(time.perf_counter() - started, "checkouts")
+        return connection
+
+    def _count(self, waited, counter):
+        with self._counter_lock:
+            self.counters[counter] += 1
+            self.counters["wait_seconds"] += waited
+            self.counters["max_wait_seconds"] = max(self.counters["max_wait_seconds"], waited)
+
+    def stats(self):
+        with self._counter_lock:
+            counters = dict(self.counters)
+        attempts = counters["checkouts"] + counters["timeouts"]
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            # Negative while the pool is still filling up to pool_size, positive once it has opened extra connections
+            "overflow": self.overflow(),
+            "max_overflow": self._max_overflow,
+            **counters,
+            "mean_wait_seconds": counters["wait_seconds"] / attempts if attempts else 0.0,
+        }
+
+
+def engine_options(uri, environ = os.environ):
+    """
+    Builds SQLALCHEMY_ENGINE_OPTIONS for the database at uri from DATABASE_POOL_* environment variables.
+
+    PostgreSQL gets a sized, pre-pinged and recycled TimedQueuePool and a statement timeout. In transaction mode the
+    timeout is applied per transaction by apply_statement_timeout instead, as PgBouncer rejects the startup options
+    parameter and session-level settings would leak to other clients sharing the server connection. Other databases
+    keep SQLAlchemy's pool settings and only get the timed pool, so /internal/pool works everywhere.
+
+    Args:
+        uri (str): The SQLALCHEMY_DATABASE_URI.
+        environ (dict): Where to read the settings from.
+
+    Returns:
+        dict: The engine options.
+
+    Raises:
+        ValueError: If DATABASE_POOL_MODE is not one of POOL_MODES.
+    """
+    if not uri:
+        return {}
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # Flask-SQLAlchemy gives in-memory SQLite a StaticPool, which must stay a single connection
+        return {}
+    if url.get_backend_name() != "postgresql":
+        return {"poolclass": TimedQueuePool}
+
+    mode = environ.get("DATABASE_POOL_MODE", "session")
+    if mode not in POOL_MODES:
+        raise ValueError(f"DATABASE_POOL_MODE must be one of: {', '.join(POOL_MODES)}")
+    settings = {name: int(environ.get(f"DATABASE_{name.upper()}", default)) for name, default in POOL_DEFAULTS.items()}
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "pool_timeout": settings["pool_timeout"],
+        "pool_recycle": settings["pool_recycle"],
+        # Replaces connections dropped by a database restart or failover instead of failing the request
+        "pool_pre_ping": True,
+        # Reuse the most recently returned connection, so surplus ones go idle and are recycled
+        "pool_use_lifo": True,
+        "connect_args": {"application_name": environ.get("DATABASE_APPLICATION_NAME", "lms-api")},
+    }
+    if mode == "session" and settings["statement_timeout"]:
+        options["connect_args"]["options"] = f"-c statement_timeout={settings['statement_timeout']}"
+    return options
+
+
+def async_engine_args(uri, environ = os.environ):
+    """
+    Builds the URL and options for create_async_engine from the same DATABASE_POOL_* settings as engine_options.
+
+    The pool sizing carries over as is (the async engine brings its own AsyncAdaptedQueuePool). asyncpg takes the
+    application name and statement timeout as server_settings rather than libpq options. In transaction mode its
+    prepared statement caches are turned off and statements get unique names, as a prepared statement would
+    otherwise be looked up on whichever server connection PgBouncer hands out next.
+
+    Args:
+        uri (str or URL): The database URL, with or without a driver.
+        environ (dict): Where to read the settings from.
+
+    Returns:
+        tuple: (url, options).
+
+    Raises:
+        ValueError: If there is no async driver for the database.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() not in ASYNC_DRIVERS:
+        raise ValueError(f"The async app supports {', '.join(ASYNC_DRIVERS)} databases, not {url.get_backend_name()}")
+    url = url.set(drivername = ASYNC_DRIVERS[url.get_backend_name()])
+
+    options = engine_options(uri, environ)
+    options.pop("poolclass", None)
+    connect_args = options.pop("connect_args", None)
+    if url.get_backend_name() == "postgresql":
+        server_settings = {"application_name": connect_args["application_name"]}
+        timeout = int(environ.get("DATABASE_STATEMENT_TIMEOUT", POOL_DEFAULTS["statement_timeout"]))
+        if "options" in connect_args:
+            server_settings["statement_timeout"] = str(timeout)
+        options["connect_args"] = {"server_settings": server_settings}
+        if environ.get("DATABASE_POOL_MODE") == "transaction":
+            url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+            options["connect_args"]["statement_cache_size"] = 0
+            options["connect_args"]["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    return url, options
+
+
+def apply_statement_timeout(engine, timeout):
+    """Runs SET LOCAL statement_timeout at the start of every transaction on the engine."""
+    @event.listens_for(engine, "begin")
+    def set_timeout(connection):
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+def init_pools(engines, environ = os.environ):
+    """
+    Finishes setting up the app's engines once Flask-SQLAlchemy has created them.
+
+    Adds the per-transaction statement timeout in PgBouncer transaction mode and registers the engines to be reset
+    in forked workers.
+    """
+    for engine in engines:
+        if engine.dialect.name == "postgresql" and environ.get("DATABASE_POOL_MODE") == "transaction":
+            timeout = int(environ.get("DATABASE_STATEMENT_TIMEOUT", POOL_DEFAULTS["statement_timeout"]))
+            if timeout:
+                apply_statement_timeout(engine, timeout)
+        _engines.add(engine)
+
+
+def reset_pools_after_fork():
+    """
+    Gives a forked worker empty pools.
+
+    Connections opened before the fork (e.g. while gunicorn --preload imported the app) are sockets shared with the
+    parent, and using them from two processes corrupts the protocol stream. dispose(close = False) drops them from
+    the child's pool without closing them, which would also close them for the parent.
+    """
+    for engine in list(_engines):
+        engine.dispose(close = False)
+
+
+def pool_stats(engines):
+    """
+    Returns the pool counters of each engine, keyed by bind (default for the main database).
+    """
+    stats = {}
+    for bind, engine in engines.items():
+        pool = engine.pool
+        if isinstance(pool, TimedQueuePool):
+            stats[bind or "default"] = pool.stats()
+        else:
+            stats[bind or "default"] = {"pool": type(pool).__name__, "status": pool.status()}
+    return stats
+
+
+os.register_at_fork(after_in_child = reset_pools_after_fork)
@@ -0,0 +1,147 @@
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, request
+
+from utils.query_timing import subscribe
+from utils.slow_queries import fingerprint, normalise
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_MODES = ("off", "warn", "strict")
+
+# The counters statements are added to: one per request being checked and one per counting_queries() block
+_counters = ContextVar("query_counters", default = ())
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a request runs more statements than its route's budget."""
+
+
+class QueryCounter:
+    """The statements run while the counter was active, with how often each was run."""
+    __slots__ = ("statements",)
+
+    def __init__(self):
+        self.statements = Counter()
+
+    @property
+    def total(self):
+        return sum(self.statements.values())
+
+    def repeated(self, limit):
+        """
+        Returns the (normalised SQL, count) of every SELECT fingerprint run more than limit times, most repeated
+        first. The same lazy load run once per row, the usual N+1, shows up here. Writes are left to the budget, as
+        some are one statement per row by design (e.g. ORM inserts on SQLite).
+        """
+        counts = Counter()
+        sql = {}
+        for statement, count in self.statements.items():
+            if not statement.lstrip()[:6].lower() == "select":
+                continue
+            key = fingerprint(statement)
+            counts[key] += count
+            sql.setdefault(key, normalise(statement))
+        return [(sql[key], count) for key, count in counts.most_common() if count > limit]
+
+
+def count_statement(connection, statement, parameters, executemany, seconds):
+    for counter in _counters.get():
+        counter.statements[statement] += 1
+
+
+def listen():
+    subscribe(count_statement)
+
+
+@contextmanager
+def counting_queries():
+    """
+    Counts the statements run inside the block, including those of requests made with the test client:
+
+        with counting_queries() as queries:
+            client.get("/books/")
+        assert queries.total <= 2
+    """
+    listen()
+    counter = QueryCounter()
+    token = _counters.set(_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+
+def query_budget(limit):
+    """
+    Declares the most statements a view may run in one request, which QueryBudget checks. Goes under the route
+    decorator:
+
+        @books_bp.route("/<int:book_id>")
+        @query_budget(3)
+        def get_book(book_id):
+    """
+    def decorate(view):
+        view.query_budget = limit
+        return view
+    return decorate
+
+
+class QueryBudget:
+    """
+    Counts the statements of every request against its route's query_budget and watches for the same statement
+    being repeated, as set by QUERY_BUDGET_MODE:
+
+    - off: nothing is counted.
+    - warn (the default with FLASK_DEBUG): a warning is logged for a request over its budget or running one
+      statement fingerprint more than QUERY_REPEAT_LIMIT times.
+    - strict (for test suites): a request over its budget raises QueryBudgetExceeded, failing the test that made it.
+      Repeated statements are still only logged.
+
+    Budgets are the counts with a cold entity cache and hold for test-sized data. Exports are counted to the end of
+    their streamed body, and read in chunks of EXPORT_CHUNK_SIZE rows, so they run more statements on bigger tables.
+    """
+    def __init__(self):
+        self.mode = "off"
+        self.repeat_limit = 5
+
+    def init_app(self, app):
+        self.mode = app.config.setdefault("QUERY_BUDGET_MODE", "off")
+        self.repeat_limit = app.config.setdefault("QUERY_REPEAT_LIMIT", 5)
+        if self.mode not in QUERY_BUDGET_MODES:
+            raise ValueError(f"QUERY_BUDGET_MODE must be one of: {', '.join(QUERY_BUDGET_MODES)}")
+        if self.mode == "off":
+            return
+        listen()
+        app.before_request(self.start)
+        # At teardown rather than after_request, so the statements of streamed responses are counted too
+        app.teardown_request(self.check)
+
+    def start(self):
+        counter = QueryCounter()
+        g.query_counter = counter
+        g.query_counter_token = _counters.set(_counters.get() + (counter,))
+
+    def check(self, error):
+        token = g.pop("query_counter_token", None)
+        if token is None:
+            return
+        _counters.reset(token)
+        counter = g.pop("query_counter")
+
+        request_name = f"{request.method} {request.path} ({request.endpoint})"
+        for sql, count in counter.repeated(self.repeat_limit):
+            logger.warning(f"{request_name} ran the same statement {count} times, a possible N+1: {sql}")
+
+        limit = getattr(current_app.view_functions.get(request.endpoint), "query_budget", None)
+        if limit is None or counter.total <= limit:
+            return
+        message = f"{request_name} ran {counter.total} statements, over its budget of {limit}"
+        if self.mode == "strict" and error is None:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+query_budgets = QueryBudget()
@@ -0,0 +1,52 @@
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+
+from init import db
+
+
+def declared_relationships(schema):
+    """The schema's RELATIONSHIPS, less any it excludes, e.g. GenreSchema(exclude = ("books",))."""
+    return [name for name in getattr(schema, "RELATIONSHIPS", ()) if name not in schema.exclude]
+
+
+def relationship_options(model, schema, parent = None):
+    """
+    Builds eager-loading options for the relationships a schema declares in its RELATIONSHIPS attribute.
+
+    Many-to-one relationships (e.g. Book.author) are joined into the same query and collections (e.g. Genre.books)
+    are fetched with one extra SELECT ... IN query, so the number of queries no longer grows with the number of rows.
+    When a declared relationship is serialised through a Nested field, the nested schema's own RELATIONSHIPS are
+    followed as well, e.g. GenreSchema -> books -> BookSchema -> author.
+
+    Args:
+        model (Model): The model the schema serialises.
+        schema (Schema): The schema instance used to dump the rows.
+        parent (Load): The loader option to chain from when following a nested schema.
+
+    Returns:
+        list: Loader options to pass to `Select.options()`.
+    """
+    options = []
+    for name in declared_relationships(schema):
+        relationship = inspect(model).relationships[name]
+        attribute = getattr(model, name)
+
+        if relationship.uselist:
+            option = parent.selectinload(attribute) if parent is not None else selectinload(attribute)
+        else:
+            option = parent.joinedload(attribute) if parent is not None else joinedload(attribute)
+
+        nested = schema.fields.get(name)
+        nested_options = []
+        if isinstance(nested, fields.Nested):
+            nested_options = relationship_options(relationship.mapper.class_, nested.schema, option)
+        options.extend(nested_options or [option])
+    return options
+
+
+def shaped_select(model, schema):
+    """
+    Returns `db.select(model)` with the eager loads needed to dump it with the given schema.
+    """
+    return db.select(model).options(*relationship_options(model, schema))
@@ -0,0 +1,59 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Called with every statement that runs, see subscribe
+_subscribers = []
+# Called with every statement that fails, see subscribe_failures
+_failure_subscribers = []
+
+
+def subscribe(subscriber):
+    """
+    Calls subscriber(connection, statement, parameters, executemany, seconds) after every statement any engine runs
+    successfully, seconds being how long it took. One set of engine listeners times each statement once for all the
+    subscribers (metrics, the slow query log, request timing and query budgets). Subscribing twice has no effect.
+    """
+    if subscriber not in _subscribers:
+        _subscribers.append(subscriber)
+    listen()
+
+
+def subscribe_failures(subscriber):
+    """
+    Calls subscriber(connection, statement, parameters, executemany, seconds, error) after every statement that
+    raises, e.g. one cancelled by statement_timeout, seconds being how long it ran before failing. Subscribing twice
+    has no effect.
+    """
+    if subscriber not in _failure_subscribers:
+        _failure_subscribers.append(subscriber)
+    listen()
+
+
+def listen():
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(Engine, "handle_error", handle_error)
+
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    started = connection.info.get("query_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    for subscriber in _subscribers:
+        subscriber(connection, statement, parameters, executemany, seconds)
+
+def handle_error(context):
+    # A failed statement never reaches after_cursor_execute, take its start time here instead
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    executemany = context.execution_context.executemany if context.execution_context is not None else False
+    for subscriber in _failure_subscribers:
+        subscriber(context.connection, context.statement, context.parameters, executemany, seconds, context.original_exception)
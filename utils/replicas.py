@@ -0,0 +1,176 @@
+import logging
+import random
+import threading
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.sql.dml import UpdateBase
+
+from utils.pool import engine_options
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Where a client's last write time travels. Browsers keep the cookie, other clients can echo the header back.
+WATERMARK_COOKIE = "lms_write_watermark"
+WATERMARK_HEADER = "X-Write-Watermark"
+
+# Reports how far a PostgreSQL standby is behind, in seconds: 0 when it has replayed everything it received,
+# otherwise the age of the last transaction it replayed. NULL (unknown) when the server is not a standby.
+POSTGRESQL_LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def replica_binds(uris):
+    """
+    Builds SQLALCHEMY_BINDS entries for a comma-separated list of replica URIs, named replica_1, replica_2, ...
+    Each replica gets the same pool options as the primary.
+    """
+    binds = {}
+    for number, uri in enumerate([uri.strip() for uri in (uris or "").split(",") if uri.strip()], start = 1):
+        binds[f"replica_{number}"] = {"url": uri, **engine_options(uri)}
+    return binds
+
+
+class RoutingSession(Session):
+    """
+    The db.session class. While ReplicaRouter has picked a replica for the request, reads go to it; flushes,
+    INSERT/UPDATE/DELETE statements and SELECT ... FOR UPDATE always go to the primary.
+    """
+    def get_bind(self, mapper = None, clause = None, bind = None, **kwargs):
+        if bind is None and has_request_context() and g.get("replica") and not self._flushing and not is_write(clause):
+            return self._db.engines[g.replica]
+        return super().get_bind(mapper = mapper, clause = clause, bind = bind, **kwargs)
+
+
+def reading_replica():
+    """True while the current request's reads go to a replica, which may be behind the primary."""
+    return has_request_context() and bool(g.get("replica"))
+
+
+def is_write(clause):
+    return isinstance(clause, UpdateBase) or getattr(clause, "_for_update_arg", None) is not None
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def record_write(session):
+    # The commit time becomes the client's write watermark, see ReplicaRouter.set_watermark
+    if has_request_context():
+        g.wrote = time.time()
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of safe (GET/HEAD) requests to a replica bind, keeping every client's own writes visible to them.
+
+    A request that commits gets a write watermark (its commit time) back as a cookie and header. Until the
+    replicas are known to have replayed past the watermark, or REPLICA_STICKY_SECONDS have passed, that client's
+    reads stay on the primary. Replica lag and health are checked at most every REPLICA_CHECK_INTERVAL seconds
+    per worker. Replicas further behind than REPLICA_MAX_LAG, or that failed their check or a query, are skipped
+    until the next check; with none left, reads go to the primary.
+
+    Replicas whose lag cannot be measured (anything but a PostgreSQL standby, e.g. a SQLite file standing in for
+    one) are treated as up to date for other clients but never for a client inside its sticky window.
+    """
+    def __init__(self):
+        self.bind_keys = []
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, engines):
+        self.bind_keys = [key for key in engines if key and key.startswith("replica_")]
+        self.engines = {key: engines[key] for key in self.bind_keys}
+        self.max_lag = app.config.setdefault("REPLICA_MAX_LAG", 5)
+        self.sticky_seconds = app.config.setdefault("REPLICA_STICKY_SECONDS", 10)
+        self.check_interval = app.config.setdefault("REPLICA_CHECK_INTERVAL", 1)
+        if not self.bind_keys:
+            return
+
+        self._health = {key: {"healthy": True, "lag": None, "checked_at": 0.0} for key in self.bind_keys}
+        app.before_request(self.choose)
+        app.after_request(self.set_watermark)
+        app.teardown_request(self.check_failure)
+
+    def choose(self):
+        g.replica = None
+        if request.method not in SAFE_METHODS:
+            return
+        since_write = self.since_write()
+        candidates = []
+        for key in self.bind_keys:
+            health = self.health(key)
+            if not health["healthy"]:
+                continue
+            lag = health["lag"]
+            if lag is not None and lag > self.max_lag:
+                continue
+            if since_write is not None and (lag is None or lag > since_write):
+                continue
+            candidates.append(key)
+        if candidates:
+            g.replica = random.choice(candidates)
+
+    def since_write(self):
+        """Seconds since the client's last write, or None when it has none inside the sticky window."""
+        watermark = request.headers.get(WATERMARK_HEADER) or request.cookies.get(WATERMARK_COOKIE)
+        try:
+            since_write = time.time() - float(watermark)
+        except (TypeError, ValueError):
+            return None
+        return since_write if 0 <= since_write < self.sticky_seconds else None
+
+    def set_watermark(self, response):
+        if g.get("wrote"):
+            watermark = f"{g.wrote:.3f}"
+            response.headers[WATERMARK_HEADER] = watermark
+            response.set_cookie(WATERMARK_COOKIE, watermark, max_age = int(self.sticky_seconds), httponly = True, samesite = "Lax")
+        return response
+
+    def check_failure(self, error):
+        # A replica that drops a connection mid-request is skipped until its next check
+        if g.get("replica") and isinstance(error, DBAPIError) and error.connection_invalidated:
+            self.mark_down(g.replica)
+
+    def health(self, key):
+        """Returns the replica's last check, re-checking it first if that is older than REPLICA_CHECK_INTERVAL."""
+        health = self._health[key]
+        if time.monotonic() - health["checked_at"] < self.check_interval:
+            return health
+        # Only one thread re-checks a replica, the others carry on with the previous result
+        if not self._lock.acquire(blocking = False):
+            return health
+        try:
+            self._health[key] = self.check(key)
+        finally:
+            self._lock.release()
+        return self._health[key]
+
+    def check(self, key):
+        engine = self.engines[key]
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == "postgresql":
+                    lag = connection.exec_driver_sql(POSTGRESQL_LAG_SQL).scalar()
+                    lag = float(lag) if lag is not None else None
+                else:
+                    connection.exec_driver_sql("SELECT 1")
+                    lag = None
+        except SQLAlchemyError as err:
+            logger.warning("Replica %s failed its health check: %s", key, err)
+            return {"healthy": False, "lag": None, "checked_at": time.monotonic()}
+        return {"healthy": True, "lag": lag, "checked_at": time.monotonic()}
+
+    def mark_down(self, key):
+        self._health[key] = {"healthy": False, "lag": None, "checked_at": time.monotonic()}
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            key: {"healthy": health["healthy"], "lag_seconds": health["lag"], "checked_seconds_ago": round(now - health["checked_at"], 3)}
+            for key, health in self._health.items()
+        }
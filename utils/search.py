@@ -0,0 +1,188 @@
+import difflib
+import re
+import threading
+from collections import defaultdict
+
+from init import db
+from models.author import Author
+from models.book import Book
+from models.genre import Genre
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# How much a query term found in each field adds to a book's score
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "genre": 1.0}
+FUZZY_CUTOFF = 0.75  # Minimum similarity for a misspelt term to match an indexed one
+FUZZY_MATCHES = 3  # Indexed terms tried for each misspelt query term
+MAX_CANDIDATES = 1000  # Books taken from each index per query, bounding the ranking work on very broad terms
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+class SearchIndex:
+    """
+    In-process inverted index over book titles, author names and genre names.
+
+    Used by search_books when the database has no full-text search of its own (e.g. SQLite in tests). It is built
+    on the first search and then kept current by invalidate(), which the write paths call once they commit: books
+    passed by id are re-read on the next search, and a call without ids rebuilds the whole index. Each worker
+    process keeps its own copy.
+    """
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {book_id: weight}
+        self._terms = {}  # book_id -> terms it was indexed under, so it can be removed again
+        self._dirty = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def invalidate(self, *book_ids):
+        with self._lock:
+            if not book_ids:
+                self._loaded = False
+            elif self._loaded:
+                self._dirty.update(book_ids)
+
+    def _rows(self, book_ids = None):
+        stmt = (
+            db.select(Book.id, Book.title, Author.name, Genre.genre_name)
+            .join(Author, Book.author_id == Author.id)
+            .join(Genre, Book.genre_id == Genre.id)
+        )
+        if book_ids is not None:
+            stmt = stmt.where(Book.id.in_(book_ids))
+        return db.session.execute(stmt)
+
+    def _remove(self, book_id):
+        for term in self._terms.pop(book_id, ()):
+            postings = self._postings[term]
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def _add(self, book_id, title, author_name, genre_name):
+        weights = defaultdict(float)
+        for field, text in (("title", title), ("author", author_name), ("genre", genre_name)):
+            for term in tokenize(text):
+                weights[term] = max(weights[term], FIELD_WEIGHTS[field])
+        for term, weight in weights.items():
+            self._postings[term][book_id] = weight
+        self._terms[book_id] = list(weights)
+
+    def _refresh(self):
+        if not self._loaded:
+            self._postings.clear()
+            self._terms.clear()
+            self._dirty.clear()
+            for row in self._rows():
+                self._add(*row)
+            self._loaded = True
+        elif self._dirty:
+            dirty = list(self._dirty)
+            self._dirty.clear()
+            for book_id in dirty:
+                self._remove(book_id)
+            for row in self._rows(dirty):
+                self._add(*row)
+
+    def search(self, query):
+        """
+        Returns the ids of the books matching query, best first.
+
+        Every query term adds the weight of the best field it appears in. Terms that are not indexed fall back to
+        their closest indexed spellings, scaled down by how similar they are.
+        """
+        with self._lock:
+            self._refresh()
+            scores = defaultdict(float)
+            for term in tokenize(query):
+                if term in self._postings:
+                    matches = [(term, 1.0)]
+                else:
+                    close = difflib.get_close_matches(term, self._postings, FUZZY_MATCHES, FUZZY_CUTOFF)
+                    matches = [(match, difflib.SequenceMatcher(None, term, match).ratio()) for match in close]
+                for match, similarity in matches:
+                    for book_id, weight in self._postings[match].items():
+                        scores[book_id] += weight * similarity
+        return sorted(scores, key = lambda book_id: (-scores[book_id], book_id))
+
+
+search_index = SearchIndex()
+
+
+def postgresql_search(query, offset, limit):
+    """
+    Ranks books with PostgreSQL full-text search, falling back on trigram similarity for misspellings.
+
+    Candidates come from the GIN indexes on to_tsvector(title) and to_tsvector(author.name), the trigram indexes
+    on the same columns and the (small) genre table: the best MAX_CANDIDATES from each, and only those are ranked.
+    A book matches when any query term is in any of its fields, so "hobbit tolkien" finds The Hobbit through its
+    title and its author, and books matching more of the terms rank higher, as with search_index.
+    """
+    def tsvector(column):
+        return db.func.to_tsvector(db.literal_column("'simple'"), column)
+
+    # Any of the terms rather than all of them (plainto_tsquery), since each branch only looks at one field
+    tsquery = db.func.to_tsquery(db.literal_column("'simple'"), " | ".join(tokenize(query)))
+    author_rank = db.func.greatest(db.func.ts_rank(tsvector(Author.name), tsquery), db.func.similarity(Author.name, query))
+    candidates = db.union(*(
+        branch.order_by(rank.desc(), Book.id).limit(MAX_CANDIDATES) for branch, rank in (
+            (
+                db.select(Book.id).where(tsvector(Book.title).op("@@")(tsquery)),
+                db.func.ts_rank(tsvector(Book.title), tsquery),
+            ),
+            (
+                db.select(Book.id).where(Book.title.op("%")(query)),
+                db.func.similarity(Book.title, query),
+            ),
+            (
+                db.select(Book.id).join(Author, Book.author_id == Author.id).where(
+                    db.or_(tsvector(Author.name).op("@@")(tsquery), Author.name.op("%")(query))
+                ),
+                author_rank,
+            ),
+            (
+                db.select(Book.id).join(Genre, Book.genre_id == Genre.id).where(
+                    tsvector(Genre.genre_name).op("@@")(tsquery)
+                ),
+                db.func.ts_rank(tsvector(Genre.genre_name), tsquery),
+            ),
+        )
+    )).subquery()
+
+    document = (
+        db.func.setweight(tsvector(Book.title), db.literal_column("'A'"))
+        .op("||")(db.func.setweight(tsvector(Author.name), db.literal_column("'B'")))
+        .op("||")(db.func.setweight(tsvector(Genre.genre_name), db.literal_column("'C'")))
+    )
+    rank = (
+        db.func.ts_rank(document, tsquery)
+        + db.func.similarity(Book.title, query)
+        + 0.5 * db.func.similarity(Author.name, query)
+    )
+    stmt = (
+        db.select(Book.id)
+        .join(Author, Book.author_id == Author.id)
+        .join(Genre, Book.genre_id == Genre.id)
+        .where(Book.id.in_(db.select(candidates.c.id)))
+        .order_by(rank.desc(), Book.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    return db.session.scalars(stmt).all()
+
+
+def search_books(query, offset, limit):
+    """
+    Returns one page of the ids of the books whose title, author name or genre name match query, best match first.
+
+    Uses the database's full-text search on PostgreSQL and search_index everywhere else.
+
+    Args:
+        query (str): The search text.
+        offset (int): The number of ranked results to skip.
+        limit (int): The maximum number of ids to return.
+    """
+    if db.session.connection().dialect.name == "postgresql":
+        return postgresql_search(query, offset, limit)
+    return search_index.search(query)[offset:offset + limit]
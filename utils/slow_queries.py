@@ -0,0 +1,200 @@
+import glob
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+
+from utils.index_report import postgresql_plan_lines
+from utils.query_timing import subscribe, subscribe_failures
+
+logger = logging.getLogger(__name__)
+
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Size at which the log is rotated
+LOG_BACKUPS = 5  # Rotated logs kept, as slow_queries.log.1 to .5
+
+# Statements EXPLAIN accepts; anything else (DDL, PRAGMA, SAVEPOINT, ...) is logged without a plan
+EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|(?<![:\w]):\w+|\$\d+|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalise(statement):
+    """
+    Reduces a statement to its shape: literals and placeholders (in any paramstyle) become ?, lists of them (IN,
+    multi-row VALUES) become (?, ...) and whitespace is collapsed. Statements differing only in values normalise alike.
+    """
+    sql = _STRING.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(?, ...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(statement):
+    """A short id for the normalised statement, grouping the log by query."""
+    return hashlib.sha1(normalise(statement).encode()).hexdigest()[:12]
+
+
+def parameter_shape(parameters, executemany = False):
+    """The names (or positions) and types of the bound parameters, leaving out their values."""
+    if executemany:
+        return {"rows": len(parameters), "row": parameter_shape(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def explain(connection, statement, parameters):
+    """
+    Returns the plan of statement as text lines, from plain EXPLAIN, which plans the statement without running it.
+
+    Runs on the raw connection, inside the statement's transaction. On PostgreSQL a savepoint keeps a failing EXPLAIN
+    from aborting that transaction.
+    """
+    dialect = connection.dialect.name
+    cursor = connection.connection.cursor()
+    try:
+        if dialect == "postgresql":
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                lines, _ = postgresql_plan_lines(cursor.fetchone()[0])
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return lines
+        if dialect == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return [row[3] for row in cursor.fetchall()]
+        return None
+    finally:
+        cursor.close()
+
+
+def originating_route():
+    if not has_request_context():
+        return None
+    return f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+
+
+class SlowQueryLog:
+    """
+    Records statements slower than SLOW_QUERY_THRESHOLD_MS (0 turns recording off) as JSON lines in a rotating log
+    at SLOW_QUERY_LOG: the SQL and its fingerprint, the shape of its parameters, the route that ran it and its EXPLAIN
+    plan. Statements that fail after running that long, e.g. ones cancelled by statement_timeout, are recorded with
+    their error instead of a plan. `flask perf slow-queries` summarises the log.
+
+    Every gunicorn worker appends to the same file. Workers rotating it at the same moment can lose a few lines,
+    which a summary of the worst offenders tolerates.
+    """
+    def __init__(self):
+        self.threshold = 0.0
+
+    def init_app(self, app):
+        self.path = app.config.setdefault("SLOW_QUERY_LOG", "slow_queries.log")
+        self.threshold = app.config.setdefault("SLOW_QUERY_THRESHOLD_MS", 200) / 1000
+        if self.threshold <= 0:
+            return
+        subscribe(self.check_statement)
+        subscribe_failures(self.check_failure)
+        if not logger.handlers:
+            logger.addHandler(RotatingFileHandler(self.path, maxBytes = LOG_MAX_BYTES, backupCount = LOG_BACKUPS, delay = True))
+            logger.setLevel(logging.INFO)
+            # Kept out of the application log
+            logger.propagate = False
+
+    def check_statement(self, connection, statement, parameters, executemany, seconds):
+        if seconds >= self.threshold:
+            self.record(connection, statement, parameters, executemany, seconds)
+
+    def check_failure(self, connection, statement, parameters, executemany, seconds, error):
+        if seconds >= self.threshold:
+            self.record(connection, statement, parameters, executemany, seconds, error)
+
+    def record(self, connection, statement, parameters, executemany, elapsed, error = None):
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(timespec = "seconds"),
+            "ms": round(elapsed * 1000, 2),
+            "fingerprint": fingerprint(statement),
+            "sql": statement,
+            "parameters": parameter_shape(parameters, executemany),
+            "route": originating_route(),
+            "plan": None,
+        }
+        if error is not None:
+            # No plan, as the failure may have aborted the transaction EXPLAIN would run in
+            entry["error"] = str(error)
+        elif statement.lstrip()[:6].lower().startswith(EXPLAINABLE):
+            try:
+                entry["plan"] = explain(connection, statement, parameters[0] if executemany else parameters)
+            except Exception as error:
+                entry["plan_error"] = str(error)
+        logger.info(json.dumps(entry))
+
+
+def read_entries(path):
+    """Yields the entries of the log at path and its rotated backups, oldest first."""
+    backups = sorted(glob.glob(f"{glob.escape(path)}.[0-9]*"), key = lambda name: int(name.rsplit(".", 1)[1]), reverse = True)
+    for name in backups + [path]:
+        try:
+            with open(name, encoding = "utf-8") as log:
+                for line in log:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # A line cut short by a rotation
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def summarise(path, sort = "total"):
+    """
+    Groups the slow query log by fingerprint.
+
+    Args:
+        path (str): The log, as SLOW_QUERY_LOG.
+        sort (str): total, max or count, the figure the worst offenders are ranked by.
+
+    Returns:
+        list: One dict per fingerprint with its normalised SQL, count, total/mean/max milliseconds, how many runs
+        failed, the routes that ran it (with counts) and its most recent plan and error, worst first.
+    """
+    groups = {}
+    for entry in read_entries(path):
+        group = groups.setdefault(entry["fingerprint"], {
+            "fingerprint": entry["fingerprint"],
+            "sql": normalise(entry["sql"]),
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "failed": 0,
+            "routes": {},
+            "plan": None,
+            "error": None,
+        })
+        group["count"] += 1
+        group["total_ms"] += entry["ms"]
+        group["max_ms"] = max(group["max_ms"], entry["ms"])
+        route = entry.get("route") or "(no request)"
+        group["routes"][route] = group["routes"].get(route, 0) + 1
+        group["plan"] = entry.get("plan") or group["plan"]
+        if entry.get("error"):
+            group["failed"] += 1
+            group["error"] = entry["error"]
+
+    for group in groups.values():
+        group["mean_ms"] = group["total_ms"] / group["count"]
+    key = {"total": "total_ms", "max": "max_ms", "count": "count"}[sort]
+    return sorted(groups.values(), key = lambda group: group[key], reverse = True)
+
+
+slow_query_log = SlowQueryLog()
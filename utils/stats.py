@@ -0,0 +1,112 @@
+import random
+from datetime import date
+from sqlalchemy.dialects import postgresql, sqlite
+
+from init import db
+from models.book import Book
+from models.stats import AuthorStats, DailyLoanStats, GenreStats
+
+LOAN_STAT_SHARDS = 8  # Rows per day in daily_loan_stats
+
+
+def add_to(model, keys, session = None, **deltas):
+    """
+    Adds deltas to the counters of the summary row identified by keys, creating the row if it is missing.
+
+    Runs as a single `INSERT ... ON CONFLICT DO UPDATE SET counter = counter + excluded.counter`, so concurrent
+    writers never lose an update and never read the row first. The caller commits together with its own change,
+    on db.session unless another session (e.g. an AsyncSession's sync_session) is given.
+    """
+    session = session or db.session
+    insert = postgresql.insert if session.connection().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(model).values(**keys, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements = list(keys),
+        set_ = {name: getattr(model, name) + stmt.excluded[name] for name in deltas}
+    )
+    session.execute(stmt)
+
+
+def record_books(author_id, genre_id, books, copies):
+    """Counts books (and their copies) added to, or with negative numbers removed from, an author and genre."""
+    add_to(GenreStats, {"genre_id": genre_id}, book_count = books)
+    add_to(AuthorStats, {"author_id": author_id}, book_count = books, available_copies = copies)
+
+
+def record_copies(author_id, copies, session = None):
+    """Counts copies of an author's books leaving (negative) or coming back to (positive) the shelf."""
+    add_to(AuthorStats, {"author_id": author_id}, session, available_copies = copies)
+
+
+def record_loans(checkouts = 0, returns = 0, session = None):
+    """Counts today's checkouts and returns on a random shard of today's rows."""
+    add_to(
+        DailyLoanStats, {"day": date.today(), "shard": random.randrange(LOAN_STAT_SHARDS)}, session,
+        checkouts = checkouts, returns = returns
+    )
+
+
+def forget_author(author_id):
+    """
+    Removes an author's totals, and their books from the genre totals, before the author (and, by cascade, their
+    books) is deleted. One `UPDATE ... FROM` over the author's books grouped by genre, however many genres they span.
+    """
+    per_genre = (
+        db.select(Book.genre_id, db.func.count(Book.id).label("books"))
+        .where(Book.author_id == author_id)
+        .group_by(Book.genre_id)
+        .subquery()
+    )
+    db.session.execute(
+        db.update(GenreStats)
+        .where(GenreStats.genre_id == per_genre.c.genre_id)
+        .values(book_count = GenreStats.book_count - per_genre.c.books)
+        .execution_options(synchronize_session = False)
+    )
+    db.session.execute(db.delete(AuthorStats).where(AuthorStats.author_id == author_id))
+
+
+def forget_genre(genre_id):
+    """
+    Removes a genre's totals, and its books from the author totals, before the genre (and, by cascade, its books)
+    is deleted. One `UPDATE ... FROM` over the genre's books grouped by author, however many authors wrote them.
+    """
+    per_author = (
+        db.select(
+            Book.author_id,
+            db.func.count(Book.id).label("books"),
+            db.func.sum(Book.available_copies).label("copies")
+        )
+        .where(Book.genre_id == genre_id)
+        .group_by(Book.author_id)
+        .subquery()
+    )
+    db.session.execute(
+        db.update(AuthorStats)
+        .where(AuthorStats.author_id == per_author.c.author_id)
+        .values(
+            book_count = AuthorStats.book_count - per_author.c.books,
+            available_copies = AuthorStats.available_copies - per_author.c.copies
+        )
+        .execution_options(synchronize_session = False)
+    )
+    db.session.execute(db.delete(GenreStats).where(GenreStats.genre_id == genre_id))
+
+
+def rebuild_stats():
+    """
+    Recomputes the genre and author totals from the books table, e.g. after rows were loaded outside the API.
+
+    The daily checkout and return counts record events rather than state, so they are left as they are.
+    """
+    db.session.execute(db.delete(GenreStats))
+    db.session.execute(db.delete(AuthorStats))
+    db.session.execute(db.insert(GenreStats).from_select(
+        ["genre_id", "book_count"],
+        db.select(Book.genre_id, db.func.count(Book.id)).group_by(Book.genre_id)
+    ))
+    db.session.execute(db.insert(AuthorStats).from_select(
+        ["author_id", "book_count", "available_copies"],
+        db.select(Book.author_id, db.func.count(Book.id), db.func.sum(Book.available_copies)).group_by(Book.author_id)
+    ))
+    db.session.commit()
@@ -0,0 +1,49 @@
+from flask import Response, current_app, request, stream_with_context
+
+from init import db
+
+DEFAULT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson"
+}
+
+
+def stream_export(stmt, schema):
+    """
+    Streams every row of a select statement as a JSON array or as NDJSON.
+
+    Rows are read with `yield_per`, which uses a server-side cursor on PostgreSQL, and each chunk is dumped
+    and written out before the next one is fetched. Worker memory therefore stays at roughly one chunk no
+    matter how large the table is, and the first bytes go out as soon as the first chunk is ready.
+
+    Args:
+        stmt (Select): The statement to export, already ordered.
+        schema (Schema): A `many = True` schema used to serialise each chunk.
+
+    Returns:
+        Response: A streaming response, or an error tuple if the requested format is not supported.
+    """
+    export_format = request.args.get("format", "json")
+    if export_format not in EXPORT_FORMATS:
+        return {"message": f"Format must be one of: {', '.join(EXPORT_FORMATS)}"}, 400
+
+    chunk_size = current_app.config.get("EXPORT_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    dumps = current_app.json.dumps
+
+    def generate():
+        rows = db.session.scalars(stmt.execution_options(yield_per = chunk_size))
+        first = True
+        if export_format == "json":
+            yield "["
+        for chunk in rows.partitions():
+            data = schema.dump(chunk)
+            if export_format == "ndjson":
+                yield "".join(dumps(item) + "\n" for item in data)
+            elif data:
+                yield ("" if first else ",") + ",".join(dumps(item) for item in data)
+                first = False
+        if export_format == "json":
+            yield "]"
+
+    return Response(stream_with_context(generate()), mimetype = EXPORT_FORMATS[export_format])
@@ -0,0 +1,254 @@
+import bisect
+import itertools
+import math
+import random
+from datetime import date, timedelta
+
+from init import db
+from models.author import Author
+from models.book import Book
+from models.genre import Genre
+from models.loan import Loan, LoanSchema
+from models.member import Member
+from utils.bulk_insert import bulk_insert
+from utils.stats import rebuild_stats
+
+# Rows generated per unit of --scale
+AUTHORS_PER_SCALE = 100
+BOOKS_PER_SCALE = 1000
+MEMBERS_PER_SCALE = 200
+LOANS_PER_SCALE = 5000
+
+BATCH_SIZE = 10000
+ZIPF_EXPONENT = 1.1  # Popularity skew of books, a handful of titles get most of the loans
+ACTIVITY_SHAPE = 1.5  # Pareto shape of loans per member, most members borrow little and a few borrow a lot
+HISTORY_DAYS = 3 * 365
+
+FIRST_NAMES = (
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+    "Daniel", "Nancy", "Matthew", "Lisa", "Anthony", "Betty", "Mark", "Sandra", "Steven", "Ashley",
+    "Andrew", "Emily", "Joshua", "Donna", "Kevin", "Michelle", "Brian", "Carol", "George", "Amanda"
+)
+LAST_NAMES = (
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee",
+    "Thompson", "White", "Harris", "Clark", "Lewis", "Robinson", "Walker", "Young", "Allen", "King",
+    "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores", "Green", "Adams", "Nelson", "Baker"
+)
+GENRE_NAMES = (
+    "Fantasy", "Science Fiction", "Mystery", "Thriller", "Romance", "Horror", "Historical Fiction",
+    "Literary Fiction", "Young Adult", "Childrens", "Biography", "Memoir", "History", "Science",
+    "Philosophy", "Poetry", "Drama", "Travel", "Cooking", "Self Help"
+)
+TITLE_ADJECTIVES = (
+    "Silent", "Broken", "Hidden", "Golden", "Last", "Lost", "Crimson", "Endless", "Secret", "Burning",
+    "Frozen", "Shattered", "Forgotten", "Wandering", "Distant", "Bitter", "Quiet", "Wild", "Hollow", "Final"
+)
+TITLE_NOUNS = (
+    "Kingdom", "River", "Empire", "Garden", "Storm", "Crown", "Shadow", "Harbour", "Mountain", "Letter",
+    "Winter", "Promise", "Voyage", "Machine", "Orchard", "Library", "Tower", "Forest", "Bridge", "Star"
+)
+
+
+def letters(index):
+    """Maps 0, 1, 2, ... to A, B, ..., Z, AA, AB, ... so generated names stay unique and letters only."""
+    text = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        text = chr(ord("A") + remainder) + text
+    return text
+
+
+def person_name(index):
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    return f"{first} {letters(index // (len(FIRST_NAMES) * len(LAST_NAMES)))} {last}"
+
+
+def isbn_13(index):
+    """Returns a hyphenated ISBN-13 with a valid check digit, unique for every index below 10^9."""
+    digits = f"978{index:09d}"
+    total = sum(int(digit) * (1 if position % 2 == 0 else 3) for position, digit in enumerate(digits))
+    check = (10 - total % 10) % 10
+    return f"{digits[:3]}-{digits[3]}-{digits[4:8]}-{digits[8:12]}-{check}"
+
+
+def next_id(model):
+    return (db.session.scalar(db.select(db.func.max(model.id))) or 0) + 1
+
+
+def insert_in_batches(model, rows):
+    """Inserts a row generator in BATCH_SIZE chunks, committing after each one."""
+    total = 0
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            return total
+        bulk_insert(model, batch)
+        db.session.commit()
+        total += len(batch)
+
+
+def reset_sequences(*models):
+    """Moves PostgreSQL id sequences past the explicit ids inserted by the generator."""
+    if db.session.connection().dialect.name != "postgresql":
+        return
+    for model in models:
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 1) FROM {model.__tablename__}))"
+        ))
+    db.session.commit()
+
+
+def generate(scale, seed = 42, log = print):
+    """
+    Fills the database with a synthetic library sized by scale.
+
+    Every scale unit adds AUTHORS_PER_SCALE authors, BOOKS_PER_SCALE books, MEMBERS_PER_SCALE members and
+    roughly LOANS_PER_SCALE loans. Book popularity follows a Zipf distribution and member activity a Pareto
+    distribution, and the same seed always produces the same rows. Rows are written in large batches with
+    explicit ids, so this is meant to be run against freshly created tables.
+
+    Args:
+        scale (int): The scale factor.
+        seed (int): Seed for the random number generator.
+        log (callable): Called with a progress message after each table.
+
+    Returns:
+        dict: The number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    counts = {}
+
+    # Genres
+    genre_start = next_id(Genre)
+    counts["genres"] = insert_in_batches(Genre, (
+        {"id": genre_start + offset, "genre_name": name, "genre_description": f"Synthetic {name.lower()} titles."}
+        for offset, name in enumerate(GENRE_NAMES)
+    ))
+    genre_ids = range(genre_start, genre_start + len(GENRE_NAMES))
+    log(f"Inserted {counts['genres']} genres")
+
+    # Authors
+    author_count = AUTHORS_PER_SCALE * scale
+    author_start = next_id(Author)
+    counts["authors"] = insert_in_batches(Author, (
+        {"id": author_start + offset, "name": person_name(offset), "birth_year": rng.randint(1900, 2000)}
+        for offset in range(author_count)
+    ))
+    log(f"Inserted {counts['authors']} authors")
+
+    # Books, each with a fixed number of copies so active loans never exceed them
+    book_count = BOOKS_PER_SCALE * scale
+    book_start = next_id(Book)
+    copies = [rng.randint(1, 10) for _ in range(book_count)]
+    counts["books"] = insert_in_batches(Book, (
+        {
+            "id": book_start + offset,
+            "title": f"The {rng.choice(TITLE_ADJECTIVES)} {rng.choice(TITLE_NOUNS)}",
+            "isbn": isbn_13(book_start + offset),
+            "available_copies": copies[offset],
+            "author_id": author_start + rng.randrange(author_count),
+            "genre_id": rng.choice(genre_ids)
+        }
+        for offset in range(book_count)
+    ))
+    log(f"Inserted {counts['books']} books")
+
+    # Members
+    member_count = MEMBERS_PER_SCALE * scale
+    member_start = next_id(Member)
+    first_day = date(2001, 1, 1)
+    join_dates = [first_day + timedelta(days = rng.randrange((today - first_day).days)) for _ in range(member_count)]
+    counts["members"] = insert_in_batches(Member, (
+        {
+            "id": member_start + offset,
+            "name": person_name(offset),
+            "membership_number": f"{member_start + offset + 10000000:08d}",
+            "email": f"member{member_start + offset}@example.com",
+            "join_date": join_dates[offset]
+        }
+        for offset in range(member_count)
+    ))
+    log(f"Inserted {counts['members']} members")
+
+    # Loans
+    cumulative = list(itertools.accumulate(1 / (rank ** ZIPF_EXPONENT) for rank in range(1, book_count + 1)))
+    # Spread popular ranks over the id range with a bijection instead of favouring the lowest ids
+    stride = next(step for step in range(book_count // 2 + 1, book_count * 2) if math.gcd(step, book_count) == 1)
+    activity = [rng.paretovariate(ACTIVITY_SHAPE) for _ in range(member_count)]
+    loans_per_weight = LOANS_PER_SCALE * scale / sum(activity)
+
+    touched = set()
+    active_counts = {}
+
+    def loans():
+        loan_id = next_id(Loan)
+        for offset in range(member_count):
+            wanted = min(round(activity[offset] * loans_per_weight), book_count)
+            start = max(join_dates[offset], today - timedelta(days = HISTORY_DAYS))
+            span = max((today - start).days, 1)
+
+            borrowed = set()
+            attempts = 0
+            while len(borrowed) < wanted and attempts < wanted * 4:
+                attempts += 1
+                rank = bisect.bisect(cumulative, rng.random() * cumulative[-1])
+                borrowed.add(rank * stride % book_count)
+
+            borrow_dates = sorted(start + timedelta(days = rng.randrange(span)) for _ in borrowed)
+            active = 0
+            for book_offset, borrow_date in zip(borrowed, borrow_dates):
+                status = "returned"
+                recent = (today - borrow_date).days <= LoanSchema.MAX_LOAN_DURATION
+                if recent and active < LoanSchema.MAX_BORROW_LIMIT and copies[book_offset] > 0:
+                    copies[book_offset] -= 1
+                    touched.add(book_offset)
+                    active += 1
+                    active_counts[offset] = active
+                    status = "active"
+                yield {
+                    "id": loan_id,
+                    "borrow_date": borrow_date,
+                    "return_date": borrow_date + timedelta(days = rng.randint(7, LoanSchema.MAX_LOAN_DURATION)),
+                    "status": status,
+                    "book_id": book_start + book_offset,
+                    "member_id": member_start + offset
+                }
+                loan_id += 1
+
+    counts["loans"] = insert_in_batches(Loan, loans())
+    log(f"Inserted {counts['loans']} loans")
+
+    # Copies taken by active loans, applied in one statement per batch of books
+    touched = sorted(touched)
+    for batch_start in range(0, len(touched), BATCH_SIZE):
+        changed = {book_start + offset: copies[offset] for offset in touched[batch_start:batch_start + BATCH_SIZE]}
+        db.session.execute(
+            db.update(Book)
+            .where(Book.id.in_(changed))
+            .values(available_copies = db.case(changed, value = Book.id))
+        )
+        db.session.commit()
+
+    # Members' active loan counters, the same way
+    active_offsets = sorted(active_counts)
+    for batch_start in range(0, len(active_offsets), BATCH_SIZE):
+        changed = {
+            member_start + offset: active_counts[offset]
+            for offset in active_offsets[batch_start:batch_start + BATCH_SIZE]
+        }
+        db.session.execute(
+            db.update(Member)
+            .where(Member.id.in_(changed))
+            .values(active_loan_count = db.case(changed, value = Member.id))
+        )
+        db.session.commit()
+
+    reset_sequences(Genre, Author, Book, Member, Loan)
+    rebuild_stats()
+    return counts